@@ -1,17 +1,20 @@
 """
 Flask 应用工厂
 """
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import config
+from app.db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 
-def create_app(config_name='default'):
-    """应用工厂函数"""
+def create_app(config_name=None):
+    """应用工厂函数，未指定配置时读取环境变量 FLASK_CONFIG（development/production）"""
+    config_name = config_name or os.environ.get('FLASK_CONFIG') or 'default'
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
@@ -53,6 +56,18 @@ def create_app(config_name='default'):
     app.register_blueprint(return_bp, url_prefix='/return')
     app.register_blueprint(finance_bp, url_prefix='/finance')
     
+    # 只读端点读副本，写入走主库
+    from app.db_routing import init_routing
+    init_routing(app)
+    
+    # 请求级 SQL 监控与 /metrics 端点
+    from app.metrics import init_metrics
+    init_metrics(app)
+    
+    # 注册命令行工具
+    from app.commands import register_commands
+    register_commands(app)
+    
     # 注册自定义过滤器
     @app.template_filter('currency')
     def currency_filter(value):
@@ -0,0 +1,74 @@
+"""
+命令行工具（flask <命令>）
+"""
+from datetime import datetime
+import click
+from app import db
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def register_commands(app):
+    """注册自定义命令"""
+
+    @app.cli.command('rebuild-sales-facts')
+    @click.option('--start', required=True, help='开始日期 YYYY-MM-DD')
+    @click.option('--end', required=True, help='结束日期 YYYY-MM-DD')
+    def rebuild_sales_facts(start, end):
+        """按源表重算销售日汇总（历史回填/校正）"""
+        from app.services import sales_facts
+        sales_facts.rebuild(_parse_date(start), _parse_date(end))
+        db.session.commit()
+        click.echo(f'销售汇总已重算: {start} ~ {end}')
+
+    @app.cli.command('finance-settle')
+    @click.option('--start', required=True, help='开始日期 YYYY-MM-DD')
+    @click.option('--end', required=True, help='结束日期 YYYY-MM-DD')
+    @click.option('--workers', default=None, type=int, help='并行线程数，默认取配置 FINANCE_BACKFILL_WORKERS')
+    def finance_settle(start, end, workers):
+        """按源表批量重算区间内的财务日结（按月并行）"""
+        from app.services import finance_backfill
+        start, end = _parse_date(start), _parse_date(end)
+        if start > end:
+            raise click.BadParameter('开始日期不能晚于结束日期')
+        workers = workers or app.config.get('FINANCE_BACKFILL_WORKERS', 4)
+
+        def progress(done, total, chunk_start, chunk_end):
+            click.echo(f'[{done}/{total}] {chunk_start} ~ {chunk_end} 完成')
+
+        days = finance_backfill.backfill(app, start, end, workers=workers, progress=progress)
+        click.echo(f'财务日结已重算: {start} ~ {end}，共 {days} 天')
+
+    @app.cli.command('import-purchases')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--emp-id', required=True, type=int, help='经手人工号')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+                  help='文件格式，默认按扩展名判断')
+    @click.option('--chunk', default=None, type=int, help='每个事务的行数，默认取配置 PURCHASE_IMPORT_CHUNK')
+    @click.option('--errors', 'errors_path', default=None, type=click.Path(dir_okay=False),
+                  help='把逐行错误报告写入该 CSV 文件')
+    def import_purchases(path, emp_id, fmt, chunk, errors_path):
+        """导入供应商到货单（CSV/JSONL），分块事务写入"""
+        from app.services import purchase_import, stock_index, dashboard
+        fmt = fmt or purchase_import.detect_format(path)
+
+        def progress(report):
+            click.echo(f'已处理 {report.total} 行：导入 {report.imported}，失败 {report.error_count}')
+
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            report = purchase_import.import_stream(f, fmt, emp_id, chunk_size=chunk, progress=progress)
+        stock_index.invalidate(report.med_ids)
+        dashboard.invalidate()
+
+        for error in report.errors[:20]:
+            click.echo(f'  第 {error.line} 行: {error.message}')
+        if errors_path:
+            with open(errors_path, 'w', encoding='utf-8-sig', newline='') as f:
+                purchase_import.write_errors_csv(report, f)
+            click.echo(f'错误报告已写入: {errors_path}')
+        click.echo(f'完成：共 {report.total} 行，导入 {report.imported} 行，失败 {report.error_count} 行，'
+                   f'生成进货单 {len(report.orders)} 张')
+        if report.error_count:
+            raise SystemExit(1)
@@ -0,0 +1,80 @@
+"""
+读写分离路由
+标记为只读的报表/统计端点在 GET 请求中把普通 SELECT 发往只读副本（SQLALCHEMY_BINDS 中
+以 replica 开头的绑定），写语句、加锁查询、flush 及其余端点一律走主库。
+刚提交过写请求的会话在 REPLICA_RYW_SECONDS 秒内仍读主库，保证读到自己的写入。
+"""
+import random
+import time
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, TextClause
+
+REPLICA_PREFIX = 'replica'
+_WRITE_AT_KEY = '_last_write_at'
+
+
+class RoutingSession(Session):
+    """按请求上下文在主库与只读副本之间选择连接"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _is_plain_select(clause):
+            replica = _request_replica(self._db.engines)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_read(f):
+    """标记视图为只读端点，GET 请求的查询可由只读副本承担"""
+    f.replica_read = True
+    return f
+
+
+def init_routing(app):
+    """在应用工厂中调用：记录写请求时间并决定本请求是否使用副本"""
+    app.before_request(_choose_replica)
+    app.after_request(_remember_write)
+
+
+def replica_keys(engines):
+    return sorted(key for key in engines if key and key.startswith(REPLICA_PREFIX))
+
+
+def _choose_replica():
+    g._replica_key = None
+    if request.method != 'GET' or request.endpoint is None:
+        return
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(view, 'replica_read', False):
+        return
+    window = current_app.config.get('REPLICA_RYW_SECONDS', 5)
+    if time.time() - session.get(_WRITE_AT_KEY, 0) < window:
+        return
+    from app import db
+    keys = replica_keys(db.engines)
+    if keys:
+        g._replica_key = random.choice(keys)
+
+
+def _remember_write(response):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        session[_WRITE_AT_KEY] = time.time()
+    return response
+
+
+def _request_replica(engines):
+    if not has_request_context():
+        return None
+    key = g.get('_replica_key')
+    return engines.get(key) if key else None
+
+
+def _is_plain_select(clause):
+    """不带 FOR UPDATE 的 SELECT 才可走副本（含以 SELECT 开头的文本 SQL，如视图查询）"""
+    if isinstance(clause, Select):
+        return clause._for_update_arg is None
+    if isinstance(clause, TextClause):
+        sql = clause.text.lstrip().upper()
+        return sql.startswith('SELECT') and 'FOR UPDATE' not in sql and 'LOCK IN SHARE MODE' not in sql
+    return False
@@ -0,0 +1,312 @@
+"""
+请求级 SQL 监控与 /metrics 端点（Prometheus 文本格式）
+
+按路由端点记录请求耗时、每请求 SQL 条数、SQL 总耗时，以及连接池取连接次数、取连接等待时间与新建连接耗时。
+取连接等待时间直接对连接池的取连接方法计时（含排队与新建连接），用于核对连接池容量是否足够。
+数据保存在进程内，多进程部署时每个 worker 各自暴露，由采集端按实例汇总。
+访问 /metrics 需携带 Authorization: Bearer <METRICS_TOKEN>，或以管理员身份登录。
+"""
+import hmac
+import threading
+import time
+from flask import Blueprint, Response, current_app, g, has_request_context, request, abort
+from flask_login import current_user
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _label_text(self, key, extra=None):
+        pairs = list(zip(self.labels, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        body = ','.join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return '{' + body + '}'
+
+
+class Counter(_Metric):
+    """只增计数器"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{self._label_text(k)} {_number(v)}' for k, v in items]
+
+
+class Gauge(_Metric):
+    """采集时计算的瞬时值，fn() 返回 {标签值元组: 数值}"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels, fn):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+
+    def render(self):
+        return [f'{self.name}{self._label_text(k)} {_number(v)}' for k, v in sorted(self.fn().items())]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = []
+        for key, (counts, total, value_sum) in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{self._label_text(key, ("le", _number(bound)))} {count}')
+            lines.append(f'{self.name}_bucket{self._label_text(key, ("le", "+Inf"))} {total}')
+            lines.append(f'{self.name}_sum{self._label_text(key)} {_number(value_sum)}')
+            lines.append(f'{self.name}_count{self._label_text(key)} {total}')
+        return lines
+
+
+def _register(metric):
+    with _registry_lock:
+        for i, existing in enumerate(_registry):
+            if existing.name == metric.name:
+                if isinstance(metric, Gauge):
+                    # 同一进程内重复创建应用（脚本/测试）时以最新引擎为准
+                    _registry[i] = metric
+                    return metric
+                return existing
+        _registry.append(metric)
+        return metric
+
+
+def counter(name, help_text, labels=()):
+    """获取（不存在则注册）计数器，供业务模块记录自定义指标"""
+    return _register(Counter(name, help_text, labels))
+
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    """获取（不存在则注册）直方图"""
+    return _register(Histogram(name, help_text, labels, buckets))
+
+
+REQUEST_SECONDS = histogram(
+    'pharmacy_http_request_duration_seconds', '请求耗时（秒）',
+    ('endpoint', 'method', 'status'))
+REQUEST_SQL_STATEMENTS = histogram(
+    'pharmacy_http_request_sql_statements', '每个请求执行的 SQL 条数',
+    ('endpoint',), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = counter(
+    'pharmacy_http_request_sql_seconds_total', '请求内 SQL 执行总耗时（秒）', ('endpoint',))
+REQUEST_POOL_CHECKOUTS = histogram(
+    'pharmacy_http_request_pool_checkouts', '每个请求从连接池取出连接的次数',
+    ('endpoint',), COUNT_BUCKETS)
+REQUEST_POOL_WAIT_SECONDS = counter(
+    'pharmacy_http_request_pool_wait_seconds_total', '请求内等待连接池取连接的总耗时（秒）', ('endpoint',))
+REQUEST_POOL_CONNECT_SECONDS = counter(
+    'pharmacy_http_request_pool_connect_seconds_total', '请求内新建数据库连接的总耗时（秒）', ('endpoint',))
+POOL_CHECKOUTS = counter(
+    'pharmacy_db_pool_checkouts_total', '从连接池取出连接的次数', ('bind',))
+POOL_WAIT_SECONDS = histogram(
+    'pharmacy_db_pool_checkout_wait_seconds', '连接池取连接等待时间（秒）',
+    ('bind',), WAIT_BUCKETS)
+POOL_CONNECT_SECONDS = histogram(
+    'pharmacy_db_pool_connect_seconds', '连接池新建数据库连接耗时（秒）',
+    ('bind',), WAIT_BUCKETS)
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus 文本格式指标"""
+    if not _authorized():
+        abort(401)
+    lines = []
+    with _registry_lock:
+        registered = list(_registry)
+    for metric in registered:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.render())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_metrics(app):
+    """在应用工厂中调用：挂接请求钩子、各数据库引擎的 SQL/连接池事件并注册 /metrics"""
+    from app import db
+
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_request)
+    app.register_blueprint(metrics_bp)
+
+    with app.app_context():
+        engines = dict(db.engines)
+    for bind, engine in engines.items():
+        _instrument_engine(engine, bind or 'default')
+
+    _register(Gauge(
+        'pharmacy_db_pool_checked_out', '当前已借出的连接数', ('bind',),
+        lambda: {(bind or 'default',): _pool_stat(e.pool, 'checkedout') for bind, e in engines.items()}))
+    _register(Gauge(
+        'pharmacy_db_pool_size', '连接池常驻连接数上限', ('bind',),
+        lambda: {(bind or 'default',): _pool_stat(e.pool, 'size') for bind, e in engines.items()}))
+    _register(Gauge(
+        'pharmacy_db_pool_overflow', '当前溢出连接数', ('bind',),
+        lambda: {(bind or 'default',): _pool_stat(e.pool, 'overflow') for bind, e in engines.items()}))
+
+
+def _start_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_sql_count = 0
+    g._metrics_sql_seconds = 0.0
+    g._metrics_pool_checkouts = 0
+    g._metrics_pool_wait = 0.0
+    g._metrics_pool_connect = 0.0
+    g._metrics_status = 500
+
+
+def _record_status(response):
+    g._metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exc=None):
+    start = g.pop('_metrics_start', None)
+    if start is None or request.endpoint in ('static', 'metrics.metrics'):
+        return
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint,
+                            method=request.method, status=g.get('_metrics_status', 500))
+    REQUEST_SQL_STATEMENTS.observe(g.get('_metrics_sql_count', 0), endpoint=endpoint)
+    REQUEST_SQL_SECONDS.inc(g.get('_metrics_sql_seconds', 0.0), endpoint=endpoint)
+    REQUEST_POOL_CHECKOUTS.observe(g.get('_metrics_pool_checkouts', 0), endpoint=endpoint)
+    REQUEST_POOL_WAIT_SECONDS.inc(g.get('_metrics_pool_wait', 0.0), endpoint=endpoint)
+    REQUEST_POOL_CONNECT_SECONDS.inc(g.get('_metrics_pool_connect', 0.0), endpoint=endpoint)
+
+
+def _instrument_engine(engine, bind):
+    # 语句开始时间记在本次执行的 context 上，语句失败时随 context 一起丢弃
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_query_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_metrics_query_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if has_request_context() and '_metrics_start' in g:
+            g._metrics_sql_count += 1
+            g._metrics_sql_seconds += elapsed
+
+    # 连接池事件挂在引擎上，dispose() 重建的连接池沿用同一组监听
+    @event.listens_for(engine, 'do_connect')
+    def do_connect(dialect, connection_record, cargs, cparams):
+        connection_record.info['_metrics_connect_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        start = connection_record.info.pop('_metrics_connect_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        POOL_CONNECT_SECONDS.observe(elapsed, bind=bind)
+        if has_request_context() and '_metrics_start' in g:
+            g._metrics_pool_connect += elapsed
+
+    @event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc(bind=bind)
+        if has_request_context() and '_metrics_start' in g:
+            g._metrics_pool_checkouts += 1
+
+    @event.listens_for(engine, 'engine_disposed')
+    def engine_disposed(engine):
+        # dispose() 会以 recreate() 新建连接池，重新挂接取连接计时
+        _wrap_pool(engine.pool, bind)
+
+    _wrap_pool(engine.pool, bind)
+
+
+def _wrap_pool(pool, bind):
+    """包装连接池取连接方法，记录等待时间（含排队与新建连接）"""
+    if getattr(pool, '_metrics_wrapped', False):
+        return
+    do_get = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            waited = time.perf_counter() - start
+            POOL_WAIT_SECONDS.observe(waited, bind=bind)
+            if has_request_context() and '_metrics_start' in g:
+                g._metrics_pool_wait += waited
+
+    pool._do_get = timed_do_get
+    pool._metrics_wrapped = True
+
+
+def _pool_stat(pool, name):
+    fn = getattr(pool, name, None)
+    try:
+        return fn() if callable(fn) else 0
+    except Exception:
+        return 0
+
+
+def _authorized():
+    token = current_app.config.get('METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:], token):
+        return True
+    return current_user.is_authenticated and getattr(current_user, 'role', None) == 'Admin'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
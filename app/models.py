@@ -79,7 +79,7 @@ class Customer(db.Model):
     __tablename__ = 't_customer'
     
     cus_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    cus_name = db.Column(db.String(50), nullable=False, comment='客户姓名')
+    cus_name = db.Column(db.String(50), nullable=False, index=True, comment='客户姓名')
     gender = db.Column(db.Enum('男', '女', '未知'), default='未知')
     phone = db.Column(db.String(20), unique=True, comment='手机号')
     age = db.Column(db.Integer, comment='年龄')
@@ -104,16 +104,27 @@ class Medicine(db.Model):
     category = db.Column(db.String(20), default='OTC', comment='类别')
     unit = db.Column(db.String(10), default='盒', comment='单位')
     factory = db.Column(db.String(100), comment='生产厂家')
+    barcode = db.Column(db.String(32), unique=True, comment='商品条码(单品)')
+    approval_no = db.Column(db.String(50), index=True, comment='批准文号')
     ref_buy_price = db.Column(db.Numeric(10, 2), comment='参考进价')
     ref_sell_price = db.Column(db.Numeric(10, 2), comment='参考售价')
     total_stock = db.Column(db.Integer, default=0, comment='总库存')
     alert_qty = db.Column(db.Integer, default=10, comment='预警线')
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    catalog_updated_at = db.Column(db.DateTime, default=datetime.now,
+                                   comment='目录信息(名称/规格/厂家/类别/条码)修改时间，库存变动不更新')
+    
+    __table_args__ = (
+        db.Index('idx_medicine_name', 'med_name'),
+        db.Index('idx_medicine_category', 'category'),
+        db.Index('idx_medicine_catalog_updated', 'catalog_updated_at'),
+    )
     
     # 关系
     stock_batches = db.relationship('StockBatch', backref='medicine', lazy='dynamic')
     purchase_details = db.relationship('PurchaseDetail', backref='medicine', lazy='dynamic')
+    extra_barcodes = db.relationship('MedicineBarcode', backref='medicine', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Medicine {self.med_name}>'
@@ -124,6 +135,20 @@ class Medicine(db.Model):
         return self.total_stock < self.alert_qty
 
 
+class MedicineBarcode(db.Model):
+    """药品附加条码表（多件装条码，多对一指向药品）"""
+    __tablename__ = 't_medicine_barcode'
+    
+    barcode = db.Column(db.String(32), primary_key=True, comment='条码')
+    med_id = db.Column(db.Integer, db.ForeignKey('t_medicine.med_id', ondelete='CASCADE'),
+                       nullable=False, index=True)
+    pack_qty = db.Column(db.Integer, nullable=False, default=1, comment='每扫一次计入的数量')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f'<MedicineBarcode {self.barcode}>'
+
+
 class StockBatch(db.Model):
     """库存批次表"""
     __tablename__ = 't_stock_batch'
@@ -141,6 +166,9 @@ class StockBatch(db.Model):
     # 唯一约束
     __table_args__ = (
         db.UniqueConstraint('med_id', 'batch_no', name='uk_med_batch'),
+        db.Index('idx_stock_fefo', 'med_id', 'expiry_date', 'cur_batch_qty'),
+        db.Index('idx_stock_expiry_qty', 'expiry_date', 'cur_batch_qty'),
+        db.Index('idx_stock_batch_no', 'batch_no'),
     )
     
     def __repr__(self):
@@ -167,9 +195,13 @@ class PurchaseOrder(db.Model):
     sup_id = db.Column(db.Integer, db.ForeignKey('t_supplier.sup_id'), nullable=False)
     emp_id = db.Column(db.Integer, db.ForeignKey('t_employee.emp_id'), nullable=False)
     total_amount = db.Column(db.Numeric(12, 2), default=0.00, comment='总金额')
-    purchase_date = db.Column(db.DateTime, default=datetime.now, comment='入库日期')
+    purchase_date = db.Column(db.DateTime, nullable=False, default=datetime.now, comment='入库日期')
     status = db.Column(db.SmallInteger, default=1, comment='状态')
     
+    __table_args__ = (
+        db.Index('idx_purchase_date', 'purchase_date'),
+    )
+    
     # 关系
     details = db.relationship('PurchaseDetail', backref='order', lazy='dynamic',
                               cascade='all, delete-orphan')
@@ -191,6 +223,10 @@ class PurchaseDetail(db.Model):
     quantity = db.Column(db.Integer, nullable=False, comment='数量')
     unit_purc_price = db.Column(db.Numeric(10, 2), nullable=False, comment='进货单价')
     
+    __table_args__ = (
+        db.Index('idx_purchase_detail_order', 'po_id', 'med_id', 'batch_no', 'quantity'),
+    )
+    
     def __repr__(self):
         return f'<PurchaseDetail {self.pd_id}>'
     
@@ -207,10 +243,14 @@ class SalesOrder(db.Model):
     so_id = db.Column(db.String(20), primary_key=True, comment='销售单号')
     emp_id = db.Column(db.Integer, db.ForeignKey('t_employee.emp_id'), nullable=False)
     cus_id = db.Column(db.Integer, db.ForeignKey('t_customer.cus_id'), nullable=True)
-    sale_time = db.Column(db.DateTime, default=datetime.now, comment='交易时间')
+    sale_time = db.Column(db.DateTime, nullable=False, default=datetime.now, comment='交易时间')
     total_price = db.Column(db.Numeric(12, 2), default=0.00, comment='总价')
     status = db.Column(db.SmallInteger, default=1, comment='状态')
     
+    __table_args__ = (
+        db.Index('idx_sales_time', 'sale_time'),
+    )
+    
     # 关系
     details = db.relationship('SalesDetail', backref='order', lazy='dynamic',
                               cascade='all, delete-orphan')
@@ -233,6 +273,12 @@ class SalesDetail(db.Model):
     med_id = db.Column(db.Integer, db.ForeignKey('t_medicine.med_id'), nullable=False, comment='药品ID')
     quantity = db.Column(db.Integer, nullable=False, comment='数量')
     unit_sell_price = db.Column(db.Numeric(10, 2), nullable=False, comment='售价')
+    unit_cost = db.Column(db.Numeric(10, 2), nullable=False, default=0.00,
+                          comment='成本单价（销售时的参考进价）')
+    
+    __table_args__ = (
+        db.Index('idx_sales_detail_order', 'so_id', 'batch_id', 'quantity'),
+    )
     
     def __repr__(self):
         return f'<SalesDetail {self.sd_id}>'
@@ -253,9 +299,13 @@ class InventoryCheck(db.Model):
     actual_qty = db.Column(db.Integer, nullable=False, comment='实物数量')
     diff_amount = db.Column(db.Numeric(12, 2), comment='盈亏金额')
     emp_id = db.Column(db.Integer, db.ForeignKey('t_employee.emp_id'), nullable=False)
-    check_time = db.Column(db.DateTime, default=datetime.now, comment='盘点时间')
+    check_time = db.Column(db.DateTime, nullable=False, default=datetime.now, comment='盘点时间')
     remark = db.Column(db.String(200), comment='备注')
     
+    __table_args__ = (
+        db.Index('idx_inventory_check_time', 'check_time'),
+    )
+    
     # 关系
     stock_batch = db.relationship('StockBatch', backref='checks')
     employee = db.relationship('Employee', backref='inventory_checks')
@@ -278,11 +328,18 @@ class PurchaseReturn(db.Model):
     sup_id = db.Column(db.Integer, db.ForeignKey('t_supplier.sup_id'), nullable=False)
     batch_id = db.Column(db.Integer, db.ForeignKey('t_stock_batch.batch_id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, comment='退回数量')
-    return_time = db.Column(db.DateTime, default=datetime.now, comment='退货时间')
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False, default=0.00,
+                           comment='退出单价（退出时的参考进价）')
+    return_time = db.Column(db.DateTime, nullable=False, default=datetime.now, comment='退货时间')
     reason = db.Column(db.String(200), comment='退货原因')
     status = db.Column(db.SmallInteger, default=1, comment='状态')
     emp_id = db.Column(db.Integer, db.ForeignKey('t_employee.emp_id'), nullable=False)
     
+    __table_args__ = (
+        db.Index('idx_purchase_return_order', 'po_id', 'batch_id'),
+        db.Index('idx_purchase_return_time', 'return_time', 'pr_id'),
+    )
+    
     # 关系
     purchase_order = db.relationship('PurchaseOrder', backref='returns')
     supplier = db.relationship('Supplier', backref='purchase_returns')
@@ -305,11 +362,18 @@ class SalesReturn(db.Model):
     so_id = db.Column(db.String(20), db.ForeignKey('t_sales_order.so_id'), nullable=False)
     batch_id = db.Column(db.Integer, db.ForeignKey('t_stock_batch.batch_id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, comment='退回数量')
-    return_time = db.Column(db.DateTime, default=datetime.now, comment='退货时间')
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False, default=0.00,
+                           comment='退货单价（退货时的参考售价）')
+    return_time = db.Column(db.DateTime, nullable=False, default=datetime.now, comment='退货时间')
     reason = db.Column(db.String(200), comment='退货原因')
     status = db.Column(db.SmallInteger, default=1, comment='状态')
     emp_id = db.Column(db.Integer, db.ForeignKey('t_employee.emp_id'), nullable=False)
     
+    __table_args__ = (
+        db.Index('idx_sales_return_order', 'so_id', 'batch_id'),
+        db.Index('idx_sales_return_time', 'return_time', 'sr_id'),
+    )
+    
     # 关系
     sales_order = db.relationship('SalesOrder', backref='returns')
     stock_batch = db.relationship('StockBatch', backref='sales_returns')
@@ -346,3 +410,98 @@ class FinanceDaily(db.Model):
         return (float(self.sales_profit or 0) - float(self.sales_return_amt or 0) + 
                 float(self.purc_return_amt or 0) - float(self.inv_loss_amt or 0) + 
                 float(self.inv_gain_amt or 0))
+
+
+class FinanceMonthly(db.Model):
+    """财务月汇总表（由日结行汇总维护）"""
+    __tablename__ = 't_finance_monthly'
+
+    year = db.Column(db.SmallInteger, primary_key=True, autoincrement=False, comment='年份')
+    month = db.Column(db.SmallInteger, primary_key=True, autoincrement=False, comment='月份')
+    sales_revenue = db.Column(db.Numeric(14, 2), default=0.00, comment='销售收入')
+    sales_profit = db.Column(db.Numeric(14, 2), default=0.00, comment='销售毛利润')
+    sales_return_amt = db.Column(db.Numeric(14, 2), default=0.00, comment='销售退货金额')
+    purc_return_amt = db.Column(db.Numeric(14, 2), default=0.00, comment='购进退出金额')
+    inv_loss_amt = db.Column(db.Numeric(14, 2), default=0.00, comment='盘点亏损金额')
+    inv_gain_amt = db.Column(db.Numeric(14, 2), default=0.00, comment='盘点盈余金额')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f'<FinanceMonthly {self.year}-{self.month}>'
+
+
+class FinanceAnnual(db.Model):
+    """财务年汇总表（由日结行汇总维护）"""
+    __tablename__ = 't_finance_annual'
+
+    year = db.Column(db.SmallInteger, primary_key=True, autoincrement=False, comment='年份')
+    sales_revenue = db.Column(db.Numeric(14, 2), default=0.00, comment='销售收入')
+    sales_profit = db.Column(db.Numeric(14, 2), default=0.00, comment='销售毛利润')
+    sales_return_amt = db.Column(db.Numeric(14, 2), default=0.00, comment='销售退货金额')
+    purc_return_amt = db.Column(db.Numeric(14, 2), default=0.00, comment='购进退出金额')
+    inv_loss_amt = db.Column(db.Numeric(14, 2), default=0.00, comment='盘点亏损金额')
+    inv_gain_amt = db.Column(db.Numeric(14, 2), default=0.00, comment='盘点盈余金额')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f'<FinanceAnnual {self.year}>'
+
+
+class SalesDaily(db.Model):
+    """销售日汇总表（随销售/退单在同一事务内增量维护）"""
+    __tablename__ = 't_sales_daily'
+    
+    sale_date = db.Column(db.Date, primary_key=True, comment='销售日期')
+    order_count = db.Column(db.Integer, default=0, comment='订单数')
+    quantity = db.Column(db.Integer, default=0, comment='销售数量')
+    revenue = db.Column(db.Numeric(14, 2), default=0.00, comment='销售额')
+    cost = db.Column(db.Numeric(14, 2), default=0.00, comment='成本(参考进价)')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f'<SalesDaily {self.sale_date}>'
+    
+    @property
+    def profit(self):
+        """毛利"""
+        return float(self.revenue or 0) - float(self.cost or 0)
+
+
+class SalesDailyFact(db.Model):
+    """销售日事实表（按日、按药品汇总）"""
+    __tablename__ = 't_sales_daily_fact'
+    
+    sale_date = db.Column(db.Date, primary_key=True, comment='销售日期')
+    med_id = db.Column(db.Integer, db.ForeignKey('t_medicine.med_id'), primary_key=True)
+    order_count = db.Column(db.Integer, default=0, comment='包含该药品的订单数')
+    quantity = db.Column(db.Integer, default=0, comment='销售数量')
+    revenue = db.Column(db.Numeric(14, 2), default=0.00, comment='销售额')
+    cost = db.Column(db.Numeric(14, 2), default=0.00, comment='成本(参考进价)')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f'<SalesDailyFact {self.sale_date} {self.med_id}>'
+
+
+class IdSequence(db.Model):
+    """单号序列表（按 前缀+日期 分段发号）"""
+    __tablename__ = 't_id_sequence'
+    
+    seq_key = db.Column(db.String(20), primary_key=True, comment='序列键(前缀+日期)')
+    next_val = db.Column(db.Integer, nullable=False, default=1, comment='下一个未分配的序号')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f'<IdSequence {self.seq_key}>'
+
+
+class ChangeMarker(db.Model):
+    """变更标记表（进程内索引据此判断依赖的数据是否被其他进程修改）"""
+    __tablename__ = 't_change_marker'
+    
+    marker_key = db.Column(db.String(30), primary_key=True, comment='标记键')
+    version = db.Column(db.BigInteger, nullable=False, default=0, comment='版本号(每次相关修改递增)')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f'<ChangeMarker {self.marker_key}={self.version}>'
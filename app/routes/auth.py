@@ -49,48 +49,17 @@ def role_required(*roles):
 @login_required
 def index():
     """首页/仪表盘"""
+    from app.services import dashboard
     
-    # 获取统计数据
-    from app.models import Medicine, StockBatch, SalesOrder, PurchaseOrder
-    from datetime import date, datetime
-    from sqlalchemy import func
-    
-    today = date.today()
-    
-    # 药品总数
-    medicine_count = Medicine.query.count()
-    
-    # 低库存药品数
-    low_stock_count = Medicine.query.filter(Medicine.total_stock < Medicine.alert_qty).count()
-    
-    # 临期药品数 (6个月内)
-    from datetime import timedelta
-    expiry_threshold = today + timedelta(days=180)
-    expiring_count = db.session.query(func.count(func.distinct(StockBatch.med_id))).filter(
-        StockBatch.cur_batch_qty > 0,
-        StockBatch.expiry_date <= expiry_threshold
-    ).scalar()
-    
-    # 今日销售额
-    today_start = datetime.combine(today, datetime.min.time())
-    today_end = datetime.combine(today, datetime.max.time())
-    today_sales = db.session.query(func.sum(SalesOrder.total_price)).filter(
-        SalesOrder.sale_time.between(today_start, today_end),
-        SalesOrder.status == 1
-    ).scalar() or 0
-    
-    # 今日进货额
-    today_purchase = db.session.query(func.sum(PurchaseOrder.total_amount)).filter(
-        PurchaseOrder.purchase_date.between(today_start, today_end),
-        PurchaseOrder.status == 1
-    ).scalar() or 0
+    # 统计快照（短时缓存，写操作后失效）
+    snapshot = dashboard.get_snapshot()
     
     return render_template('index.html', 
-                          medicine_count=medicine_count,
-                          low_stock_count=low_stock_count,
-                          expiring_count=expiring_count,
-                          today_sales=float(today_sales),
-                          today_purchase=float(today_purchase))
+                          medicine_count=snapshot['medicine_count'],
+                          low_stock_count=snapshot['low_stock_count'],
+                          expiring_count=snapshot['expiring_count'],
+                          today_sales=snapshot['today_sales'],
+                          today_purchase=snapshot['today_purchase'])
 
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
@@ -5,6 +5,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from app import db
 from app.models import Customer
 from app.routes.auth import login_required
+from app.services import picker
 
 customer_bp = Blueprint('customer', __name__)
 
@@ -46,6 +47,7 @@ def add():
         )
         db.session.add(customer)
         db.session.commit()
+        picker.invalidate('customer')
         flash('客户添加成功', 'success')
         return redirect(url_for('customer.list'))
     
@@ -66,6 +68,7 @@ def edit(cus_id):
         customer.medical_history = request.form.get('medical_history')
         
         db.session.commit()
+        picker.invalidate('customer')
         flash('客户信息更新成功', 'success')
         return redirect(url_for('customer.list'))
     
@@ -100,3 +103,10 @@ def api_search():
         'phone': c.phone,
         'medical_history': c.medical_history
     } for c in customers])
+
+
+@customer_bp.route('/api/picker')
+@login_required
+def api_picker():
+    """客户选择器API：按手机号/姓名前缀分页查询"""
+    return jsonify(picker.customers(request.args.get('q', ''), request.args.get('page', 1, type=int)))
@@ -2,17 +2,20 @@
 财务管理路由
 包括日结统计、月度报表等
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, date, timedelta
-from sqlalchemy import func, and_, or_, extract, text
 from app import db
-from app.models import FinanceDaily, SalesOrder, SalesDetail, StockBatch, InventoryCheck
+from app.models import FinanceDaily
+from app.services import finance_ledger, finance_backfill, finance_rollup
+from app.services.monthly_report import build_report
+from app.db_routing import replica_read
 
 bp = Blueprint('finance', __name__, url_prefix='/finance')
 
 
 @bp.route('/daily')
+@replica_read
 @login_required
 def daily_report():
     """财务日结报表"""
@@ -23,67 +26,32 @@ def daily_report():
     year = request.args.get('year', date.today().year, type=int)
     month = request.args.get('month', date.today().month, type=int)
     
-    # 查询该月的财务数据
+    # 查询该月的财务数据（按主键范围过滤）
+    month_start, month_end = finance_rollup.month_bounds(year, month)
     query = FinanceDaily.query.filter(
-        extract('year', FinanceDaily.day_id) == year,
-        extract('month', FinanceDaily.day_id) == month
+        FinanceDaily.day_id >= month_start,
+        FinanceDaily.day_id < month_end
     ).order_by(FinanceDaily.day_id.desc())
     
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     records = pagination.items
     
-    # 计算月度合计
-    month_sum = db.session.query(
-        func.sum(FinanceDaily.sales_revenue).label('total_revenue'),
-        func.sum(FinanceDaily.sales_profit).label('total_profit'),
-        func.sum(FinanceDaily.sales_return_amt).label('total_sales_return'),
-        func.sum(FinanceDaily.purc_return_amt).label('total_purc_return'),
-        func.sum(FinanceDaily.inv_loss_amt).label('total_inv_loss'),
-        func.sum(FinanceDaily.inv_gain_amt).label('total_inv_gain')
-    ).filter(
-        extract('year', FinanceDaily.day_id) == year,
-        extract('month', FinanceDaily.day_id) == month
-    ).first()
-    
-    # 处理空结果
-    if month_sum:
-        total_revenue = float(month_sum.total_revenue or 0)
-        total_profit = float(month_sum.total_profit or 0)
-        total_sales_return = float(month_sum.total_sales_return or 0)
-        total_purc_return = float(month_sum.total_purc_return or 0)
-        total_inv_loss = float(month_sum.total_inv_loss or 0)
-        total_inv_gain = float(month_sum.total_inv_gain or 0)
-        
-        month_sum_dict = {
-            'total_revenue': total_revenue,
-            'total_profit': total_profit,
-            'total_sales_return': total_sales_return,
-            'total_purc_return': total_purc_return,
-            'total_inv_loss': total_inv_loss,
-            'total_inv_gain': total_inv_gain
-        }
-    else:
-        month_sum_dict = {
-            'total_revenue': 0,
-            'total_profit': 0,
-            'total_sales_return': 0,
-            'total_purc_return': 0,
-            'total_inv_loss': 0,
-            'total_inv_gain': 0
-        }
+    # 月度合计直接读取月汇总
+    month_sum_dict = _totals(finance_rollup.get_month(year, month))
     
     return render_template('finance/daily.html',
                          records=records,
                          pagination=pagination,
                          year=year,
                          month=month,
-                         month_sum=month_sum_dict)
+                         month_sum=month_sum_dict,
+                         today=date.today().isoformat())
 
 
 @bp.route('/daily/settlement', methods=['POST'])
 @login_required
 def daily_settlement():
-    """执行日结统计"""
+    """日结核对：按源表全量重算当日数据，修复与实时记账不一致之处"""
     try:
         # 获取要结算的日期
         settle_date = request.form.get('settle_date')
@@ -92,14 +60,15 @@ def daily_settlement():
         else:
             settle_date = datetime.strptime(settle_date, '%Y-%m-%d').date()
         
-        # 调用存储过程进行日结
-        db.session.execute(
-            text('CALL sp_daily_finance_settlement(:p_date)'),
-            {'p_date': settle_date}
-        )
+        # 结束登录校验的读事务，日结在新事务中先锁定日结行再读源表
+        db.session.commit()
+        diffs = finance_ledger.settle_day(settle_date)
         db.session.commit()
         
-        flash(f'{settle_date} 日结统计完成', 'success')
+        if diffs:
+            flash(f'{settle_date} 日结核对完成，已修复 {len(diffs)} 项差异', 'warning')
+        else:
+            flash(f'{settle_date} 日结核对完成，数据一致', 'success')
         
     except Exception as e:
         db.session.rollback()
@@ -108,45 +77,54 @@ def daily_settlement():
     return redirect(url_for('finance.daily_report'))
 
 
+@bp.route('/daily/settlement_range', methods=['POST'])
+@login_required
+def daily_settlement_range():
+    """区间日结：按日分组批量重算 [开始日期, 结束日期] 内每天的日结数据"""
+    try:
+        start = datetime.strptime(request.form.get('start_date', ''), '%Y-%m-%d').date()
+        end = datetime.strptime(request.form.get('end_date', ''), '%Y-%m-%d').date()
+        if start > end:
+            flash('开始日期不能晚于结束日期', 'danger')
+            return redirect(url_for('finance.daily_report'))
+        max_days = current_app.config.get('FINANCE_SETTLE_RANGE_MAX_DAYS', 92)
+        if (end - start).days + 1 > max_days:
+            flash(f'区间日结最多 {max_days} 天，更长的区间请使用命令 '
+                  f'flask finance-settle --start {start} --end {end}', 'warning')
+            return redirect(url_for('finance.daily_report'))
+        
+        app = current_app._get_current_object()
+        days = finance_backfill.backfill(
+            app, start, end, workers=app.config.get('FINANCE_BACKFILL_WORKERS', 4))
+        flash(f'区间日结完成：{start} ~ {end}，共重算 {days} 天', 'success')
+        
+    except ValueError:
+        db.session.rollback()
+        flash('请输入有效的开始与结束日期', 'danger')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'区间日结失败：{str(e)}', 'danger')
+    
+    return redirect(url_for('finance.daily_report'))
+
+
 @bp.route('/monthly')
+@replica_read
 @login_required
 def monthly_report():
     """月度财务报表"""
     year = request.args.get('year', date.today().year, type=int)
     month = request.args.get('month', date.today().month, type=int)
+    month_start, month_end = finance_rollup.month_bounds(year, month)
     
-    # 调用存储过程获取月度汇总
-    proc_result = db.session.execute(
-        text('CALL sp_monthly_report(:p_year, :p_month)'),
-        {'p_year': year, 'p_month': month}
-    ).fetchone()
-    
-    monthly_data_dict = {
-        'total_revenue': 0.0,
-        'total_profit': 0.0,
-        'total_sales_return': 0.0,
-        'total_purc_return': 0.0,
-        'total_inv_loss': 0.0,
-        'total_inv_gain': 0.0,
-        'days_count': FinanceDaily.query.filter(
-            extract('year', FinanceDaily.day_id) == year,
-            extract('month', FinanceDaily.day_id) == month
-        ).count(),
-        'order_count': 0
-    }
-    
-    if proc_result:
-        monthly_data_dict['total_revenue'] = float(proc_result.total_sales or 0)
-        monthly_data_dict['total_inv_loss'] = float(proc_result.inventory_loss or 0)
-        monthly_data_dict['order_count'] = int(proc_result.order_count or 0)
-    
-    # 计算净利润（目前存储过程未返回利润相关字段，默认以0处理）
-    net_profit = 0
+    # 各项指标按源表独立统计
+    monthly_data_dict = build_report(year, month)
+    net_profit = monthly_data_dict['net_profit']
     
     # 获取每日趋势数据
     daily_trend = FinanceDaily.query.filter(
-        extract('year', FinanceDaily.day_id) == year,
-        extract('month', FinanceDaily.day_id) == month
+        FinanceDaily.day_id >= month_start,
+        FinanceDaily.day_id < month_end
     ).order_by(FinanceDaily.day_id).all()
     
     return render_template('finance/monthly.html',
@@ -158,62 +136,25 @@ def monthly_report():
 
 
 @bp.route('/annual')
+@replica_read
 @login_required
 def annual_report():
     """年度财务报表"""
     year = request.args.get('year', date.today().year, type=int)
     
-    # 按月份统计年度数据
-    monthly_stats = db.session.query(
-        extract('month', FinanceDaily.day_id).label('month'),
-        func.sum(FinanceDaily.sales_revenue).label('revenue'),
-        func.sum(FinanceDaily.sales_profit).label('profit'),
-        func.sum(FinanceDaily.sales_return_amt).label('sales_return'),
-        func.sum(FinanceDaily.purc_return_amt).label('purc_return'),
-        func.sum(FinanceDaily.inv_loss_amt).label('inv_loss'),
-        func.sum(FinanceDaily.inv_gain_amt).label('inv_gain')
-    ).filter(
-        extract('year', FinanceDaily.day_id) == year
-    ).group_by('month').order_by('month').all()
+    # 按月份统计年度数据（读取月汇总）
+    monthly_stats = [{
+        'month': m['month'],
+        'revenue': m['sales_revenue'],
+        'profit': m['sales_profit'],
+        'sales_return': m['sales_return_amt'],
+        'purc_return': m['purc_return_amt'],
+        'inv_loss': m['inv_loss_amt'],
+        'inv_gain': m['inv_gain_amt']
+    } for m in finance_rollup.get_year_months(year)]
     
-    # 计算年度总计
-    annual_sum = db.session.query(
-        func.sum(FinanceDaily.sales_revenue).label('total_revenue'),
-        func.sum(FinanceDaily.sales_profit).label('total_profit'),
-        func.sum(FinanceDaily.sales_return_amt).label('total_sales_return'),
-        func.sum(FinanceDaily.purc_return_amt).label('total_purc_return'),
-        func.sum(FinanceDaily.inv_loss_amt).label('total_inv_loss'),
-        func.sum(FinanceDaily.inv_gain_amt).label('total_inv_gain')
-    ).filter(
-        extract('year', FinanceDaily.day_id) == year
-    ).first()
-    
-    # 处理空结果
-    if annual_sum:
-        total_revenue = float(annual_sum.total_revenue or 0)
-        total_profit = float(annual_sum.total_profit or 0)
-        total_sales_return = float(annual_sum.total_sales_return or 0)
-        total_purc_return = float(annual_sum.total_purc_return or 0)
-        total_inv_loss = float(annual_sum.total_inv_loss or 0)
-        total_inv_gain = float(annual_sum.total_inv_gain or 0)
-        
-        annual_sum_dict = {
-            'total_revenue': total_revenue,
-            'total_profit': total_profit,
-            'total_sales_return': total_sales_return,
-            'total_purc_return': total_purc_return,
-            'total_inv_loss': total_inv_loss,
-            'total_inv_gain': total_inv_gain
-        }
-    else:
-        annual_sum_dict = {
-            'total_revenue': 0,
-            'total_profit': 0,
-            'total_sales_return': 0,
-            'total_purc_return': 0,
-            'total_inv_loss': 0,
-            'total_inv_gain': 0
-        }
+    # 年度总计（读取年汇总）
+    annual_sum_dict = _totals(finance_rollup.get_year(year))
     
     # 计算年度净利润
     annual_net_profit = 0
@@ -232,6 +173,7 @@ def annual_report():
 
 
 @bp.route('/api/chart_data')
+@replica_read
 @login_required
 def get_chart_data():
     """获取图表数据"""
@@ -241,9 +183,10 @@ def get_chart_data():
     
     if chart_type == 'daily':
         # 日度数据
+        month_start, month_end = finance_rollup.month_bounds(year, month)
         records = FinanceDaily.query.filter(
-            extract('year', FinanceDaily.day_id) == year,
-            extract('month', FinanceDaily.day_id) == month
+            FinanceDaily.day_id >= month_start,
+            FinanceDaily.day_id < month_end
         ).order_by(FinanceDaily.day_id).all()
         
         data = {
@@ -254,18 +197,24 @@ def get_chart_data():
         }
     else:
         # 月度数据
-        monthly_stats = db.session.query(
-            extract('month', FinanceDaily.day_id).label('month'),
-            func.sum(FinanceDaily.sales_revenue).label('revenue'),
-            func.sum(FinanceDaily.sales_profit).label('profit')
-        ).filter(
-            extract('year', FinanceDaily.day_id) == year
-        ).group_by('month').order_by('month').all()
+        monthly_stats = finance_rollup.get_year_months(year)
         
         data = {
-            'months': [f'{int(m.month)}月' for m in monthly_stats],
-            'revenue': [float(m.revenue or 0) for m in monthly_stats],
-            'profit': [float(m.profit or 0) for m in monthly_stats]
+            'months': [f'{m["month"]}月' for m in monthly_stats],
+            'revenue': [m['sales_revenue'] for m in monthly_stats],
+            'profit': [m['sales_profit'] for m in monthly_stats]
         }
     
     return jsonify(data)
+
+
+def _totals(values):
+    """汇总金额转换为模板使用的合计字段"""
+    return {
+        'total_revenue': values['sales_revenue'],
+        'total_profit': values['sales_profit'],
+        'total_sales_return': values['sales_return_amt'],
+        'total_purc_return': values['purc_return_amt'],
+        'total_inv_loss': values['inv_loss_amt'],
+        'total_inv_gain': values['inv_gain_amt']
+    }
@@ -1,10 +1,13 @@
 """
 药品管理路由
 """
+from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app import db
-from app.models import Medicine, StockBatch
+from app.models import Medicine, MedicineBarcode, StockBatch
 from app.routes.auth import login_required
+from app.services import stock_index, dashboard, medicine_search, barcode_index, picker, change_marker
+from app.services.pagination import IdListPagination
 
 medicine_bp = Blueprint('medicine', __name__)
 
@@ -17,16 +20,18 @@ def list():
     keyword = request.args.get('keyword', '')
     category = request.args.get('category', '')
     
-    query = Medicine.query
-    
     if keyword:
-        query = query.filter(Medicine.med_name.like(f'%{keyword}%'))
-    if category:
-        query = query.filter(Medicine.category == category)
-    
-    pagination = query.order_by(Medicine.med_id.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+        # 关键字查询走搜索索引（名称/拼音/规格/厂家），按相关度排序，每页按主键取行
+        ids = medicine_search.search(keyword, limit=None, category=category or None)
+        pagination = IdListPagination(ids=ids, column=Medicine.med_id,
+                                      page=page, per_page=10, error_out=False)
+    else:
+        query = Medicine.query
+        if category:
+            query = query.filter(Medicine.category == category)
+        pagination = query.order_by(Medicine.med_id.desc()).paginate(
+            page=page, per_page=10, error_out=False
+        )
     
     return render_template('medicine/list.html', 
                           pagination=pagination,
@@ -39,18 +44,24 @@ def list():
 def add():
     """添加药品"""
     if request.method == 'POST':
-        medicine = Medicine(
-            med_name=request.form.get('med_name'),
-            spec=request.form.get('spec'),
-            category=request.form.get('category'),
-            unit=request.form.get('unit'),
-            factory=request.form.get('factory'),
-            ref_buy_price=float(request.form.get('ref_buy_price') or 0),
-            ref_sell_price=float(request.form.get('ref_sell_price') or 0),
-            alert_qty=int(request.form.get('alert_qty') or 10)
-        )
+        medicine = Medicine()
+        _fill_medicine(medicine)
+        extra_text = request.form.get('extra_barcodes', '')
+        try:
+            extra = _parse_extra_barcodes(extra_text)
+            _check_codes(medicine, extra)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return render_template('medicine/form.html', action='add', medicine=medicine,
+                                   extra_barcodes=extra_text)
+        medicine.extra_barcodes = [MedicineBarcode(barcode=code, pack_qty=qty) for code, qty in extra]
         db.session.add(medicine)
+        change_marker.bump(change_marker.MEDICINE_CATALOG)
         db.session.commit()
+        medicine_search.upsert(medicine)
+        barcode_index.upsert(medicine)
+        picker.invalidate('medicine')
+        dashboard.invalidate()
         flash('药品添加成功', 'success')
         return redirect(url_for('medicine.list'))
     
@@ -64,20 +75,96 @@ def edit(med_id):
     medicine = Medicine.query.get_or_404(med_id)
     
     if request.method == 'POST':
-        medicine.med_name = request.form.get('med_name')
-        medicine.spec = request.form.get('spec')
-        medicine.category = request.form.get('category')
-        medicine.unit = request.form.get('unit')
-        medicine.factory = request.form.get('factory')
-        medicine.ref_buy_price = float(request.form.get('ref_buy_price') or 0)
-        medicine.ref_sell_price = float(request.form.get('ref_sell_price') or 0)
-        medicine.alert_qty = int(request.form.get('alert_qty') or 10)
+        extra_text = request.form.get('extra_barcodes', '')
+        try:
+            extra = _parse_extra_barcodes(extra_text)
+            with db.session.no_autoflush:
+                _fill_medicine(medicine)
+                _check_codes(medicine, extra)
+        except ValueError as e:
+            # 放弃对持久对象的修改，用临时对象回显表单
+            db.session.rollback()
+            entered = Medicine(med_id=med_id)
+            _fill_medicine(entered)
+            flash(str(e), 'danger')
+            return render_template('medicine/form.html', action='edit', medicine=entered,
+                                   extra_barcodes=extra_text)
         
+        # 附加条码按条码对齐：保留的更新每扫数量，多余的删除，新增的插入
+        existing = {b.barcode: b for b in medicine.extra_barcodes}
+        for code, qty in extra:
+            if code in existing:
+                existing.pop(code).pack_qty = qty
+            else:
+                medicine.extra_barcodes.append(MedicineBarcode(barcode=code, pack_qty=qty))
+        for barcode in existing.values():
+            medicine.extra_barcodes.remove(barcode)
+        
+        change_marker.bump(change_marker.MEDICINE_CATALOG)
         db.session.commit()
+        medicine_search.upsert(medicine)
+        barcode_index.upsert(medicine)
+        picker.invalidate('medicine')
+        stock_index.invalidate([med_id])
+        dashboard.invalidate()
         flash('药品信息更新成功', 'success')
         return redirect(url_for('medicine.list'))
     
-    return render_template('medicine/form.html', action='edit', medicine=medicine)
+    extra_text = '\n'.join(f'{b.barcode}*{b.pack_qty}' for b in medicine.extra_barcodes)
+    return render_template('medicine/form.html', action='edit', medicine=medicine,
+                           extra_barcodes=extra_text)
+
+
+def _fill_medicine(medicine):
+    """把表单字段写入药品对象"""
+    medicine.med_name = request.form.get('med_name')
+    medicine.spec = request.form.get('spec')
+    medicine.category = request.form.get('category')
+    medicine.unit = request.form.get('unit')
+    medicine.factory = request.form.get('factory')
+    medicine.barcode = barcode_index.normalize(request.form.get('barcode')) or None
+    medicine.approval_no = barcode_index.normalize(request.form.get('approval_no')) or None
+    medicine.ref_buy_price = float(request.form.get('ref_buy_price') or 0)
+    medicine.ref_sell_price = float(request.form.get('ref_sell_price') or 0)
+    medicine.alert_qty = int(request.form.get('alert_qty') or 10)
+    medicine.catalog_updated_at = datetime.now()
+
+
+def _parse_extra_barcodes(text):
+    """解析附加条码：每行“条码*每扫数量”，数量省略时为 1"""
+    result = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        code, _, qty = line.replace('＊', '*').partition('*')
+        code = barcode_index.normalize(code)
+        try:
+            qty = int(qty.strip() or 1)
+        except ValueError:
+            raise ValueError(f'附加条码 {code} 的数量无效')
+        if not code or qty <= 0:
+            raise ValueError(f'附加条码格式错误: {line.strip()}')
+        result[code] = qty
+    return [(code, qty) for code, qty in result.items()]
+
+
+def _check_codes(medicine, extra):
+    """条码在单品条码与附加条码中都必须唯一"""
+    codes = [code for code, _ in extra]
+    if medicine.barcode:
+        if medicine.barcode in codes:
+            raise ValueError(f'条码 {medicine.barcode} 重复填写')
+        codes.append(medicine.barcode)
+    if not codes:
+        return
+    main = db.session.query(Medicine.barcode).filter(Medicine.barcode.in_(codes))
+    packs = db.session.query(MedicineBarcode.barcode).filter(MedicineBarcode.barcode.in_(codes))
+    if medicine.med_id:
+        main = main.filter(Medicine.med_id != medicine.med_id)
+        packs = packs.filter(MedicineBarcode.med_id != medicine.med_id)
+    taken = main.first() or packs.first()
+    if taken:
+        raise ValueError(f'条码 {taken[0]} 已被其他药品使用')
 
 
 @medicine_bp.route('/detail/<int:med_id>')
@@ -106,7 +193,13 @@ def delete(med_id):
         return redirect(url_for('medicine.list'))
     
     db.session.delete(medicine)
+    change_marker.bump(change_marker.MEDICINE_CATALOG)
     db.session.commit()
+    medicine_search.remove(med_id)
+    barcode_index.remove(med_id)
+    picker.invalidate('medicine')
+    stock_index.invalidate([med_id])
+    dashboard.invalidate()
     flash('药品删除成功', 'success')
     return redirect(url_for('medicine.list'))
 
@@ -114,11 +207,15 @@ def delete(med_id):
 @medicine_bp.route('/api/search')
 @login_required
 def api_search():
-    """药品搜索API (用于下拉选择)"""
-    keyword = request.args.get('q', '')
-    medicines = Medicine.query.filter(
-        Medicine.med_name.like(f'%{keyword}%')
-    ).limit(20).all()
+    """药品搜索API (用于下拉选择)，支持拼音首字母与全拼"""
+    keyword = request.args.get('q', '').strip()
+    if keyword:
+        # 索引给出排序后的前 20 个 ID，再按主键取当前价格与库存
+        ids = medicine_search.search(keyword)
+        rows = {m.med_id: m for m in Medicine.query.filter(Medicine.med_id.in_(ids))} if ids else {}
+        medicines = [rows[i] for i in ids if i in rows]
+    else:
+        medicines = Medicine.query.limit(20).all()
     
     return jsonify([{
         'id': m.med_id,
@@ -129,3 +226,10 @@ def api_search():
         'buy_price': float(m.ref_buy_price or 0),
         'sell_price': float(m.ref_sell_price or 0)
     } for m in medicines])
+
+
+@medicine_bp.route('/api/picker')
+@login_required
+def api_picker():
+    """药品选择器API：按关键字（同搜索索引）分页查询"""
+    return jsonify(picker.medicines(request.args.get('q', ''), request.args.get('page', 1, type=int)))
@@ -1,34 +1,35 @@
 """
 进货管理路由
 """
+import io
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
 from app import db
-from app.models import PurchaseOrder, PurchaseDetail, Medicine, Supplier
+from app.models import PurchaseOrder, PurchaseDetail, Supplier
 from app.routes.auth import login_required, role_required
 from datetime import datetime
-from sqlalchemy import text
+from decimal import Decimal
+from app.services.id_allocator import next_id
+from app.services.tx_retry import run_with_retry
+from app.services import stock_index, dashboard, read_models, receiving, purchase_import
+from app.services.pagination import keyset_paginate
 
 purchase_bp = Blueprint('purchase', __name__)
 
 
 def generate_po_id():
-    """调用数据库函数生成进货单号"""
-    po_id = db.session.execute(text("SELECT fn_generate_po_id()") ).scalar()
-    if not po_id:
-        raise RuntimeError('无法生成进货单号')
-    return po_id
+    """从号段分配器生成进货单号"""
+    return next_id('P')
 
 
 @purchase_bp.route('/')
 @login_required
 def list():
     """进货单列表"""
-    page = request.args.get('page', 1, type=int)
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
     sup_id = request.args.get('sup_id', '', type=int)
     
-    query = PurchaseOrder.query
+    query = read_models.purchase_order_rows()
     
     if start_date:
         query = query.filter(PurchaseOrder.purchase_date >= start_date)
@@ -37,9 +38,10 @@ def list():
     if sup_id:
         query = query.filter(PurchaseOrder.sup_id == sup_id)
     
-    pagination = query.order_by(PurchaseOrder.purchase_date.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    pagination = keyset_paginate(query, [
+        (PurchaseOrder.purchase_date, 'desc'),
+        (PurchaseOrder.po_id, 'desc')
+    ], per_page=10)
     
     suppliers = Supplier.query.filter_by(status=1).all()
     
@@ -63,59 +65,72 @@ def create():
             return jsonify({'success': False, 'message': '请添加进货明细'})
         
         try:
+            lines = [{
+                'med_id': int(item['med_id']),
+                'batch_no': item['batch_no'],
+                'produce_date': datetime.strptime(item['produce_date'], '%Y-%m-%d').date() if item.get('produce_date') else None,
+                'expiry_date': datetime.strptime(item['expiry_date'], '%Y-%m-%d').date(),
+                'quantity': int(item['quantity']),
+                'unit_price': Decimal(str(item['unit_price']))
+            } for item in data['items']]
+            
             # 生成单号
             po_id = generate_po_id()
-            
-            # 计算总金额
-            total_amount = sum(
-                item['quantity'] * item['unit_price'] 
-                for item in data['items']
-            )
-            
-            # 创建进货单
             order = PurchaseOrder(
                 po_id=po_id,
                 sup_id=int(data['sup_id']),
                 emp_id=session['user_id'],
-                total_amount=total_amount
+                total_amount=sum(line['unit_price'] * line['quantity'] for line in lines)
             )
             db.session.add(order)
+            db.session.flush()
             
-            # 创建明细 (触发器会自动更新库存)
-            for item in data['items']:
-                detail = PurchaseDetail(
-                    po_id=po_id,
-                    med_id=int(item['med_id']),
-                    batch_no=item['batch_no'],
-                    produce_date=datetime.strptime(item['produce_date'], '%Y-%m-%d').date() if item.get('produce_date') else None,
-                    expiry_date=datetime.strptime(item['expiry_date'], '%Y-%m-%d').date(),
-                    quantity=int(item['quantity']),
-                    unit_purc_price=float(item['unit_price'])
-                )
-                db.session.add(detail)
+            # 明细、批次与总库存以集合语句写入
+            _, med_ids = receiving.receive(po_id, lines)
             
             db.session.commit()
+            stock_index.invalidate(med_ids)
+            dashboard.invalidate()
             return jsonify({'success': True, 'message': f'进货单 {po_id} 创建成功', 'po_id': po_id})
         
         except Exception as e:
             db.session.rollback()
             return jsonify({'success': False, 'message': f'创建失败: {str(e)}'})
     
+    # 药品由页面上的选择器按需分页查询
     suppliers = Supplier.query.filter_by(status=1).all()
-    # medicines = Medicine.query.all()
-    # return render_template('purchase/create.html', 
-    #                       suppliers=suppliers, 
-    #                       medicines=medicines)
-    medicines = Medicine.query.all()
-    medicines_data = [{
-        'med_id': m.med_id,
-        'med_name': m.med_name,
-        'spec': m.spec,
-        'ref_buy_price': float(m.ref_buy_price or 0)
-    } for m in medicines]
-    return render_template('purchase/create.html', 
-                        suppliers=suppliers, 
-                        medicines=medicines_data)
+    return render_template('purchase/create.html', suppliers=suppliers)
+
+
+@purchase_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+@role_required('Admin', 'Stock')
+def import_delivery():
+    """导入供应商到货单（CSV/JSONL）；上传文件或直接以请求体发送，逐行流式处理"""
+    if request.method == 'GET':
+        return render_template('purchase/import.html')
+    
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            fmt = purchase_import.detect_format(upload.filename)
+            raw = upload.stream
+        else:
+            fmt = request.args.get('format') or ('jsonl' if 'json' in (request.mimetype or '') else 'csv')
+            raw = request.stream
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        report = purchase_import.import_stream(stream, fmt, session['user_id'])
+    except (purchase_import.DeliveryFileError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'文件无法读取: {e}'}), 400
+    
+    if report.med_ids:
+        stock_index.invalidate(report.med_ids)
+        dashboard.invalidate()
+    result = report.to_dict()
+    result['success'] = report.error_count == 0
+    result['message'] = f'共 {report.total} 行，导入 {report.imported} 行，失败 {report.error_count} 行'
+    return jsonify(result)
 
 
 @purchase_bp.route('/detail/<po_id>')
@@ -134,39 +149,22 @@ def detail(po_id):
 @login_required
 @role_required('Admin', 'Stock')
 def cancel(po_id):
-    """撤销进货单"""
-    order = PurchaseOrder.query.get_or_404(po_id)
-    
-    if order.status != 1:
-        flash('该进货单已被撤销', 'warning')
-        return redirect(url_for('purchase.detail', po_id=po_id))
+    """撤销进货单：锁定单据与涉及的批次，复核后以集合语句回扣库存，整单一个事务"""
+    PurchaseOrder.query.get_or_404(po_id)
     
-    # 检查是否有药品已被销售
-    for detail in order.details:
-        from app.models import StockBatch
-        batch = StockBatch.query.filter_by(
-            med_id=detail.med_id, 
-            batch_no=detail.batch_no
-        ).first()
-        
-        if batch and batch.cur_batch_qty < detail.quantity:
-            flash(f'药品 {detail.medicine.med_name} 批号 {detail.batch_no} 已有部分被销售，无法撤销', 'danger')
-            return redirect(url_for('purchase.detail', po_id=po_id))
+    def cancel_order():
+        med_ids = receiving.cancel_receipt(po_id)
+        db.session.commit()
+        return med_ids
     
-    # 撤销：扣减库存
-    for detail in order.details:
-        from app.models import StockBatch
-        batch = StockBatch.query.filter_by(
-            med_id=detail.med_id, 
-            batch_no=detail.batch_no
-        ).first()
-        
-        if batch:
-            batch.cur_batch_qty -= detail.quantity
-            medicine = Medicine.query.get(detail.med_id)
-            medicine.total_stock -= detail.quantity
+    try:
+        med_ids = run_with_retry('purchase.cancel', cancel_order)
+    except Exception as e:
+        db.session.rollback()
+        flash(f'撤销失败: {str(e)}', 'warning' if isinstance(e, receiving.CancelError) else 'danger')
+        return redirect(url_for('purchase.detail', po_id=po_id))
     
-    order.status = 0
-    db.session.commit()
+    stock_index.invalidate(med_ids)
+    dashboard.invalidate()
     flash('进货单已撤销', 'success')
     return redirect(url_for('purchase.list'))
@@ -3,8 +3,10 @@
 """
 from flask import Blueprint, render_template, request, jsonify
 from app import db
-from app.models import SalesOrder, SalesDetail, PurchaseOrder, PurchaseDetail, StockBatch, Medicine
+from app.models import (SalesOrder, SalesDetail, PurchaseOrder, PurchaseDetail, StockBatch, Medicine,
+                        SalesDaily, SalesDailyFact)
 from app.routes.auth import login_required, role_required
+from app.db_routing import replica_read
 from datetime import datetime, date, timedelta
 from sqlalchemy import func, text
 
@@ -20,6 +22,7 @@ def index():
 
 
 @report_bp.route('/sales')
+@replica_read
 @login_required
 @role_required('Admin', 'Finance', 'Sales')
 def sales_report():
@@ -35,59 +38,49 @@ def sales_report():
     if not end_date:
         end_date = today.strftime('%Y-%m-%d')
     
+    # 读取预聚合的销售日汇总（按主键范围扫描）
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    except ValueError:
+        start, end = today - timedelta(days=30), today
+        start_date, end_date = start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+    
+    daily_rows = SalesDaily.query.filter(
+        SalesDaily.sale_date >= start,
+        SalesDaily.sale_date <= end,
+        SalesDaily.order_count > 0
+    ).order_by(SalesDaily.sale_date.desc()).all()
+    
     if report_type == 'daily':
         # 日报表
-        query = db.session.query(
-            func.date(SalesOrder.sale_time).label('sale_date'),
-            func.count(func.distinct(SalesOrder.so_id)).label('order_count'),
-            func.sum(SalesDetail.quantity).label('total_qty'),
-            func.sum(SalesDetail.quantity * SalesDetail.unit_sell_price).label('total_sales'),
-            func.sum(SalesDetail.quantity * (SalesDetail.unit_sell_price - Medicine.ref_buy_price)).label('total_profit')
-        ).join(
-            SalesDetail, SalesOrder.so_id == SalesDetail.so_id
-        ).join(
-            StockBatch, SalesDetail.batch_id == StockBatch.batch_id
-        ).join(
-            Medicine, StockBatch.med_id == Medicine.med_id
-        ).filter(
-            SalesOrder.status == 1,
-            SalesOrder.sale_time >= start_date,
-            SalesOrder.sale_time <= end_date + ' 23:59:59'
-        ).group_by(
-            func.date(SalesOrder.sale_time)
-        ).order_by(
-            func.date(SalesOrder.sale_time).desc()
-        ).all()
+        query = [{
+            'sale_date': d.sale_date,
+            'order_count': d.order_count,
+            'total_qty': d.quantity,
+            'total_sales': d.revenue,
+            'total_profit': d.profit
+        } for d in daily_rows]
     else:
-        # 月报表
-        query = db.session.query(
-            func.date_format(SalesOrder.sale_time, '%Y-%m').label('sale_month'),
-            func.count(func.distinct(SalesOrder.so_id)).label('order_count'),
-            func.sum(SalesDetail.quantity).label('total_qty'),
-            func.sum(SalesDetail.quantity * SalesDetail.unit_sell_price).label('total_sales'),
-            func.sum(SalesDetail.quantity * (SalesDetail.unit_sell_price - Medicine.ref_buy_price)).label('total_profit')
-        ).join(
-            SalesDetail, SalesOrder.so_id == SalesDetail.so_id
-        ).join(
-            StockBatch, SalesDetail.batch_id == StockBatch.batch_id
-        ).join(
-            Medicine, StockBatch.med_id == Medicine.med_id
-        ).filter(
-            SalesOrder.status == 1,
-            SalesOrder.sale_time >= start_date,
-            SalesOrder.sale_time <= end_date + ' 23:59:59'
-        ).group_by(
-            func.date_format(SalesOrder.sale_time, '%Y-%m')
-        ).order_by(
-            func.date_format(SalesOrder.sale_time, '%Y-%m').desc()
-        ).all()
+        # 月报表（由日汇总在内存中合并）
+        months = {}
+        for d in daily_rows:
+            m = months.setdefault(d.sale_date.strftime('%Y-%m'), {
+                'sale_month': d.sale_date.strftime('%Y-%m'),
+                'order_count': 0, 'total_qty': 0, 'total_sales': 0.0, 'total_profit': 0.0
+            })
+            m['order_count'] += d.order_count or 0
+            m['total_qty'] += d.quantity or 0
+            m['total_sales'] += float(d.revenue or 0)
+            m['total_profit'] += d.profit
+        query = [months[k] for k in sorted(months, reverse=True)]
     
     # 计算汇总
     summary = {
-        'total_orders': sum(r.order_count or 0 for r in query),
-        'total_qty': sum(r.total_qty or 0 for r in query),
-        'total_sales': sum(float(r.total_sales or 0) for r in query),
-        'total_profit': sum(float(r.total_profit or 0) for r in query)
+        'total_orders': sum(r['order_count'] or 0 for r in query),
+        'total_qty': sum(r['total_qty'] or 0 for r in query),
+        'total_sales': sum(float(r['total_sales'] or 0) for r in query),
+        'total_profit': sum(float(r['total_profit'] or 0) for r in query)
     }
     
     return render_template('report/sales.html',
@@ -99,26 +92,44 @@ def sales_report():
 
 
 @report_bp.route('/top_selling')
+@replica_read
 @login_required
 @role_required('Admin', 'Finance', 'Sales')
 def top_selling():
-    """畅销榜单（使用视图）"""
-    from sqlalchemy import text
+    """畅销榜单（读取按药品的销售日事实表）"""
     limit = request.args.get('limit', 10, type=int)
+    days = request.args.get('days', 0, type=int)   # 0 表示不限时间
     
-    # 直接使用v_top_selling视图
-    query = db.session.execute(
-        text(f"SELECT * FROM v_top_selling LIMIT :limit"),
-        {"limit": limit}
-    ).fetchall()
+    query = db.session.query(
+        Medicine.med_id,
+        Medicine.med_name,
+        Medicine.spec,
+        Medicine.category,
+        func.sum(SalesDailyFact.quantity).label('total_sold'),
+        func.sum(SalesDailyFact.revenue).label('total_revenue'),
+        func.sum(SalesDailyFact.order_count).label('order_count')
+    ).join(
+        Medicine, SalesDailyFact.med_id == Medicine.med_id
+    )
+    if days > 0:
+        query = query.filter(SalesDailyFact.sale_date >= date.today() - timedelta(days=days - 1))
+    
+    query = query.group_by(
+        Medicine.med_id, Medicine.med_name, Medicine.spec, Medicine.category
+    ).having(
+        func.sum(SalesDailyFact.quantity) > 0
+    ).order_by(
+        func.sum(SalesDailyFact.quantity).desc()
+    ).limit(limit).all()
     
     return render_template('report/top_selling.html',
                           data=query,
-                          days=0,  # 视图不限制时间
+                          days=days,
                           limit=limit)
 
 
 @report_bp.route('/profit')
+@replica_read
 @login_required
 @role_required('Admin', 'Finance')
 def profit_analysis():
@@ -135,12 +146,10 @@ def profit_analysis():
     # 销售统计
     sales_data = db.session.query(
         func.sum(SalesDetail.quantity * SalesDetail.unit_sell_price).label('total_sales'),
-        func.sum(SalesDetail.quantity * Medicine.ref_buy_price).label('total_cost'),
-        func.sum(SalesDetail.quantity * (SalesDetail.unit_sell_price - Medicine.ref_buy_price)).label('gross_profit')
+        func.sum(SalesDetail.quantity * SalesDetail.unit_cost).label('total_cost'),
+        func.sum(SalesDetail.quantity * (SalesDetail.unit_sell_price - SalesDetail.unit_cost)).label('gross_profit')
     ).join(
         SalesOrder, SalesDetail.so_id == SalesOrder.so_id
-    ).join(
-        Medicine, SalesDetail.med_id == Medicine.med_id
     ).filter(
         SalesOrder.status == 1,
         SalesOrder.sale_time >= start_date,
@@ -180,6 +189,7 @@ def profit_analysis():
 
 
 @report_bp.route('/inventory_value')
+@replica_read
 @login_required
 @role_required('Admin', 'Finance', 'Stock')
 def inventory_value():
@@ -222,26 +232,19 @@ def inventory_value():
 
 
 @report_bp.route('/api/sales_chart')
+@replica_read
 @login_required
 def api_sales_chart():
     """销售趋势图表数据"""
     days = request.args.get('days', 7, type=int)
     start_date = date.today() - timedelta(days=days-1)
     
-    query = db.session.query(
-        func.date(SalesOrder.sale_time).label('sale_date'),
-        func.sum(SalesOrder.total_price).label('total_sales')
-    ).filter(
-        SalesOrder.status == 1,
-        SalesOrder.sale_time >= start_date
-    ).group_by(
-        func.date(SalesOrder.sale_time)
-    ).order_by(
-        func.date(SalesOrder.sale_time)
+    query = SalesDaily.query.filter(
+        SalesDaily.sale_date >= start_date
     ).all()
     
     # 填充没有销售的日期
-    data = {r.sale_date: float(r.total_sales) for r in query}
+    data = {r.sale_date: float(r.revenue or 0) for r in query}
     labels = []
     values = []
     
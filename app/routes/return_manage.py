@@ -5,43 +5,33 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from datetime import datetime, date
-from sqlalchemy import func, and_, or_, text
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import joinedload
 from app import db
+from app.services.id_allocator import next_id
+from app.services import stock_index, finance_ledger, dashboard, read_models, return_eligibility
+from app.services.pagination import keyset_paginate
 from app.models import (PurchaseReturn, SalesReturn, PurchaseOrder, SalesOrder, 
-                        StockBatch, Medicine, Supplier, Employee, Customer, SalesDetail, PurchaseDetail)
+                        Supplier, Employee, Medicine)
 
 bp = Blueprint('return_manage', __name__, url_prefix='/return')
 
 def generate_return_id(model, prefix_char):
-    """在Python中生成退货单号，避免数据库校对规则冲突"""
-    date_str = datetime.now().strftime('%Y%m%d')
-    prefix = f'{prefix_char}{date_str}'
-    # 根据模型获取对应的ID字段名
-    id_attr = model.pr_id if prefix_char == 'PR' else model.sr_id
-    
-    result = db.session.query(func.max(id_attr)).filter(
-        id_attr.like(f'{prefix}%')
-    ).scalar()
-    
-    if result:
-        seq = int(result[-4:]) + 1
-    else:
-        seq = 1
-    return f'{prefix}{seq:04d}'
+    """从号段分配器生成退货单号（PR: 购进退出, SR: 销售退货）"""
+    return next_id(prefix_char)
 
 @bp.route('/purchase')
 @login_required
 def purchase_return_list():
     """购进退出列表"""
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     
-    query = PurchaseReturn.query.order_by(PurchaseReturn.return_time.desc())
+    query = read_models.purchase_return_rows()
     
     # 搜索条件
     keyword = request.args.get('keyword', '').strip()
     if keyword:
-        query = query.join(PurchaseReturn.purchase_order).filter(
+        query = query.filter(
             or_(
                 PurchaseReturn.pr_id.like(f'%{keyword}%'),
                 PurchaseReturn.po_id.like(f'%{keyword}%'),
@@ -49,7 +39,10 @@ def purchase_return_list():
             )
         )
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = keyset_paginate(query, [
+        (PurchaseReturn.return_time, 'desc'),
+        (PurchaseReturn.pr_id, 'desc')
+    ], per_page=per_page)
     returns = pagination.items
     
     return render_template('return_manage/purchase_list.html',
@@ -75,34 +68,40 @@ def create_purchase_return():
                 flash('采购订单不存在', 'danger')
                 return redirect(url_for('return_manage.create_purchase_return'))
             
-            # 验证批次
-            batch = StockBatch.query.get(batch_id)
-            if not batch:
-                flash('批次不存在', 'danger')
+            # 验证批次属于该采购单，且不超过剩余可退数量（锁定单据，同一单据的退货串行复核）
+            eligible = return_eligibility.purchase_batches(po_id, int(batch_id or 0), lock=True)
+            if not eligible:
+                db.session.rollback()
+                flash('该采购单没有此批次的可退药品', 'danger')
                 return redirect(url_for('return_manage.create_purchase_return'))
-            
-            # 检查库存是否足够
-            if batch.cur_batch_qty < quantity:
-                flash(f'库存不足，当前库存：{batch.cur_batch_qty}', 'danger')
+            batch = eligible[0]
+            if quantity <= 0 or quantity > batch.returnable:
+                db.session.rollback()
+                flash(f'退货数量须在 1 到 {batch.returnable} 之间（已退 {batch.returned}，当前库存 {batch.cur_qty}）', 'danger')
                 return redirect(url_for('return_manage.create_purchase_return'))
             
             # 生成退货单号
             pr_id = generate_return_id(PurchaseReturn, 'PR')
             
-            # 创建退货记录
+            # 创建退货记录（记下当前参考进价作为退出单价）
+            unit_price = finance_ledger.ref_prices(Medicine.ref_buy_price, {batch.med_id}).get(batch.med_id, 0)
             purchase_return = PurchaseReturn(
                 pr_id=pr_id,
                 po_id=po_id,
                 sup_id=purchase_order.sup_id,
                 batch_id=batch_id,
                 quantity=quantity,
+                unit_price=unit_price,
                 reason=reason,
                 emp_id=current_user.emp_id,
                 return_time=datetime.now()
             )
             
             db.session.add(purchase_return)
+            finance_ledger.post_purchase_return(date.today(), quantity, unit_price)
             db.session.commit()
+            stock_index.invalidate([batch.med_id])
+            dashboard.invalidate()
             
             flash(f'购进退出单 {pr_id} 创建成功', 'success')
             return redirect(url_for('return_manage.purchase_return_list'))
@@ -124,15 +123,14 @@ def create_purchase_return():
 @login_required
 def sales_return_list():
     """销售退货列表"""
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     
-    query = SalesReturn.query.order_by(SalesReturn.return_time.desc())
+    query = read_models.sales_return_rows()
     
     # 搜索条件
     keyword = request.args.get('keyword', '').strip()
     if keyword:
-        query = query.join(SalesReturn.sales_order).filter(
+        query = query.filter(
             or_(
                 SalesReturn.sr_id.like(f'%{keyword}%'),
                 SalesReturn.so_id.like(f'%{keyword}%'),
@@ -140,7 +138,10 @@ def sales_return_list():
             )
         )
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = keyset_paginate(query, [
+        (SalesReturn.return_time, 'desc'),
+        (SalesReturn.sr_id, 'desc')
+    ], per_page=per_page)
     returns = pagination.items
     
     return render_template('return_manage/sales_list.html',
@@ -166,28 +167,39 @@ def create_sales_return():
                 flash('销售订单不存在', 'danger')
                 return redirect(url_for('return_manage.create_sales_return'))
             
-            # 验证批次
-            batch = StockBatch.query.get(batch_id)
-            if not batch:
-                flash('批次不存在', 'danger')
+            # 验证批次属于该销售单，且不超过剩余可退数量（锁定单据，同一单据的退货串行复核）
+            eligible = return_eligibility.sales_batches(so_id, int(batch_id or 0), lock=True)
+            if not eligible:
+                db.session.rollback()
+                flash('该销售单没有此批次的可退药品', 'danger')
+                return redirect(url_for('return_manage.create_sales_return'))
+            batch = eligible[0]
+            if quantity <= 0 or quantity > batch.returnable:
+                db.session.rollback()
+                flash(f'退货数量须在 1 到 {batch.returnable} 之间（已退 {batch.returned}）', 'danger')
                 return redirect(url_for('return_manage.create_sales_return'))
             
             # 生成退货单号
             sr_id = generate_return_id(SalesReturn, 'SR')
             
-            # 创建退货记录
+            # 创建退货记录（记下当前参考售价作为退货单价）
+            unit_price = finance_ledger.ref_prices(Medicine.ref_sell_price, {batch.med_id}).get(batch.med_id, 0)
             sales_return = SalesReturn(
                 sr_id=sr_id,
                 so_id=so_id,
                 batch_id=batch_id,
                 quantity=quantity,
+                unit_price=unit_price,
                 reason=reason,
                 emp_id=current_user.emp_id,
                 return_time=datetime.now()
             )
             
             db.session.add(sales_return)
+            finance_ledger.post_sales_return(date.today(), [(quantity, unit_price)])
             db.session.commit()
+            stock_index.invalidate([batch.med_id])
+            dashboard.invalidate()
             
             flash(f'销售退货单 {sr_id} 创建成功', 'success')
             return redirect(url_for('return_manage.sales_return_list'))
@@ -198,54 +210,31 @@ def create_sales_return():
             return redirect(url_for('return_manage.create_sales_return'))
     
     # GET请求
-    sales_orders = SalesOrder.query.filter_by(status=1).order_by(
-        SalesOrder.sale_time.desc()).limit(100).all()
-    
-    # 修正：移除 status=1 的过滤条件
-    customers = Customer.query.all()
+    sales_orders = SalesOrder.query.options(joinedload(SalesOrder.customer)).filter_by(
+        status=1).order_by(SalesOrder.sale_time.desc()).limit(100).all()
     
     return render_template('return_manage/sales_form.html',
-                         sales_orders=sales_orders,
-                         customers=customers)
+                         sales_orders=sales_orders)
 
 @bp.route('/api/order_batches/<order_id>')
 @login_required
 def get_order_batches(order_id):
-    """获取订单关联的批次（用于退货）"""
+    """获取订单上实际出现的批次及剩余可退数量（用于退货）"""
     try:
-        # 判断是采购订单还是销售订单
         if order_id.startswith('P'):
-            # 采购订单：修复关联逻辑，确保获取所有药品的批次
-            details = db.session.query(
-                StockBatch.batch_id,
-                Medicine.med_name,
-                StockBatch.batch_no,
-                StockBatch.cur_batch_qty
-            ).join(Medicine, StockBatch.med_id == Medicine.med_id)\
-             .join(PurchaseDetail, and_(
-                 PurchaseDetail.po_id == order_id,
-                 PurchaseDetail.med_id == StockBatch.med_id
-             )).all()
+            batches = return_eligibility.purchase_batches(order_id)
         else:
-            # 销售订单：修复关联逻辑
-            # 确保 SalesDetail 和 StockBatch 正确关联
-            details = db.session.query(
-                StockBatch.batch_id,
-                Medicine.med_name,
-                StockBatch.batch_no,
-                StockBatch.cur_batch_qty
-            ).join(Medicine, StockBatch.med_id == Medicine.med_id)\
-             .join(SalesDetail, SalesDetail.batch_id == StockBatch.batch_id)\
-             .filter(SalesDetail.so_id == order_id).all()
+            batches = return_eligibility.sales_batches(order_id)
         
-        batches = [{
+        return jsonify([{
             'batch_id': b.batch_id,
             'med_name': b.med_name,
             'batch_no': b.batch_no,
-            'cur_qty': b.cur_batch_qty
-        } for b in details]
-        
-        return jsonify(batches)
+            'cur_qty': b.cur_qty,
+            'ordered': b.ordered,
+            'returned': b.returned,
+            'returnable': b.returnable
+        } for b in batches])
     except Exception as e:
         print(f"Error getting batches for order {order_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
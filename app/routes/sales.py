@@ -6,30 +6,31 @@ from flask_login import current_user
 from app import db
 from app.models import SalesOrder, SalesDetail, Customer, Medicine, StockBatch, Employee
 from app.routes.auth import login_required, role_required
+from app.services.allocation import allocate_order
+from app.services.id_allocator import next_id
+from app.services.tx_retry import run_with_retry
+from app.services import (stock_index, sales_facts, finance_ledger, dashboard, read_models, barcode_index,
+                          return_eligibility)
+from app.services.pagination import keyset_paginate
 from datetime import datetime, date
-from sqlalchemy import text
 
 sales_bp = Blueprint('sales', __name__)
 
 
 def generate_so_id():
-    """调用数据库函数生成销售单号"""
-    so_id = db.session.execute(text("SELECT fn_generate_so_id()") ).scalar()
-    if not so_id:
-        raise RuntimeError('无法生成销售单号')
-    return so_id
+    """从号段分配器生成销售单号"""
+    return next_id('S')
 
 
 @sales_bp.route('/')
 @login_required
 def list():
     """销售单列表"""
-    page = request.args.get('page', 1, type=int)
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
     keyword = request.args.get('keyword', '')
     
-    query = SalesOrder.query
+    query = read_models.sales_order_rows()
     
     if start_date:
         query = query.filter(SalesOrder.sale_time >= start_date)
@@ -38,9 +39,10 @@ def list():
     if keyword:
         query = query.filter(SalesOrder.so_id.like(f'%{keyword}%'))
     
-    pagination = query.order_by(SalesOrder.sale_time.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
+    pagination = keyset_paginate(query, [
+        (SalesOrder.sale_time, 'desc'),
+        (SalesOrder.so_id, 'desc')
+    ], per_page=10)
     
     return render_template('sales/list.html', 
                           pagination=pagination,
@@ -68,17 +70,21 @@ def create():
                 
                 items = []
                 if med_ids and quantities:
-                    for i, med_id in enumerate(med_ids):
-                        if i < len(quantities) and med_id and quantities[i]:
-                            # 从数据库查询药品价格（比前端传值更安全）
-                            medicine = Medicine.query.get(med_id)
-                            if medicine:
-                                items.append({
-                                    'med_id': med_id,
-                                    'quantity': quantities[i],
-                                    # 优先使用 sale_price，如果没有则尝试 ref_sell_price
-                                    'unit_price': float(getattr(medicine, 'sale_price', getattr(medicine, 'ref_sell_price', 0)) or 0)
-                                })
+                    rows = [(int(med_id), quantities[i]) for i, med_id in enumerate(med_ids)
+                            if i < len(quantities) and med_id and quantities[i]]
+                    # 从数据库查询药品价格（比前端传值更安全），一次查询所有药品
+                    medicines = {m.med_id: m for m in Medicine.query.filter(
+                        Medicine.med_id.in_({med_id for med_id, _ in rows})
+                    ).all()} if rows else {}
+                    for med_id, quantity in rows:
+                        medicine = medicines.get(med_id)
+                        if medicine:
+                            items.append({
+                                'med_id': med_id,
+                                'quantity': quantity,
+                                # 优先使用 sale_price，如果没有则尝试 ref_sell_price
+                                'unit_price': float(getattr(medicine, 'sale_price', getattr(medicine, 'ref_sell_price', 0)) or 0)
+                            })
                 
                 data = {
                     'cus_id': cust_id,
@@ -96,18 +102,18 @@ def create():
                 flash(msg, 'warning')
                 return redirect(url_for('sales.create'))
         
-        try:
+        cust_id = data.get('cus_id')
+        if not cust_id:
+            msg = '请选择客户！所有购买者必须先登记为顾客。'
+            if is_json_request:
+                return jsonify({'success': False, 'message': msg})
+            else:
+                flash(msg, 'warning')
+                return redirect(url_for('sales.create'))
+        
+        def place_order():
+            """一次完整的下单事务；死锁、锁等待超时或库存被并发改动时由 run_with_retry 整单重试"""
             so_id = generate_so_id()
-            total_price = 0
-            
-            cust_id = data.get('cus_id')
-            if not cust_id:
-                msg = '请选择客户！所有购买者必须先登记为顾客。'
-                if is_json_request:
-                    return jsonify({'success': False, 'message': msg})
-                else:
-                    flash(msg, 'warning')
-                    return redirect(url_for('sales.create'))
             
             # 创建销售单
             order = SalesOrder(
@@ -119,49 +125,17 @@ def create():
             db.session.add(order)
             db.session.flush()  # 获取ID但不提交
             
-            # 处理每个销售项 (按先进先出原则扣减库存)
-            for item in data['items']:
-                med_id = int(item['med_id'])
-                sell_qty = int(item['quantity'])
-                sell_price = float(item['unit_price'])
-                
-                # 获取未过期的有效批次 (按过期日期排序 - FIFO)
-                batches = StockBatch.query.filter(
-                    StockBatch.med_id == med_id,
-                    StockBatch.cur_batch_qty > 0,
-                    StockBatch.expiry_date > date.today()
-                ).order_by(StockBatch.expiry_date).all()
-                
-                # 检查总库存
-                available_qty = sum(b.cur_batch_qty for b in batches)
-                if available_qty < sell_qty:
-                    raise Exception(f'药品库存不足，可用库存: {available_qty}')
-                
-                remaining_qty = sell_qty
-                
-                for batch in batches:
-                    if remaining_qty <= 0:
-                        break
-                    
-                    # 计算本批次扣减数量
-                    deduct_qty = min(batch.cur_batch_qty, remaining_qty)
-                    
-                    # 创建销售明细（触发器会自动扣减库存）
-                    detail = SalesDetail(
-                        so_id=so_id,
-                        batch_id=batch.batch_id,
-                        med_id=med_id,
-                        quantity=deduct_qty,
-                        unit_sell_price=sell_price
-                    )
-                    db.session.add(detail)
-                    
-                    total_price += deduct_qty * sell_price
-                    remaining_qty -= deduct_qty
+            # 整单按先到期先出原则分配批次，只锁定分配到的批次，批量写入明细并扣减库存
+            plan = allocate_order(so_id, items)
+            total_price = sum(a.quantity * a.unit_price for a in plan)
             
             # 更新订单总价
             order.total_price = total_price
             
+            # 同一事务内累加销售日汇总与当天财务日结
+            revenue, cost = sales_facts.record_sale(order.sale_time.date(), plan)
+            finance_ledger.post_sale(order.sale_time.date(), revenue, cost)
+            
             # 更新客户累计消费
             if order.cus_id:
                 customer = Customer.query.get(order.cus_id)
@@ -169,6 +143,20 @@ def create():
                     customer.total_consume = float(customer.total_consume or 0) + total_price
             
             db.session.commit()
+            return so_id, total_price
+        
+        try:
+            items = [{
+                'med_id': int(item['med_id']),
+                'quantity': int(item['quantity']),
+                'unit_price': float(item['unit_price'])
+            } for item in data['items']]
+            if any(item['quantity'] <= 0 for item in items):
+                raise ValueError('销售数量必须大于0')
+            
+            so_id, total_price = run_with_retry('sales.create', place_order)
+            stock_index.invalidate({item['med_id'] for item in items})
+            dashboard.invalidate()
             
             if is_json_request:
                 return jsonify({
@@ -189,13 +177,8 @@ def create():
                 flash(f'销售失败: {str(e)}', 'danger')
                 return redirect(url_for('sales.create'))
     
-    # GET请求
-    customers = Customer.query.all()
-    medicines = Medicine.query.all()
-    
-    return render_template('sales/create.html', 
-                         customers=customers,
-                         medicines=medicines)
+    # GET请求：顾客与药品由页面上的选择器按需分页查询
+    return render_template('sales/create.html')
 
 
 @sales_bp.route('/detail/<so_id>')
@@ -233,14 +216,27 @@ def refund(so_id):
         # 创建销售退货记录（由触发器自动恢复库存）
         from app.models import SalesReturn
         
-        for detail in order.details:
-            # 创建退货记录
-            sr_id = f"SR{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        # 锁定销售单并按批次取剩余可退数量：已部分退货的数量不再重复入库、重复记退货金额；
+        # 订单已被并发撤销时没有可退批次
+        batches = return_eligibility.sales_batches(so_id, lock=True)
+        if not batches:
+            db.session.rollback()
+            flash('该订单已退货', 'warning')
+            return redirect(url_for('sales.detail', so_id=so_id))
+        batches = [b for b in batches if b.returnable > 0]
+        prices = finance_ledger.ref_prices(Medicine.ref_sell_price, {b.med_id for b in batches})
+        returned = []
+        for batch in batches:
+            unit_price = prices.get(batch.med_id, 0)
+            returned.append((batch.med_id, batch.returnable, unit_price))
+            # 创建退货记录（每个批次一个退货单号）
+            sr_id = next_id('SR')
             sales_return = SalesReturn(
                 sr_id=sr_id,
                 so_id=so_id,
-                batch_id=detail.batch_id,  # INT类型
-                quantity=detail.quantity,
+                batch_id=batch.batch_id,
+                quantity=batch.returnable,
+                unit_price=unit_price,
                 return_time=datetime.now(),
                 reason='销售退货',
                 status=1,
@@ -248,6 +244,11 @@ def refund(so_id):
             )
             db.session.add(sales_return)
         
+        # 从原销售日的汇总与日结中冲减该订单，退货金额记入当天
+        revenue, cost = sales_facts.record_refund(order)
+        finance_ledger.post_sale(order.sale_time.date(), revenue, cost)
+        finance_ledger.post_sales_return(date.today(), [(qty, price) for _, qty, price in returned])
+        
         # 扣减客户累计消费
         if order.cus_id:
             customer = Customer.query.get(order.cus_id)
@@ -256,6 +257,8 @@ def refund(so_id):
         
         order.status = 0
         db.session.commit()
+        stock_index.invalidate({med_id for med_id, _, _ in returned})
+        dashboard.invalidate()
         flash('退货成功，库存已恢复', 'success')
     except Exception as e:
         db.session.rollback()
@@ -267,27 +270,29 @@ def refund(so_id):
 @sales_bp.route('/api/available_stock/<int:med_id>')
 @login_required
 def api_available_stock(med_id):
-    """获取药品可用库存"""
-    batches = StockBatch.query.filter(
-        StockBatch.med_id == med_id,
-        StockBatch.cur_batch_qty > 0,
-        StockBatch.expiry_date > date.today()
-    ).order_by(StockBatch.expiry_date).all()
-    
-    total_available = sum(b.cur_batch_qty for b in batches)
-    
-    medicine = Medicine.query.get(med_id)
+    """获取药品可用库存（由进程内库存索引应答）"""
+    return jsonify(stock_index.get_available_stock(med_id))
+
+
+@sales_bp.route('/api/scan/<path:code>')
+@login_required
+def api_scan(code):
+    """收银扫码：条码/批准文号 -> 药品、售价与按效期先出的批次，一次请求返回"""
+    targets = barcode_index.lookup(code)
+    if not targets:
+        return jsonify({'success': False, 'message': f'未找到条码 {code} 对应的药品'}), 404
     
-    return jsonify({
-        'med_id': med_id,
-        'med_name': medicine.med_name if medicine else '',
-        'total_available': total_available,
-        'sell_price': float(medicine.ref_sell_price or 0) if medicine else 0,
-        'batches': [{
-            'batch_id': b.batch_id,
-            'batch_no': b.batch_no,
-            'qty': b.cur_batch_qty,
-            'expiry_date': b.expiry_date.strftime('%Y-%m-%d'),
-            'days_to_expire': b.days_to_expire
-        } for b in batches]
-    })
+    items = []
+    for target in targets:
+        stock = stock_index.get_available_stock(target.med_id)
+        items.append({
+            'med_id': target.med_id,
+            'med_name': stock['med_name'],
+            'spec': stock['spec'],
+            'unit': stock['unit'],
+            'sell_price': stock['sell_price'],
+            'quantity': target.pack_qty,
+            'total_available': stock['total_available'],
+            'batch': stock['batches'][0] if stock['batches'] else None
+        })
+    return jsonify({'success': True, 'items': items})
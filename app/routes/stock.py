@@ -5,6 +5,9 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from app import db
 from app.models import Medicine, StockBatch, InventoryCheck
 from app.routes.auth import login_required, role_required
+from app.services import stock_index, finance_ledger, dashboard, read_models
+from app.services.pagination import keyset_paginate
+from app.db_routing import replica_read
 from datetime import date, timedelta
 from sqlalchemy import func
 
@@ -12,62 +15,25 @@ stock_bp = Blueprint('stock', __name__)
 
 
 @stock_bp.route('/')
+@replica_read
 @login_required
 def overview():
     """库存概览"""
-    # 总库存价值（使用药品参考进价计算）
-    total_value = db.session.query(
-        func.sum(StockBatch.cur_batch_qty * Medicine.ref_buy_price)
-    ).join(Medicine).filter(StockBatch.cur_batch_qty > 0).scalar() or 0
-    
-    # 药品总数
-    medicine_count = Medicine.query.count()
-    
-    # 批次总数
-    batch_count = StockBatch.query.filter(StockBatch.cur_batch_qty > 0).count()
-    
-    # 低库存药品
-    low_stock = Medicine.query.filter(
-        Medicine.total_stock < Medicine.alert_qty
-    ).order_by(Medicine.total_stock).limit(10).all()
-    
-    # 临期药品统计
-    today = date.today()
-    expiry_stats = {
-        'expired': StockBatch.query.filter(
-            StockBatch.cur_batch_qty > 0,
-            StockBatch.expiry_date <= today
-        ).count(),
-        'month1': StockBatch.query.filter(
-            StockBatch.cur_batch_qty > 0,
-            StockBatch.expiry_date > today,
-            StockBatch.expiry_date <= today + timedelta(days=30)
-        ).count(),
-        'month3': StockBatch.query.filter(
-            StockBatch.cur_batch_qty > 0,
-            StockBatch.expiry_date > today + timedelta(days=30),
-            StockBatch.expiry_date <= today + timedelta(days=90)
-        ).count(),
-        'month6': StockBatch.query.filter(
-            StockBatch.cur_batch_qty > 0,
-            StockBatch.expiry_date > today + timedelta(days=90),
-            StockBatch.expiry_date <= today + timedelta(days=180)
-        ).count()
-    }
+    # 统计快照（短时缓存，写操作后失效）
+    snapshot = dashboard.get_snapshot()
     
     return render_template('stock/overview.html',
-                          total_value=float(total_value),
-                          medicine_count=medicine_count,
-                          batch_count=batch_count,
-                          low_stock=low_stock,
-                          expiry_stats=expiry_stats)
+                          total_value=snapshot['total_value'],
+                          medicine_count=snapshot['medicine_count'],
+                          batch_count=snapshot['batch_count'],
+                          low_stock=snapshot['low_stock'],
+                          expiry_stats=snapshot['expiry_stats'])
 
 
 @stock_bp.route('/batch')
 @login_required
 def batch_list():
     """批次库存列表"""
-    page = request.args.get('page', 1, type=int)
     keyword = request.args.get('keyword', '')
     show_empty = request.args.get('show_empty', '0') == '1'
     
@@ -84,9 +50,10 @@ def batch_list():
     if not show_empty:
         query = query.filter(StockBatch.cur_batch_qty > 0)
     
-    query = query.order_by(StockBatch.expiry_date)
-    
-    pagination = query.paginate(page=page, per_page=15, error_out=False)
+    pagination = keyset_paginate(query, [
+        (StockBatch.expiry_date, 'asc'),
+        (StockBatch.batch_id, 'asc')
+    ], per_page=15)
     
     return render_template('stock/batch_list.html',
                           pagination=pagination,
@@ -95,6 +62,7 @@ def batch_list():
 
 
 @stock_bp.route('/expiring')
+@replica_read
 @login_required
 def expiring():
     """临期药品预警"""
@@ -134,6 +102,7 @@ def expiring():
 
 
 @stock_bp.route('/low')
+@replica_read
 @login_required
 def low_stock():
     """低库存预警（使用视图）"""
@@ -179,7 +148,10 @@ def inventory_check():
             medicine.total_stock += diff_qty
             batch.cur_batch_qty = actual_qty
             
+            finance_ledger.post_inventory_check(date.today(), diff_amount)
             db.session.commit()
+            stock_index.invalidate([batch.med_id])
+            dashboard.invalidate()
             return jsonify({'success': True, 'message': '盘点完成'})
         
         except Exception as e:
@@ -198,16 +170,11 @@ def inventory_check():
 @login_required
 def check_history():
     """盘点历史"""
-    page = request.args.get('page', 1, type=int)
-    
-    query = db.session.query(
-        InventoryCheck, StockBatch, Medicine
-    ).join(
-        StockBatch, InventoryCheck.batch_id == StockBatch.batch_id
-    ).join(
-        Medicine, StockBatch.med_id == Medicine.med_id
-    ).order_by(InventoryCheck.check_time.desc())
+    query = read_models.inventory_check_rows()
     
-    pagination = query.paginate(page=page, per_page=15, error_out=False)
+    pagination = keyset_paginate(query, [
+        (InventoryCheck.check_time, 'desc'),
+        (InventoryCheck.check_id, 'desc')
+    ], per_page=15)
     
     return render_template('stock/check_history.html', pagination=pagination)
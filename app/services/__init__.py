@@ -0,0 +1,4 @@
+"""
+业务服务模块
+封装被多个路由共用的库存、单号、统计等逻辑
+"""
@@ -0,0 +1,147 @@
+"""
+销售批次分配
+先用一次普通查询读取整张销售单涉及的候选批次，在内存中按 FEFO（先到期先出）拆分；
+再只对实际分配到的批次按 batch_id 升序加锁并复核数量（固定加锁顺序，并发下单不互相死锁），
+最后用批量语句写入销售明细并扣减批次库存与药品总库存
+"""
+import time
+from collections import defaultdict, namedtuple
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import select, insert, update, case
+from app import db
+from app.metrics import histogram
+from app.models import SalesDetail, StockBatch, Medicine
+from app.services.tx_retry import ConflictError
+
+
+# 一条分配结果：从 batch_id 批次扣减 quantity，按 unit_price 售出；unit_cost 为记入明细的成本单价
+Allocation = namedtuple('Allocation', ['batch_id', 'med_id', 'quantity', 'unit_price', 'unit_cost'],
+                        defaults=(Decimal(0),))
+
+
+class InsufficientStockError(RuntimeError):
+    """可用库存不足"""
+
+
+class StockChangedError(ConflictError):
+    """加锁复核时批次数量已被并发操作改变，需回滚后重新分配"""
+    reason = 'stock_changed'
+
+
+LOCK_WAIT_SECONDS = histogram(
+    'pharmacy_checkout_lock_wait_seconds', '下单锁定批次行的耗时（秒）')
+
+
+def plan_fefo(items, batches):
+    """
+    在内存中为销售明细分配批次（不访问数据库）
+
+    items: [{'med_id': int, 'quantity': int, 'unit_price': float}, ...]
+    batches: 可用批次行（含 batch_id / med_id / cur_batch_qty），
+             同一药品内须已按有效期升序排列
+    """
+    queues = defaultdict(list)
+    for b in batches:
+        queues[b.med_id].append([b.batch_id, b.cur_batch_qty])
+
+    # 同一药品可能出现在多行，先按药品汇总校验总库存
+    requested = defaultdict(int)
+    for item in items:
+        requested[item['med_id']] += item['quantity']
+    for med_id, qty in requested.items():
+        available = sum(slot[1] for slot in queues[med_id])
+        if available < qty:
+            raise InsufficientStockError(f'药品(ID:{med_id})库存不足，可用库存: {available}')
+
+    plan = []
+    for item in items:
+        remaining = item['quantity']
+        for slot in queues[item['med_id']]:
+            if remaining <= 0:
+                break
+            if slot[1] <= 0:
+                continue
+            deduct = min(slot[1], remaining)
+            slot[1] -= deduct
+            remaining -= deduct
+            plan.append(Allocation(slot[0], item['med_id'], deduct, item['unit_price']))
+    return plan
+
+
+def allocate_order(so_id, items, today=None):
+    """
+    为整张销售单分配批次并写入明细、扣减库存
+
+    调用方负责事务（提交/回滚），销售单主表须已 flush。
+    加锁复核失败时抛出 StockChangedError，调用方回滚后可整单重试。
+    返回分配结果列表 [Allocation, ...]
+    """
+    today = today or date.today()
+    med_ids = sorted({item['med_id'] for item in items})
+
+    # 一次查询读取所有候选批次（未过期且有库存）及药品当前参考进价（成本单价），不加锁
+    batches = db.session.execute(
+        select(StockBatch.batch_id, StockBatch.med_id, StockBatch.cur_batch_qty, Medicine.ref_buy_price)
+        .join(Medicine, Medicine.med_id == StockBatch.med_id)
+        .where(
+            StockBatch.med_id.in_(med_ids),
+            StockBatch.cur_batch_qty > 0,
+            StockBatch.expiry_date > today
+        )
+        .order_by(StockBatch.med_id, StockBatch.expiry_date, StockBatch.batch_id)
+    ).all()
+
+    plan = plan_fefo(items, batches)
+    if not plan:
+        return plan
+    costs = {b.med_id: b.ref_buy_price or Decimal(0) for b in batches}
+    plan = [a._replace(unit_cost=costs[a.med_id]) for a in plan]
+
+    batch_deduct = defaultdict(int)
+    med_deduct = defaultdict(int)
+    for a in plan:
+        batch_deduct[a.batch_id] += a.quantity
+        med_deduct[a.med_id] += a.quantity
+
+    # 只锁实际分配到的批次，按 batch_id 升序，并复核数量与有效期
+    start = time.perf_counter()
+    locked = dict(db.session.execute(
+        select(StockBatch.batch_id, StockBatch.cur_batch_qty)
+        .where(
+            StockBatch.batch_id.in_(sorted(batch_deduct)),
+            StockBatch.expiry_date > today
+        )
+        .order_by(StockBatch.batch_id)
+        .with_for_update()
+    ).all())
+    LOCK_WAIT_SECONDS.observe(time.perf_counter() - start)
+    for batch_id, qty in batch_deduct.items():
+        if locked.get(batch_id, 0) < qty:
+            raise StockChangedError(f'批次(ID:{batch_id})库存已变动')
+
+    # 批量写入销售明细
+    db.session.execute(insert(SalesDetail), [{
+        'so_id': so_id,
+        'batch_id': a.batch_id,
+        'med_id': a.med_id,
+        'quantity': a.quantity,
+        'unit_sell_price': a.unit_price,
+        'unit_cost': a.unit_cost
+    } for a in plan])
+
+    # 批量扣减批次库存与药品总库存（各一条语句）
+    db.session.execute(
+        update(StockBatch)
+        .where(StockBatch.batch_id.in_(batch_deduct.keys()))
+        .values(cur_batch_qty=StockBatch.cur_batch_qty - case(batch_deduct, value=StockBatch.batch_id))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(Medicine)
+        .where(Medicine.med_id.in_(med_deduct.keys()))
+        .values(total_stock=Medicine.total_stock - case(med_deduct, value=Medicine.med_id))
+        .execution_options(synchronize_session=False)
+    )
+
+    return plan
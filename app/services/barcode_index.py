@@ -0,0 +1,143 @@
+"""
+条码索引（进程内）
+条码 / 批准文号 -> 药品的哈希表，收银扫码时不查库即可定位药品：
+  t_medicine.barcode            单品条码，每扫一次计 1
+  t_medicine_barcode            中包/整箱等多件装条码，每扫一次计 pack_qty
+  t_medicine.approval_no        批准文号（同一文号可能对应多个包装规格）
+本进程增删改药品后调用 upsert()/remove()；其他进程的修改每 BARCODE_INDEX_SYNC_SECONDS 秒
+比较药品目录的变更标记（change_marker，只有药品目录的修改会递增，库存写入不会），有变化时整表重建。
+重建的查询在锁外执行，只在替换索引时短暂持锁，扫码查询不会等待重建。
+"""
+import threading
+import time
+from collections import defaultdict, namedtuple
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from app.models import Medicine, MedicineBarcode
+from app.services import change_marker
+
+ScanTarget = namedtuple('ScanTarget', ['med_id', 'pack_qty'])
+
+_lock = threading.Lock()
+_index = None
+_checked_at = 0.0
+
+
+class BarcodeIndex:
+    def __init__(self):
+        self.codes = {}                      # 条码 -> ScanTarget
+        self.approvals = defaultdict(set)    # 批准文号 -> {med_id}
+        self.by_med = defaultdict(set)       # med_id -> 该药品的条码与批准文号（用于整体替换）
+        self.version = None
+
+    def add(self, med_id, barcode, approval_no, extra=()):
+        """登记药品的全部编码；extra 为 [(条码, 每扫数量)]"""
+        self.remove(med_id)
+        keys = self.by_med[med_id]
+        code = normalize(barcode)
+        if code:
+            self.codes[code] = ScanTarget(med_id, 1)
+            keys.add(code)
+        for code, pack_qty in extra:
+            code = normalize(code)
+            if code:
+                self.codes[code] = ScanTarget(med_id, pack_qty or 1)
+                keys.add(code)
+        approval = normalize(approval_no)
+        if approval:
+            self.approvals[approval].add(med_id)
+            keys.add(approval)
+
+    def remove(self, med_id):
+        for key in self.by_med.pop(med_id, ()):
+            target = self.codes.get(key)
+            if target is not None and target.med_id == med_id:
+                del self.codes[key]
+            med_ids = self.approvals.get(key)
+            if med_ids is not None:
+                med_ids.discard(med_id)
+                if not med_ids:
+                    del self.approvals[key]
+
+    def lookup(self, code):
+        """返回 [ScanTarget]：条码优先，其次批准文号（可能多个规格），未找到为空列表"""
+        code = normalize(code)
+        target = self.codes.get(code)
+        if target is not None:
+            return [target]
+        return [ScanTarget(med_id, 1) for med_id in sorted(self.approvals.get(code, ()))]
+
+
+def normalize(code):
+    """去除空白并转大写（批准文号中的字母不区分大小写）"""
+    return ''.join((code or '').split()).upper()
+
+
+def lookup(code):
+    """扫码查询，返回 [ScanTarget]"""
+    index = _ensure()
+    with _lock:
+        return index.lookup(code)
+
+
+def warm():
+    """立即构建索引（应用上下文内调用）"""
+    global _index, _checked_at
+    index = _build()
+    with _lock:
+        _index = index
+        _checked_at = time.monotonic()
+
+
+def upsert(medicine):
+    """新增或修改药品（含附加条码）提交后调用"""
+    with _lock:
+        if _index is not None:
+            _index.add(medicine.med_id, medicine.barcode, medicine.approval_no,
+                       [(b.barcode, b.pack_qty) for b in medicine.extra_barcodes])
+
+
+def remove(med_id):
+    """删除药品提交后调用"""
+    with _lock:
+        if _index is not None:
+            _index.remove(med_id)
+
+
+def _ensure():
+    """返回当前索引；到了检查周期时在锁外读取版本号，版本变化则在锁外重建后替换"""
+    global _index, _checked_at
+    now = time.monotonic()
+    with _lock:
+        index = _index
+        due = index is None or now - _checked_at >= current_app.config.get('BARCODE_INDEX_SYNC_SECONDS', 30)
+        if due:
+            _checked_at = now           # 本线程负责本轮检查，其他线程继续使用现有索引
+    if not due:
+        return index
+
+    version = change_marker.read(change_marker.MEDICINE_CATALOG)
+    if index is not None and index.version == version:
+        return index
+    fresh = _build(version)
+    with _lock:
+        if _index is index:
+            _index = fresh
+        return _index
+
+
+def _build(version=None):
+    index = BarcodeIndex()
+    # 先读版本号再读数据：读取期间发生的修改会递增版本号，下一轮检查时重建
+    index.version = change_marker.read(change_marker.MEDICINE_CATALOG) if version is None else version
+    extra = defaultdict(list)
+    for row in db.session.execute(select(MedicineBarcode.med_id, MedicineBarcode.barcode,
+                                         MedicineBarcode.pack_qty)).all():
+        extra[row.med_id].append((row.barcode, row.pack_qty))
+    for row in db.session.execute(
+        select(Medicine.med_id, Medicine.barcode, Medicine.approval_no)
+    ).all():
+        if row.barcode or row.approval_no or row.med_id in extra:
+            index.add(row.med_id, row.barcode, row.approval_no, extra.get(row.med_id, ()))
+    return index
@@ -0,0 +1,25 @@
+"""
+变更标记
+进程内索引需要知道其他进程是否修改了它们依赖的数据。t_change_marker 每个键一行版本号：
+相关数据的修改在同一事务内调用 bump() 递增，各进程定期 read() 与已加载的版本比较，
+一次主键查询即可判断是否需要同步，不受库存等高频写入的影响。
+"""
+from sqlalchemy import select
+from app import db
+from app.models import ChangeMarker
+from app.services.sqlutil import upsert
+
+# 药品目录：名称、规格、厂家、类别、条码、批准文号、附加条码（不含库存与价格）
+MEDICINE_CATALOG = 'medicine_catalog'
+
+
+def bump(key):
+    """递增版本号（调用方负责提交，与数据修改同一事务）"""
+    upsert(ChangeMarker, [{'marker_key': key, 'version': 1}], ('marker_key',), add_cols=('version',))
+
+
+def read(key):
+    """当前版本号，从未修改过为 0"""
+    return db.session.execute(
+        select(ChangeMarker.version).where(ChangeMarker.marker_key == key)
+    ).scalar() or 0
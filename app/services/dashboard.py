@@ -0,0 +1,124 @@
+"""
+首页与库存概览的统计快照
+药品、批次、临期分段与当日进销金额合并为两条查询（CASE 条件聚合），另加一条低库存前 10 查询；
+结果在进程内缓存 DASHBOARD_CACHE_TTL 秒；本进程内改动这些数字的写操作提交后调用 invalidate()。
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, func, case, true
+from app import db
+from app.models import Medicine, StockBatch, SalesOrder, PurchaseOrder
+
+LowStockItem = namedtuple('LowStockItem', ['med_id', 'med_name', 'total_stock', 'alert_qty'])
+
+_lock = threading.Lock()
+_snapshot = None            # (day, loaded_at, generation, data)
+_generation = 0             # 每次失效递增，防止加载期间被失效的旧数据写回
+
+
+def get_snapshot():
+    """
+    获取统计快照
+
+    返回字典: medicine_count, low_stock_count, low_stock(前10), batch_count, total_value,
+             expiring_count(半年内临期药品数), expiry_stats{expired, month1, month3, month6},
+             today_sales, today_purchase
+    """
+    today = date.today()
+    now = time.monotonic()
+    ttl = current_app.config.get('DASHBOARD_CACHE_TTL', 5)
+
+    cached = _snapshot
+    if cached is not None and cached[0] == today and now - cached[1] < ttl and cached[2] == _generation:
+        return cached[3]
+
+    generation = _generation
+    data = _load(today)
+    _store(today, now, generation, data)
+    return data
+
+
+def invalidate():
+    """使快照失效（写操作提交后调用）"""
+    global _snapshot, _generation
+    with _lock:
+        _generation += 1
+        _snapshot = None
+
+
+def _store(today, now, generation, data):
+    global _snapshot
+    with _lock:
+        if generation == _generation:
+            _snapshot = (today, now, generation, data)
+
+
+def _load(today):
+    # 药品与批次统计：一条查询，批次部分为条件聚合子查询
+    in_stock = StockBatch.cur_batch_qty > 0
+    d30, d90, d180 = (today + timedelta(days=n) for n in (30, 90, 180))
+
+    def bucket(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    batch_stats = select(
+        func.count().label('batch_count'),
+        func.coalesce(func.sum(StockBatch.cur_batch_qty * Medicine.ref_buy_price), 0).label('total_value'),
+        func.count(func.distinct(case((StockBatch.expiry_date <= d180, StockBatch.med_id)))).label('expiring_count'),
+        bucket(StockBatch.expiry_date <= today).label('expired'),
+        bucket((StockBatch.expiry_date > today) & (StockBatch.expiry_date <= d30)).label('month1'),
+        bucket((StockBatch.expiry_date > d30) & (StockBatch.expiry_date <= d90)).label('month3'),
+        bucket((StockBatch.expiry_date > d90) & (StockBatch.expiry_date <= d180)).label('month6')
+    ).join(Medicine, StockBatch.med_id == Medicine.med_id).where(in_stock).subquery()
+
+    medicine_stats = select(
+        func.count().label('medicine_count'),
+        bucket(Medicine.total_stock < Medicine.alert_qty).label('low_stock_count')
+    ).subquery()
+
+    # 两个单行子查询并排连接
+    stock = db.session.execute(
+        select(medicine_stats, batch_stats).select_from(medicine_stats.join(batch_stats, true()))
+    ).one()
+
+    # 当日进销金额：一条查询
+    start = datetime.combine(today, datetime.min.time())
+    end = start + timedelta(days=1)
+    business = db.session.execute(select(
+        select(func.coalesce(func.sum(SalesOrder.total_price), 0)).where(
+            SalesOrder.sale_time >= start,
+            SalesOrder.sale_time < end,
+            SalesOrder.status == 1
+        ).scalar_subquery().label('today_sales'),
+        select(func.coalesce(func.sum(PurchaseOrder.total_amount), 0)).where(
+            PurchaseOrder.purchase_date >= start,
+            PurchaseOrder.purchase_date < end,
+            PurchaseOrder.status == 1
+        ).scalar_subquery().label('today_purchase')
+    )).one()
+
+    low_stock = [LowStockItem(*row) for row in db.session.execute(
+        select(Medicine.med_id, Medicine.med_name, Medicine.total_stock, Medicine.alert_qty).where(
+            Medicine.total_stock < Medicine.alert_qty
+        ).order_by(Medicine.total_stock).limit(10)
+    ).all()]
+
+    return {
+        'medicine_count': stock.medicine_count,
+        'low_stock_count': int(stock.low_stock_count),
+        'low_stock': low_stock,
+        'batch_count': stock.batch_count,
+        'total_value': float(stock.total_value),
+        'expiring_count': stock.expiring_count,
+        'expiry_stats': {
+            'expired': int(stock.expired),
+            'month1': int(stock.month1),
+            'month3': int(stock.month3),
+            'month6': int(stock.month6)
+        },
+        'today_sales': float(business.today_sales),
+        'today_purchase': float(business.today_purchase)
+    }
@@ -0,0 +1,158 @@
+"""
+财务日结批量回填
+对 [start, end] 区间按日分组（GROUP BY 日期）一次性重算全部日结数据并批量 upsert，
+区间按自然月切块，由多个工作线程并行处理，每块一个独立事务，事务开始即锁定该块的日结行，
+与实时记账（含退货补记到历史日期）串行，重算覆盖期间提交的增量不会丢失；
+各块同时重算所在的已结束月份汇总，全部完成后再统一重算已结束年度的汇总。
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy import select, func, case
+from app import db
+from app.models import (FinanceDaily, SalesOrder, SalesDetail, SalesReturn, PurchaseReturn,
+                        InventoryCheck)
+from app.services import finance_ledger, finance_rollup
+from app.services.finance_rollup import FIELDS
+from app.services.sqlutil import upsert
+
+
+def recompute_range(start, end):
+    """按源表重算 [start, end] 每天的日结金额，返回 {日期: {字段: 金额}}"""
+    start_time = datetime.combine(start, time.min)
+    end_time = datetime.combine(end + timedelta(days=1), time.min)
+    result = {}
+
+    def put(rows, fields):
+        for row in rows:
+            day = _as_date(row[0])
+            values = result.setdefault(day, {f: Decimal(0) for f in FIELDS})
+            for f, v in zip(fields, row[1:]):
+                values[f] = Decimal(str(v or 0)).quantize(Decimal('0.01'))
+
+    day = func.date(SalesOrder.sale_time)
+    put(db.session.execute(
+        select(
+            day,
+            func.sum(SalesDetail.quantity * SalesDetail.unit_sell_price),
+            func.sum(SalesDetail.quantity * (SalesDetail.unit_sell_price - SalesDetail.unit_cost))
+        ).select_from(SalesOrder).join(
+            SalesDetail, SalesOrder.so_id == SalesDetail.so_id
+        ).where(
+            SalesOrder.status == 1,
+            SalesOrder.sale_time >= start_time,
+            SalesOrder.sale_time < end_time
+        ).group_by(day)
+    ).all(), ('sales_revenue', 'sales_profit'))
+
+    day = func.date(SalesReturn.return_time)
+    put(db.session.execute(
+        select(
+            day,
+            func.sum(SalesReturn.quantity * SalesReturn.unit_price)
+        ).where(
+            SalesReturn.status == 1,
+            SalesReturn.return_time >= start_time,
+            SalesReturn.return_time < end_time
+        ).group_by(day)
+    ).all(), ('sales_return_amt',))
+
+    day = func.date(PurchaseReturn.return_time)
+    put(db.session.execute(
+        select(
+            day,
+            func.sum(PurchaseReturn.quantity * PurchaseReturn.unit_price)
+        ).where(
+            PurchaseReturn.status == 1,
+            PurchaseReturn.return_time >= start_time,
+            PurchaseReturn.return_time < end_time
+        ).group_by(day)
+    ).all(), ('purc_return_amt',))
+
+    day = func.date(InventoryCheck.check_time)
+    put(db.session.execute(
+        select(
+            day,
+            func.sum(case((InventoryCheck.diff_amount < 0, -InventoryCheck.diff_amount), else_=0)),
+            func.sum(case((InventoryCheck.diff_amount > 0, InventoryCheck.diff_amount), else_=0))
+        ).where(
+            InventoryCheck.check_time >= start_time,
+            InventoryCheck.check_time < end_time
+        ).group_by(day)
+    ).all(), ('inv_loss_amt', 'inv_gain_amt'))
+
+    return result
+
+
+def settle_range(start, end):
+    """重算 [start, end] 并批量写入日结表及月/年汇总（调用方负责提交；须在新事务中调用），返回写入天数"""
+    days = _settle_chunk(start, end)
+    finance_rollup.refresh_years(range(start.year, end.year + 1))
+    return days
+
+
+def _settle_chunk(start, end):
+    """锁定并重算日结行与所在月汇总；年汇总由调用方在所有块完成后统一重算"""
+    finance_ledger.lock_days(start, end)
+    values = recompute_range(start, end)
+    zero = {f: Decimal(0) for f in FIELDS}
+    rows = []
+    day = start
+    while day <= end:
+        rows.append({'day_id': day, **values.get(day, zero)})
+        day += timedelta(days=1)
+    upsert(FinanceDaily, rows, ('day_id',), set_cols=FIELDS)
+    finance_rollup.refresh_months(start, end)
+    return len(rows)
+
+
+def month_chunks(start, end):
+    """把 [start, end] 切成按自然月的子区间"""
+    chunks = []
+    chunk_start = start
+    while chunk_start <= end:
+        next_month = (chunk_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        chunk_end = min(end, next_month - timedelta(days=1))
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = next_month
+    return chunks
+
+
+def backfill(app, start, end, workers=4, progress=None):
+    """
+    按月切块并行回填日结数据，每块在独立线程与事务中完成
+
+    progress: 每完成一块回调 progress(已完成块数, 总块数, 块起始日, 块结束日)
+    返回写入的总天数
+    """
+    chunks = month_chunks(start, end)
+
+    def run(chunk):
+        with app.app_context():
+            try:
+                days = _settle_chunk(*chunk)
+                db.session.commit()
+                return days
+            except Exception:
+                db.session.rollback()
+                raise
+
+    total_days = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(run, chunk): chunk for chunk in chunks}
+        for done, future in enumerate(as_completed(futures), 1):
+            total_days += future.result()
+            if progress:
+                progress(done, len(chunks), *futures[future])
+
+    # 年汇总依赖各月结果，待所有块提交后统一重算
+    finance_rollup.refresh_years(range(start.year, end.year + 1))
+    db.session.commit()
+    return total_days
+
+
+def _as_date(value):
+    """DATE() 在 MySQL 返回 date，在 SQLite 返回字符串"""
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
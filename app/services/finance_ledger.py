@@ -0,0 +1,142 @@
+"""
+财务日结实时记账
+销售、销售退货、购进退出、盘点在各自事务内把金额增量累加到当天的 t_finance_daily 行，
+日结报表随时为最新数据；recompute_day()/settle_day() 按源表全量重算，作为核对与修复手段。
+重算前先锁定当日日结行（lock_days），与实时记账的累加写入串行，重算覆盖期间提交的增量不会丢失。
+成本与退货金额取业务发生时记在源表上的单价（销售明细 unit_cost、退货记录 unit_price），
+记账与重算口径相同，药品参考价事后修改不会使日结核对产生差异。
+金额口径与存储过程 sp_daily_finance_settlement 一致。月/年汇总只为已结束的期间生成（见 finance_rollup），
+当天记账不写汇总行；补记到已结束期间的金额同步累加到已生成的汇总行。
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy import select, func, case
+from app import db
+from app.models import (FinanceDaily, SalesOrder, SalesDetail, SalesReturn, PurchaseReturn,
+                        InventoryCheck, Medicine)
+from app.services import finance_rollup
+from app.services.finance_rollup import FIELDS
+from app.services.sqlutil import upsert
+
+
+def post(day, **amounts):
+    """把一笔业务的金额增量记入当天日结行（不存在则创建）"""
+    row = {'day_id': day}
+    row.update({f: amounts.get(f, 0) for f in FIELDS})
+    upsert(FinanceDaily, [row], ('day_id',), add_cols=FIELDS)
+    finance_rollup.add(day, row)
+
+
+def post_sale(day, revenue, cost):
+    """销售（或整单退货冲减，金额为负）：收入与毛利"""
+    post(day, sales_revenue=revenue, sales_profit=revenue - cost)
+
+
+def post_sales_return(day, lines):
+    """销售退货：按退货记录的退货单价计退货金额，lines: [(quantity, unit_price), ...]"""
+    post(day, sales_return_amt=sum(qty * Decimal(str(price)) for qty, price in lines))
+
+
+def post_purchase_return(day, quantity, unit_price):
+    """购进退出：按退出记录的退出单价计退出金额"""
+    post(day, purc_return_amt=quantity * Decimal(str(unit_price)))
+
+
+def post_inventory_check(day, diff_amount):
+    """盘点：盘亏记亏损，盘盈记盈余"""
+    diff_amount = Decimal(str(diff_amount))
+    if diff_amount < 0:
+        post(day, inv_loss_amt=-diff_amount)
+    elif diff_amount > 0:
+        post(day, inv_gain_amt=diff_amount)
+
+
+def lock_days(start, end):
+    """
+    锁定 [start, end] 的日结行，不存在则以零值创建（调用方负责提交）
+
+    实时记账对同一行的累加写入会等待本事务结束：此前已提交的业务在随后的重算中可见，
+    尚未提交的业务在本事务提交后再累加，重算覆盖不会丢失增量。
+    须在尚未读取数据的新事务中调用，使随后的一致性读取晚于加锁
+    """
+    zero = dict.fromkeys(FIELDS, 0)
+    rows = [{'day_id': start + timedelta(days=n), **zero} for n in range((end - start).days + 1)]
+    upsert(FinanceDaily, rows, ('day_id',), add_cols=FIELDS)
+
+
+def recompute_day(day):
+    """按源表全量重算某日各项金额（按时间范围过滤，可使用时间索引）"""
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+
+    sales = db.session.execute(
+        select(
+            func.coalesce(func.sum(SalesDetail.quantity * SalesDetail.unit_sell_price), 0),
+            func.coalesce(func.sum(SalesDetail.quantity * (
+                SalesDetail.unit_sell_price - SalesDetail.unit_cost)), 0)
+        ).select_from(SalesOrder).join(
+            SalesDetail, SalesOrder.so_id == SalesDetail.so_id
+        ).where(
+            SalesOrder.status == 1,
+            SalesOrder.sale_time >= start,
+            SalesOrder.sale_time < end
+        )
+    ).one()
+
+    sales_return = db.session.execute(
+        select(func.coalesce(func.sum(SalesReturn.quantity * SalesReturn.unit_price), 0)).where(
+            SalesReturn.status == 1,
+            SalesReturn.return_time >= start,
+            SalesReturn.return_time < end
+        )
+    ).scalar()
+
+    purc_return = db.session.execute(
+        select(func.coalesce(func.sum(PurchaseReturn.quantity * PurchaseReturn.unit_price), 0)).where(
+            PurchaseReturn.status == 1,
+            PurchaseReturn.return_time >= start,
+            PurchaseReturn.return_time < end
+        )
+    ).scalar()
+
+    inventory = db.session.execute(
+        select(
+            func.coalesce(func.sum(case(
+                (InventoryCheck.diff_amount < 0, -InventoryCheck.diff_amount), else_=0)), 0),
+            func.coalesce(func.sum(case(
+                (InventoryCheck.diff_amount > 0, InventoryCheck.diff_amount), else_=0)), 0)
+        ).where(
+            InventoryCheck.check_time >= start,
+            InventoryCheck.check_time < end
+        )
+    ).one()
+
+    values = (sales[0], sales[1], sales_return, purc_return, inventory[0], inventory[1])
+    return {f: Decimal(str(v)).quantize(Decimal('0.01')) for f, v in zip(FIELDS, values)}
+
+
+def settle_day(day):
+    """
+    全量重算并修复某日日结行（调用方负责提交；须在新事务中调用，见 lock_days）
+
+    返回与实时记账结果不一致的字段: {字段: (原值, 重算值)}
+    """
+    lock_days(day, day)
+    values = recompute_day(day)
+    current = db.session.get(FinanceDaily, day, populate_existing=True)
+    diffs = {}
+    for f in FIELDS:
+        old = Decimal(str(getattr(current, f) or 0)) if current else Decimal(0)
+        if old != values[f]:
+            diffs[f] = (old, values[f])
+    upsert(FinanceDaily, [{'day_id': day, **values}], ('day_id',), set_cols=FIELDS)
+    # 日结即生成（或修正）所在的已结束月份与年度的汇总行；未结束的期间读取时直接汇总日结行
+    finance_rollup.refresh(day, day)
+    return diffs
+
+
+def ref_prices(column, med_ids):
+    """药品当前参考价 {med_id: 单价}（column 为 Medicine.ref_sell_price 或 ref_buy_price），供退货记录记下单价"""
+    return {med_id: price or Decimal(0) for med_id, price in db.session.execute(
+        select(Medicine.med_id, column).where(Medicine.med_id.in_(med_ids))
+    ).all()}
@@ -0,0 +1,156 @@
+"""
+财务月/年汇总
+t_finance_monthly / t_finance_annual 只保存已结束的月份与年度，由日结行汇总生成：
+日结核对某日、区间回填（flask finance-settle）时重新汇总所覆盖的已结束月份与年度。
+未结束的月份与年度不落汇总行，读取时按主键范围直接汇总日结行（一个月至多 31 行、一年至多 366 行），
+实时记账（结账路径）因此不写汇总行，避免所有收银事务争用当月、当年同一行。
+退货等业务把金额补记到已结束期间的日期时，只对已生成的汇总行做原子增量（见 add）；
+尚未生成汇总行的期间读取时同样回落到日结行，结果始终与日结行一致，不需要进程内缓存。
+"""
+from datetime import date
+from sqlalchemy import select, update, func, extract
+from app import db
+from app.models import FinanceDaily, FinanceMonthly, FinanceAnnual
+from app.services.sqlutil import upsert
+
+# 日、月、年三级汇总共用的金额字段
+FIELDS = ('sales_revenue', 'sales_profit', 'sales_return_amt',
+          'purc_return_amt', 'inv_loss_amt', 'inv_gain_amt')
+
+
+def month_bounds(year, month):
+    """某月的日期范围 [开始, 结束)，用于主键范围过滤"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def year_bounds(year):
+    """某年的日期范围 [开始, 结束)"""
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def add(day, amounts):
+    """
+    补记到已结束期间：把金额增量累加到该日所在月、年已生成的汇总行（调用方负责提交）
+
+    当天及本月、本年的记账不落汇总行，直接返回，不发出任何语句；
+    只更新已存在的行（UPDATE 不新建），尚未生成的期间由读取时或下次汇总从日结行得出
+    """
+    changed = [f for f in FIELDS if amounts.get(f)]
+    if not changed:
+        return
+    if (day.year, day.month) < _current_month():
+        db.session.execute(update(FinanceMonthly).where(
+            FinanceMonthly.year == day.year, FinanceMonthly.month == day.month
+        ).values({f: getattr(FinanceMonthly, f) + amounts[f] for f in changed}))
+    if day.year < date.today().year:
+        db.session.execute(update(FinanceAnnual).where(FinanceAnnual.year == day.year).values(
+            {f: getattr(FinanceAnnual, f) + amounts[f] for f in changed}))
+
+
+def refresh(start, end):
+    """从日结行重新汇总 [start, end] 所覆盖的已结束月份与年度（调用方负责提交）"""
+    refresh_months(start, end)
+    refresh_years(range(start.year, end.year + 1))
+
+
+def refresh_months(start, end):
+    """从日结行重新汇总 [start, end] 所覆盖的已结束月份（调用方负责提交）"""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month) and (year, month) < _current_month():
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    if not months:
+        return
+
+    sums = _daily_by_month(month_bounds(*months[0])[0], month_bounds(*months[-1])[1])
+    zero = (0,) * len(FIELDS)
+    upsert(FinanceMonthly, [{
+        'year': y, 'month': m,
+        **{f: v or 0 for f, v in zip(FIELDS, sums.get((y, m), zero))}
+    } for y, m in months], ('year', 'month'), set_cols=FIELDS)
+
+
+def refresh_years(years):
+    """从日结行重新汇总指定的已结束年度（调用方负责提交）"""
+    years = sorted(y for y in set(years) if y < date.today().year)
+    if not years:
+        return
+    year_col = extract('year', FinanceDaily.day_id)
+    sums = {int(r[0]): r[1:] for r in db.session.execute(
+        select(year_col, *[func.sum(getattr(FinanceDaily, f)) for f in FIELDS]).where(
+            FinanceDaily.day_id >= year_bounds(years[0])[0],
+            FinanceDaily.day_id < year_bounds(years[-1])[1]
+        ).group_by(year_col)
+    ).all()}
+    zero = (0,) * len(FIELDS)
+    upsert(FinanceAnnual, [{
+        'year': y, **{f: v or 0 for f, v in zip(FIELDS, sums.get(y, zero))}
+    } for y in years], ('year',), set_cols=FIELDS)
+
+
+def get_month(year, month):
+    """某月汇总金额 {字段: 金额}：已结束且已生成汇总行的月份读汇总行，否则汇总日结行"""
+    if (year, month) < _current_month():
+        row = db.session.get(FinanceMonthly, (year, month))
+        if row is not None:
+            return _values(row)
+    return _daily_sum(*month_bounds(year, month))
+
+
+def get_year(year):
+    """某年汇总金额 {字段: 金额}：已结束且已生成汇总行的年度读汇总行，否则汇总日结行"""
+    if year < date.today().year:
+        row = db.session.get(FinanceAnnual, year)
+        if row is not None:
+            return _values(row)
+    return _daily_sum(*year_bounds(year))
+
+
+def get_year_months(year):
+    """某年各月汇总 [{'month': 月, 字段: 金额}, ...]：已生成的月汇总行加上其余月份的日结行汇总"""
+    rows = db.session.execute(
+        select(FinanceMonthly).where(FinanceMonthly.year == year)
+    ).scalars().all()
+    months = {r.month: _values(r) for r in rows if (year, r.month) < _current_month()}
+    missing = [m for m in range(1, 13) if m not in months]
+    if missing:
+        sums = _daily_by_month(month_bounds(year, missing[0])[0], year_bounds(year)[1])
+        for (_, m), values in sums.items():
+            if m not in months:
+                months[m] = {f: float(v or 0) for f, v in zip(FIELDS, values)}
+    return [{'month': m, **months[m]} for m in sorted(months)]
+
+
+def _daily_sum(start, end):
+    """日结行 [start, end) 合计"""
+    row = db.session.execute(
+        select(*[func.sum(getattr(FinanceDaily, f)) for f in FIELDS]).where(
+            FinanceDaily.day_id >= start,
+            FinanceDaily.day_id < end
+        )
+    ).one()
+    return {f: float(v or 0) for f, v in zip(FIELDS, row)}
+
+
+def _daily_by_month(start, end):
+    """日结行 [start, end) 按月合计 {(年, 月): (各字段金额)}"""
+    year_col = extract('year', FinanceDaily.day_id)
+    month_col = extract('month', FinanceDaily.day_id)
+    return {(int(r[0]), int(r[1])): r[2:] for r in db.session.execute(
+        select(year_col, month_col, *[func.sum(getattr(FinanceDaily, f)) for f in FIELDS]).where(
+            FinanceDaily.day_id >= start,
+            FinanceDaily.day_id < end
+        ).group_by(year_col, month_col)
+    ).all()}
+
+
+def _values(row):
+    return {f: float(getattr(row, f) or 0) if row else 0.0 for f in FIELDS}
+
+
+def _current_month():
+    today = date.today()
+    return today.year, today.month
@@ -0,0 +1,111 @@
+"""
+单号分配器（hi/lo 号段）
+每个进程按 前缀+日期 从 t_id_sequence 一次预留一段序号，之后在内存中发号，
+新单据不再需要 MAX(...) LIKE 扫描，多个进程/线程并发也不会重号
+"""
+import os
+import random
+import threading
+import time
+from datetime import date
+from flask import current_app
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app import db
+from app.models import IdSequence, SalesOrder, PurchaseOrder, SalesReturn, PurchaseReturn
+from app.services.tx_retry import retry_reason, RETRIES, EXHAUSTED
+
+RESERVE_ATTEMPTS = 5
+
+
+# 单号前缀 -> 对应单据表的主键列（仅用于当天首次建号时接续已有单号）
+ID_COLUMNS = {
+    'S': SalesOrder.so_id,
+    'P': PurchaseOrder.po_id,
+    'SR': SalesReturn.sr_id,
+    'PR': PurchaseReturn.pr_id,
+}
+
+_lock = threading.Lock()
+_blocks = {}        # seq_key -> [下一个序号, 号段上限(不含)]
+_owner_pid = os.getpid()
+
+
+def next_id(prefix, day=None):
+    """分配一个单号，格式: 前缀 + YYYYMMDD + 4位序号"""
+    global _owner_pid
+    if prefix not in ID_COLUMNS:
+        raise ValueError(f'未知的单号前缀: {prefix}')
+    seq_key = f'{prefix}{(day or date.today()).strftime("%Y%m%d")}'
+
+    with _lock:
+        # fork 出的子进程会继承父进程的号段，必须丢弃，否则会与父进程重号
+        if _owner_pid != os.getpid():
+            _blocks.clear()
+            _owner_pid = os.getpid()
+
+        block = _blocks.get(seq_key)
+        if block is None or block[0] >= block[1]:
+            size = current_app.config.get('ID_BLOCK_SIZE', 20)
+            start = _reserve_block(prefix, seq_key, size)
+            # 同一前缀只保留当天的号段
+            for key in [k for k in _blocks if k[:-8] == prefix]:
+                del _blocks[key]
+            block = _blocks[seq_key] = [start, start + size]
+
+        seq = block[0]
+        block[0] += 1
+
+    return f'{seq_key}{seq:04d}'
+
+
+def _reserve_block(prefix, seq_key, size):
+    """
+    在独立事务中预留一个号段，返回号段起始序号
+
+    当天计数行首次创建时多个进程可能相撞：唯一键冲突、死锁（1213）或锁等待超时（1205）
+    都只需等待随机时长后重试（独立连接的事务已由 engine.begin() 回滚，不影响业务事务）
+    """
+    base_delay = current_app.config.get('TX_RETRY_BASE_DELAY', 0.05)
+    for attempt in range(1, RESERVE_ATTEMPTS + 1):
+        try:
+            # 使用独立连接并立即提交，计数行锁不会持续到业务事务结束
+            with db.engine.begin() as conn:
+                row = conn.execute(
+                    select(IdSequence.next_val)
+                    .where(IdSequence.seq_key == seq_key)
+                    .with_for_update()
+                ).first()
+                if row is None:
+                    start = _max_existing_seq(conn, prefix, seq_key) + 1
+                    conn.execute(insert(IdSequence).values(seq_key=seq_key, next_val=start + size))
+                else:
+                    start = row.next_val
+                    conn.execute(
+                        update(IdSequence)
+                        .where(IdSequence.seq_key == seq_key)
+                        .values(next_val=start + size)
+                    )
+                return start
+        except IntegrityError:
+            # 其他进程同时创建了当天的计数行，重试即可读到
+            reason = 'duplicate_key'
+        except OperationalError as exc:
+            reason = retry_reason(exc)
+            if reason is None:
+                raise
+        if attempt == RESERVE_ATTEMPTS:
+            EXHAUSTED.inc(operation='id_allocator', reason=reason)
+            break
+        RETRIES.inc(operation='id_allocator', reason=reason)
+        time.sleep(random.uniform(0, base_delay * 2 ** (attempt - 1)))
+    raise RuntimeError('无法生成单号')
+
+
+def _max_existing_seq(conn, prefix, seq_key):
+    """当天计数行不存在时，接续表中已有的最大单号（每个前缀每天只执行一次）"""
+    column = ID_COLUMNS[prefix]
+    result = conn.execute(
+        select(func.max(column)).where(column.like(f'{seq_key}%'))
+    ).scalar()
+    return int(result[len(seq_key):]) if result else 0
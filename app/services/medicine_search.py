@@ -0,0 +1,326 @@
+"""
+药品搜索索引（进程内）
+名称、拼音首字母、全拼（各音节起点）、规格与厂家建立倒排表，每个倒排表按 (名称长度, med_id) 有序。
+查询按匹配层级依次扫描：名称完全相同 > 名称前缀 > 名称包含 > 首字母前缀 > 首字母包含 >
+全拼前缀 > 音节起点 > 规格/厂家包含；每层取最短的倒排表逐个核对，凑满 20 个即停止，
+热门字词也只需扫描倒排表开头的少量条目。
+生产入口 wsgi.py 启动时预建，其他情况在首次查询时构建；本进程增删改药品后调用 upsert()/remove()，
+其他进程的修改每 MEDICINE_SEARCH_SYNC_SECONDS 秒比较药品目录的变更标记（change_marker，库存写入不递增），
+有变化时按 catalog_updated_at 增量同步。同步的查询与文档构建都在锁外进行，只在应用差异时短暂持锁。
+拼音依赖 pypinyin（可选），未安装时只按名称、规格、厂家匹配。
+"""
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+from flask import current_app
+from sqlalchemy import select, func
+from app import db
+from app.models import Medicine
+from app.services import change_marker
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:         # pragma: no cover - 可选依赖
+    lazy_pinyin = None
+
+Doc = namedtuple('Doc', ['med_id', 'rank', 'name', 'spec', 'factory', 'category',
+                         'initials', 'suffixes', 'keys'])
+
+_COLUMNS = (Medicine.med_id, Medicine.med_name, Medicine.spec, Medicine.factory,
+            Medicine.category, Medicine.catalog_updated_at)
+
+_CJK_RUN = re.compile(r'[\u4e00-\u9fff]+|.', re.S)
+PREFIX_LEN = 4
+
+_lock = threading.RLock()
+_index = None
+_checked_at = 0.0
+
+
+class SearchIndex:
+    def __init__(self):
+        self.docs = {}
+        self.postings = defaultdict(list)     # 键 -> 有序的 rank 列表
+        self.max_updated = None
+        self.version = None
+        self._bulk = False
+
+    def bulk_load(self, rows):
+        """批量加载（先追加后统一排序）"""
+        self._bulk = True
+        try:
+            for row in rows:
+                self.add(*row)
+        finally:
+            self._bulk = False
+        for ids in self.postings.values():
+            ids.sort()
+
+    def add(self, med_id, name, spec, factory, category, updated_at=None):
+        self.put(_make_doc(med_id, name, spec, factory, category), updated_at)
+
+    def put(self, doc, updated_at=None):
+        """登记已构建好的文档（替换同 ID 的旧文档）"""
+        self.remove(doc.med_id)
+        self.docs[doc.med_id] = doc
+        for key in doc.keys:
+            if self._bulk:
+                self.postings[key].append(doc.rank)
+            else:
+                bisect.insort(self.postings[key], doc.rank)
+        if updated_at is not None and (self.max_updated is None or updated_at > self.max_updated):
+            self.max_updated = updated_at
+
+    def remove(self, med_id):
+        doc = self.docs.pop(med_id, None)
+        if doc is None:
+            return
+        for key in doc.keys:
+            ranks = self.postings.get(key)
+            if ranks is None:
+                continue
+            i = bisect.bisect_left(ranks, doc.rank)
+            if i < len(ranks) and ranks[i] == doc.rank:
+                del ranks[i]
+            if not ranks:
+                del self.postings[key]
+
+    def search(self, query, limit=20, category=None):
+        """返回按相关度排序的 med_id；limit 为 None 时返回全部命中"""
+        # 重复的词去重（保持顺序），如“感冒 感冒”按单个词查询
+        tokens = list(dict.fromkeys((query or '').lower().split()))
+        if not tokens:
+            return []
+        if len(tokens) == 1:
+            return self._search_token(tokens[0], limit, category)
+        return self._search_tokens(tokens, limit, category)
+
+    def _tiers(self, token):
+        """token 的匹配层级 [(倒排表, 核对函数)]，按相关度从高到低"""
+        def best(prefix, grams):
+            lists = [self.postings.get(prefix + g) for g in grams]
+            if not lists or any(ranks is None for ranks in lists):
+                return None
+            return min(lists, key=len)
+
+        head = token[:PREFIX_LEN]
+        short = len(token) <= PREFIX_LEN
+        return [
+            (self.postings.get('e:' + token), None),
+            (self.postings.get('np:' + head), None if short else lambda d: d.name.startswith(token)),
+            (best('n:', _grams(token, min(2, len(token)), 2)), lambda d: token in d.name),
+            (self.postings.get('ip:' + head), None if short else lambda d: d.initials.startswith(token)),
+            (best('i:', _grams(token, min(3, len(token)), 3)), lambda d: token in d.initials),
+            (self.postings.get('yp:' + head), None if short else lambda d: d.suffixes[0].startswith(token)),
+            (self.postings.get('y:' + token[:3]), lambda d: any(s.startswith(token) for s in d.suffixes)),
+            (best('x:', _grams(token, 2, 2)) if len(token) >= 2 else None,
+             lambda d: token in d.spec or token in d.factory),
+        ]
+
+    def _matches(self, tiers, category):
+        """按相关度依次产出 (层级, doc)，每个药品只产出一次"""
+        seen = set()
+        for level, (ranks, verify) in enumerate(tiers):
+            if not ranks:
+                continue
+            for rank in ranks:
+                med_id = rank[1]
+                if med_id in seen:
+                    continue
+                doc = self.docs[med_id]
+                if verify is not None and not verify(doc):
+                    continue
+                if category and doc.category != category:
+                    continue
+                seen.add(med_id)
+                yield level, doc
+
+    def _search_token(self, token, limit, category):
+        result = []
+        for _, doc in self._matches(self._tiers(token), category):
+            result.append(doc.med_id)
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+    def _search_tokens(self, tokens, limit, category):
+        """多个词元须同时命中：遍历倒排表最短的词元的命中，逐个核对其余词元，按层级之和排序"""
+        tiers = {token: self._tiers(token) for token in tokens}
+        first = min(tokens, key=lambda t: sum(len(ranks) for ranks, _ in tiers[t] if ranks))
+        others = [token for token in tokens if token != first]
+        # 其余词元各层倒排表的并集是命中的超集，先按 ID 过滤，只对交集内的药品逐个核对
+        allowed = None
+        for token in others:
+            ids = {rank[1] for ranks, _ in tiers[token] if ranks for rank in ranks}
+            allowed = ids if allowed is None else allowed & ids
+        scored = []
+        for level, doc in self._matches(tiers[first], category):
+            if doc.med_id not in allowed:
+                continue
+            total = level
+            for other in others:
+                other_level = _level(tiers[other], doc)
+                if other_level is None:
+                    break
+                total += other_level
+            else:
+                scored.append((total, doc.rank))
+        scored.sort()
+        ids = [rank[1] for _, rank in scored]
+        return ids if limit is None else ids[:limit]
+
+
+def _make_doc(med_id, name, spec, factory, category):
+    """构建药品的索引文档（纯计算，不访问索引，可在锁外执行）"""
+    name = (name or '').lower().replace(' ', '')
+    spec = (spec or '').lower()
+    factory = (factory or '').lower()
+    syllables = _syllables(name)
+    initials = ''.join(s[0] for s in syllables)
+    suffixes = tuple(''.join(syllables[i:]) for i in range(len(syllables)))
+
+    keys = {'e:' + name}
+    keys.update('np:' + name[:n] for n in range(1, min(PREFIX_LEN, len(name)) + 1))
+    keys.update('n:' + g for g in _grams(name, 1, 2))
+    keys.update('ip:' + initials[:n] for n in range(1, min(PREFIX_LEN, len(initials)) + 1))
+    keys.update('i:' + g for g in _grams(initials, 1, 3))
+    if suffixes:
+        keys.update('yp:' + suffixes[0][:n] for n in range(1, PREFIX_LEN + 1))
+    keys.update('y:' + s[:n] for s in suffixes for n in (1, 2, 3))
+    keys.update('x:' + g for g in _grams(spec, 2, 2) | _grams(factory, 2, 2))
+
+    rank = (len(name), med_id)
+    return Doc(med_id, rank, name, spec, factory, category, initials, suffixes, tuple(keys))
+
+
+def _level(tiers, doc):
+    """doc 命中 tiers 的最高层级序号，未命中返回 None"""
+    for level, (ranks, verify) in enumerate(tiers):
+        if not ranks:
+            continue
+        i = bisect.bisect_left(ranks, doc.rank)
+        if i < len(ranks) and ranks[i] == doc.rank and (verify is None or verify(doc)):
+            return level
+    return None
+
+
+def search(query, limit=20, category=None):
+    """按关键字（名称/拼音首字母/全拼/规格/厂家，空格分隔多个词需同时命中）返回排序后的药品 ID"""
+    index = _ensure()
+    with _lock:
+        return index.search(query, limit, category)
+
+
+def warm():
+    """立即构建索引（应用上下文内调用）"""
+    global _index, _checked_at
+    index = _build()
+    with _lock:
+        _index = index
+        _checked_at = time.monotonic()
+
+
+def upsert(medicine):
+    """新增或修改药品提交后调用"""
+    doc = _make_doc(medicine.med_id, medicine.med_name, medicine.spec, medicine.factory, medicine.category)
+    with _lock:
+        if _index is not None:
+            _index.put(doc, medicine.catalog_updated_at)
+
+
+def remove(med_id):
+    """删除药品提交后调用"""
+    with _lock:
+        if _index is not None:
+            _index.remove(med_id)
+
+
+def _ensure():
+    """返回当前索引；到了检查周期时由本线程在锁外同步，其他线程继续使用现有索引"""
+    global _index, _checked_at
+    now = time.monotonic()
+    with _lock:
+        index = _index
+        due = index is None or now - _checked_at >= current_app.config.get('MEDICINE_SEARCH_SYNC_SECONDS', 30)
+        if due:
+            _checked_at = now
+    if not due:
+        return index
+
+    if index is None:
+        fresh = _build()
+        with _lock:
+            if _index is None:
+                _index = fresh
+            return _index
+    _sync(index)
+    return index
+
+
+def _build():
+    index = SearchIndex()
+    # 先读版本号再读数据：读取期间发生的修改会递增版本号，下一轮同步时补上
+    index.version = change_marker.read(change_marker.MEDICINE_CATALOG)
+    index.bulk_load(db.session.execute(select(*_COLUMNS)).all())
+    return index
+
+
+def _sync(index):
+    """
+    同步其他进程的修改（版本号未变时只有一次主键查询）
+
+    按 catalog_updated_at 取变更行（同一秒内的修改可能重复取到，重复登记无害），
+    数量与索引不一致时再按 ID 集合补齐/剔除；查询与文档构建在锁外，最后持锁应用差异
+    """
+    version = change_marker.read(change_marker.MEDICINE_CATALOG)
+    if version == index.version:
+        return
+    with _lock:
+        known = set(index.docs)
+        since = index.max_updated
+
+    query = select(*_COLUMNS)
+    if since is not None:
+        query = query.where(Medicine.catalog_updated_at >= since)
+    rows = db.session.execute(query).all()
+    seen = known | {row[0] for row in rows}
+    removed = ()
+    count = db.session.execute(select(func.count()).select_from(Medicine)).scalar()
+    if count != len(seen):
+        ids = set(db.session.execute(select(Medicine.med_id)).scalars())
+        removed = known - ids
+        missing = ids - seen
+        if missing:
+            rows += db.session.execute(select(*_COLUMNS).where(Medicine.med_id.in_(missing))).all()
+    docs = [(_make_doc(*row[:5]), row[5]) for row in rows]
+
+    with _lock:
+        for doc, updated_at in docs:
+            index.put(doc, updated_at)
+        for med_id in removed:
+            index.remove(med_id)
+        index.version = version
+
+
+def _grams(text, shortest, longest):
+    text = text.replace(' ', '')
+    return {text[i:i + n] for n in range(shortest, longest + 1) for i in range(len(text) - n + 1)}
+
+
+def _syllables(name):
+    """名称的拼音音节（非汉字按单个字符），未安装 pypinyin 时为空"""
+    if lazy_pinyin is None:
+        return ()
+    syllables = []
+    for run in _CJK_RUN.findall(name):
+        syllables.extend(_run_pinyin(run) if len(run) > 1 or run >= '\u4e00' else (run,))
+    return tuple(s for s in syllables if s.strip())
+
+
+@lru_cache(maxsize=65536)
+def _run_pinyin(run):
+    """连续汉字按整段取拼音（保留多音字的词语语境），同名片段只计算一次"""
+    return tuple(s.lower() for s in lazy_pinyin(run))
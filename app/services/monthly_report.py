@@ -0,0 +1,58 @@
+"""
+月度财务报表
+各项指标按各自的源表独立统计（销售、订单数、退货、盘点），再在应用层合并，
+不做跨表笛卡尔连接，代价与当月数据量线性相关。取代存储过程 sp_monthly_report。
+"""
+from datetime import timedelta
+from decimal import Decimal
+from sqlalchemy import select, func
+from app import db
+from app.models import FinanceDaily, SalesOrder
+from app.services.finance_backfill import recompute_range
+from app.services.finance_rollup import FIELDS, month_bounds
+
+
+def build_report(year, month):
+    """
+    统计某月财务数据
+
+    返回 {'total_revenue', 'total_profit', 'total_sales_return', 'total_purc_return',
+          'total_inv_loss', 'total_inv_gain', 'net_profit', 'order_count', 'days_count'}
+    """
+    start, end = month_bounds(year, month)
+
+    # 销售、退货、盘点金额：每张源表一次按日分组的范围查询
+    totals = {f: Decimal(0) for f in FIELDS}
+    for values in recompute_range(start, end - timedelta(days=1)).values():
+        for f in FIELDS:
+            totals[f] += values[f]
+
+    order_count = db.session.execute(
+        select(func.count()).select_from(SalesOrder).where(
+            SalesOrder.status == 1,
+            SalesOrder.sale_time >= start,
+            SalesOrder.sale_time < end
+        )
+    ).scalar()
+
+    days_count = db.session.execute(
+        select(func.count()).select_from(FinanceDaily).where(
+            FinanceDaily.day_id >= start,
+            FinanceDaily.day_id < end
+        )
+    ).scalar()
+
+    net_profit = (totals['sales_profit'] - totals['sales_return_amt'] + totals['purc_return_amt']
+                  - totals['inv_loss_amt'] + totals['inv_gain_amt'])
+
+    return {
+        'total_revenue': float(totals['sales_revenue']),
+        'total_profit': float(totals['sales_profit']),
+        'total_sales_return': float(totals['sales_return_amt']),
+        'total_purc_return': float(totals['purc_return_amt']),
+        'total_inv_loss': float(totals['inv_loss_amt']),
+        'total_inv_gain': float(totals['inv_gain_amt']),
+        'net_profit': float(net_profit),
+        'order_count': int(order_count or 0),
+        'days_count': int(days_count or 0)
+    }
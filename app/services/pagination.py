@@ -0,0 +1,170 @@
+"""
+键集（seek）分页
+按 (排序列..., 主键) 记录上一页末尾位置，下一页用 WHERE 条件直接定位，
+不再执行 COUNT(*) 与 LIMIT/OFFSET，翻到第 N 页与第 1 页代价相同。
+排序列须为 NOT NULL：比较条件对 NULL 不成立，可空列上的 NULL 行会被翻页跳过
+（用 COALESCE 兜底又会使条件无法走索引），因此在分页前检查列定义
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime, date
+from flask import request, url_for
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import and_, or_
+
+
+class KeysetPagination:
+    """键集分页结果，供模板渲染上一页/下一页"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total          # 仅在请求 ?count=1 时统计
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def next_url(self):
+        return _page_url(self.next_cursor)
+
+    @property
+    def prev_url(self):
+        return _page_url(self.prev_cursor)
+
+    @property
+    def first_url(self):
+        return _page_url(None)
+
+
+class IdListPagination(Pagination):
+    """
+    按已排好序的主键列表分页（如搜索索引的结果），接口与 Query.paginate() 的结果相同
+
+    IdListPagination(ids=[...], column=Model.pk, page=1, per_page=10, error_out=False)
+    每页只按主键取本页的行
+    """
+
+    def _query_items(self):
+        ids = self._query_args['ids'][self._query_offset:self._query_offset + self.per_page]
+        if not ids:
+            return []
+        column = self._query_args['column']
+        model = column.class_
+        rows = {getattr(row, column.key): row for row in model.query.filter(column.in_(ids))}
+        return [rows[i] for i in ids if i in rows]
+
+    def _query_count(self):
+        return len(self._query_args['ids'])
+
+
+def keyset_paginate(query, keys, per_page=10):
+    """
+    对查询执行键集分页，游标与是否统计总数从请求参数读取
+
+    keys: [(列, 'asc'|'desc'), ...]，各列须为 NOT NULL，最后一列须唯一（通常为主键）
+    游标格式: 'n.<token>' 表示向后翻页，'p.<token>' 表示向前翻页
+    """
+    for col, _ in keys:
+        if getattr(col.expression, 'nullable', False):
+            raise ValueError(f'键集分页的排序列 {col} 须为 NOT NULL')
+    direction, values = _decode_cursor(request.args.get('cursor', ''), len(keys))
+    forward = direction != 'p'
+    with_total = request.args.get('count') == '1'
+
+    total = query.order_by(None).count() if with_total else None
+
+    entity_count = len(query.column_descriptions)
+    query = query.add_columns(*[col for col, _ in keys])
+    if values is not None:
+        query = query.filter(_seek_clause(keys, values, forward))
+
+    order = []
+    for col, how in keys:
+        ascending = (how == 'asc') == forward
+        order.append(col.asc() if ascending else col.desc())
+    rows = query.order_by(None).order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    if entity_count == 1:
+        items = [row[0] for row in rows]
+    else:
+        # 多列/多实体查询返回带列名的行，既可按名取值也可解包
+        row_type = namedtuple('Row', [d['name'] for d in query.column_descriptions[:entity_count]],
+                              rename=True)
+        items = [row_type(*row[:entity_count]) for row in rows]
+    key_values = [tuple(row[entity_count:]) for row in rows]
+
+    next_cursor = prev_cursor = None
+    if key_values:
+        if has_more or not forward:
+            next_cursor = 'n.' + _encode_values(key_values[-1])
+        if values is not None and (forward or has_more):
+            prev_cursor = 'p.' + _encode_values(key_values[0])
+
+    return KeysetPagination(items, next_cursor, prev_cursor, total)
+
+
+def _seek_clause(keys, values, forward):
+    """构造 (k1, k2, ...) 位于游标之后的条件，展开为 OR/AND 以便使用索引范围扫描"""
+    clauses = []
+    for i, (col, how) in enumerate(keys):
+        after = (how == 'asc') == forward
+        cmp = col > values[i] if after else col < values[i]
+        clauses.append(and_(*[keys[j][0] == values[j] for j in range(i)], cmp))
+    return or_(*clauses)
+
+
+def _encode_values(values):
+    encoded = []
+    for v in values:
+        if isinstance(v, datetime):
+            encoded.append(['dt', v.isoformat()])
+        elif isinstance(v, date):
+            encoded.append(['d', v.isoformat()])
+        else:
+            encoded.append(['v', v])
+    raw = json.dumps(encoded, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, key_count):
+    """解析游标，无效游标视为第一页"""
+    if not cursor or cursor[:2] not in ('n.', 'p.'):
+        return 'n', None
+    try:
+        token = cursor[2:]
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = []
+        for kind, v in json.loads(raw):
+            if kind == 'dt':
+                v = datetime.fromisoformat(v)
+            elif kind == 'd':
+                v = date.fromisoformat(v)
+            values.append(v)
+    except (ValueError, TypeError):
+        return 'n', None
+    if len(values) != key_count:
+        return 'n', None
+    return cursor[0], values
+
+
+def _page_url(cursor):
+    """保留当前筛选条件，替换游标生成翻页链接"""
+    args = request.args.to_dict()
+    args.pop('page', None)
+    args.pop('cursor', None)
+    if cursor:
+        args['cursor'] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
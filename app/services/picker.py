@@ -0,0 +1,116 @@
+"""
+下拉选择器分页查询（进程内缓存）
+开单页面不再把客户表、药品表整表渲染进页面，而是由选择器按关键字分页向服务端查询：
+  客户  纯数字按手机号前缀、其余按姓名前缀匹配（均可走索引），无关键字时按最近注册排序
+  药品  走药品搜索索引（名称/拼音/规格/厂家），无关键字时按 med_id 排序
+每页结果按 (类型, 关键字, 页码) 缓存 PICKER_CACHE_TTL 秒；本进程增删改客户或药品后按类型失效，
+其他进程的修改由 TTL 兜底。结果只含选择所需的少量字段，不含会随销售变化的库存。
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from app.models import Customer, Medicine
+from app.services import medicine_search
+
+PAGE_SIZE = 20
+MAX_PAGE = 50
+MAX_ENTRIES = 2048
+
+_lock = threading.Lock()
+_entries = OrderedDict()            # (类型, 关键字, 页码) -> (loaded_at, generation, data)
+_generations = defaultdict(int)     # 每次失效递增，防止加载期间被失效的旧数据写回
+
+
+def customers(keyword, page=1):
+    """客户选择器的一页：{'items': [...], 'page': page, 'has_more': bool}"""
+    return _cached('customer', keyword, page, _load_customers)
+
+
+def medicines(keyword, page=1):
+    """药品选择器的一页：{'items': [...], 'page': page, 'has_more': bool}"""
+    return _cached('medicine', keyword, page, _load_medicines)
+
+
+def invalidate(kind):
+    """使某类选择器缓存失效：'customer' 或 'medicine'"""
+    with _lock:
+        _generations[kind] += 1
+        for key in [key for key in _entries if key[0] == kind]:
+            del _entries[key]
+
+
+def _cached(kind, keyword, page, loader):
+    keyword = (keyword or '').strip()
+    page = min(max(page or 1, 1), MAX_PAGE)
+    key = (kind, keyword, page)
+    now = time.monotonic()
+    ttl = current_app.config.get('PICKER_CACHE_TTL', 30)
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and now - entry[0] < ttl and entry[1] == _generations[kind]:
+            _entries.move_to_end(key)
+            return entry[2]
+        generation = _generations[kind]
+
+    items, has_more = loader(keyword, page)
+    data = {'items': items, 'page': page, 'has_more': has_more}
+    with _lock:
+        if _generations[kind] == generation:
+            _entries[key] = (now, generation, data)
+            _entries.move_to_end(key)
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+    return data
+
+
+def _load_customers(keyword, page):
+    query = select(Customer.cus_id, Customer.cus_name, Customer.phone)
+    if keyword.isdigit():
+        query = query.where(Customer.phone.like(f'{keyword}%')).order_by(Customer.phone)
+    elif keyword:
+        query = query.where(Customer.cus_name.like(f'{keyword}%')).order_by(Customer.cus_name, Customer.cus_id)
+    else:
+        query = query.order_by(Customer.cus_id.desc())
+    rows = db.session.execute(query.offset((page - 1) * PAGE_SIZE).limit(PAGE_SIZE + 1)).all()
+    items = [{
+        'id': r.cus_id,
+        'name': r.cus_name,
+        'phone': r.phone,
+        'label': f'{r.cus_name or "未命名顾客"} - {r.phone or "无电话"}'
+    } for r in rows[:PAGE_SIZE]]
+    return items, len(rows) > PAGE_SIZE
+
+
+def _load_medicines(keyword, page):
+    columns = (Medicine.med_id, Medicine.med_name, Medicine.spec, Medicine.unit,
+               Medicine.ref_buy_price, Medicine.ref_sell_price)
+    offset = (page - 1) * PAGE_SIZE
+    if keyword:
+        # 搜索索引只需给出到本页末尾多 1 个的排序 ID，再按主键取本页的行
+        ids = medicine_search.search(keyword, limit=offset + PAGE_SIZE + 1)
+        has_more = len(ids) > offset + PAGE_SIZE
+        ids = ids[offset:offset + PAGE_SIZE]
+        found = {r.med_id: r for r in db.session.execute(
+            select(*columns).where(Medicine.med_id.in_(ids))
+        ).all()} if ids else {}
+        rows = [found[i] for i in ids if i in found]
+    else:
+        rows = db.session.execute(
+            select(*columns).order_by(Medicine.med_id).offset(offset).limit(PAGE_SIZE + 1)
+        ).all()
+        has_more = len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+    items = [{
+        'id': r.med_id,
+        'name': r.med_name,
+        'spec': r.spec,
+        'unit': r.unit,
+        'buy_price': float(r.ref_buy_price or 0),
+        'sell_price': float(r.ref_sell_price or 0),
+        'label': f'{r.med_name} ({r.spec})'
+    } for r in rows]
+    return items, has_more
@@ -0,0 +1,303 @@
+"""
+供应商到货单批量导入
+流式逐行读取到货单（CSV 带表头，或每行一个 JSON 对象的 JSONL），每 PURCHASE_IMPORT_CHUNK 行为一块：
+块内先逐行校验格式，再按药品 ID / 条码一次查询校验药品，合格行按 (供应商, 到货单号) 归入进货单，
+经 receiving.receive 以集合语句写入明细、批次与总库存后提交；一块失败只回滚该块。
+不合格行与写入失败的行逐行记入错误报告（行号即文件中的行号）。
+
+列（JSONL 为同名键）：
+  supplier              供应商 ID 或全称（也可用 sup_id / sup_name 列）
+  delivery_no           到货单号，可选；同一供应商同一单号归入一张进货单，缺省时每个供应商一张
+  med_id 或 barcode     药品 ID 或条码（多件装条码按每件数量折算数量与单价）
+  batch_no, expiry_date, quantity, unit_price   必填
+  produce_date          可选
+"""
+import csv
+import json
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from flask import current_app
+from sqlalchemy import select, insert, update
+from app import db
+from app.models import Medicine, Supplier, PurchaseOrder
+from app.services import barcode_index, receiving
+from app.services.id_allocator import next_id
+from app.services.tx_retry import run_with_retry
+
+LineError = namedtuple('LineError', ['line', 'message', 'raw'])
+
+MAX_REPORTED_ERRORS = 1000
+_DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y%m%d')
+_CENT = Decimal('0.01')
+
+
+class DeliveryFileError(ValueError):
+    """到货单无法读取（格式不支持、缺少表头等），不产生任何写入"""
+
+
+class ImportReport:
+    """导入结果：成功行数、生成的进货单与逐行错误"""
+
+    def __init__(self):
+        self.total = 0
+        self.imported = 0
+        self.orders = {}            # (sup_id, 到货单号) -> po_id
+        self.med_ids = set()
+        self.errors = []
+        self.error_count = 0
+
+    def add_error(self, line, message, raw=None):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(LineError(line, message, raw))
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'imported': self.imported,
+            'failed': self.error_count,
+            'orders': sorted(self.orders.values()),
+            'errors': [e._asdict() for e in sorted(self.errors, key=lambda e: e.line)],
+            'errors_truncated': self.error_count > len(self.errors)
+        }
+
+
+def import_stream(stream, fmt, emp_id, chunk_size=None, progress=None):
+    """
+    导入一个到货单文本流
+
+    stream: 文本流（按行迭代）；fmt: 'csv' 或 'jsonl'；emp_id: 经手人工号
+    progress: 可选回调 progress(report)，每块提交后调用
+    返回 ImportReport
+    """
+    chunk_size = chunk_size or current_app.config.get('PURCHASE_IMPORT_CHUNK', 500)
+    report = ImportReport()
+    suppliers = _load_suppliers()
+
+    chunk = []
+    for line_no, record in _records(stream, fmt):
+        report.total += 1
+        chunk.append((line_no, record))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, suppliers, emp_id, report)
+            chunk = []
+            if progress:
+                progress(report)
+    if chunk:
+        _import_chunk(chunk, suppliers, emp_id, report)
+        if progress:
+            progress(report)
+    return report
+
+
+def detect_format(filename):
+    """按扩展名判断格式"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise DeliveryFileError('仅支持 .csv 与 .jsonl 文件')
+
+
+def write_errors_csv(report, f):
+    """把错误报告写成 CSV（行号, 错误, 原始内容）"""
+    writer = csv.writer(f)
+    writer.writerow(['line', 'message', 'raw'])
+    for error in report.errors:
+        raw = json.dumps(error.raw, ensure_ascii=False, default=str) if error.raw is not None else ''
+        writer.writerow([error.line, error.message, raw])
+
+
+def _records(stream, fmt):
+    """逐行产出 (行号, dict)；无法解析的行产出 (行号, 异常说明字符串)"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames:
+            raise DeliveryFileError('CSV 文件缺少表头')
+        for row in reader:
+            if not any((v or '').strip() for v in row.values() if isinstance(v, str)):
+                continue
+            yield reader.line_num, {(k or '').strip(): (v.strip() if isinstance(v, str) else v)
+                                    for k, v in row.items()}
+    elif fmt == 'jsonl':
+        for line_no, text in enumerate(stream, 1):
+            text = text.strip()
+            if not text:
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield line_no, f'JSON 解析失败: {e}'
+                continue
+            yield line_no, record if isinstance(record, dict) else '每行须为一个 JSON 对象'
+    else:
+        raise DeliveryFileError(f'不支持的格式: {fmt}')
+
+
+def _load_suppliers():
+    """在用供应商：ID 与全称都映射到 sup_id（供应商数量有限，整表读取一次）"""
+    mapping = {}
+    for sup_id, sup_name in db.session.execute(
+        select(Supplier.sup_id, Supplier.sup_name).where(Supplier.status == 1)
+    ).all():
+        mapping[str(sup_id)] = sup_id
+        mapping[sup_name] = sup_id
+    return mapping
+
+
+def _import_chunk(chunk, suppliers, emp_id, report):
+    lines = _validate(chunk, suppliers, report)
+    if not lines:
+        return
+
+    groups = {}
+    for line in lines:
+        groups.setdefault((line['sup_id'], line['delivery_no']), []).append(line)
+
+    def write():
+        created = {}
+        med_ids = set()
+        for key, group in groups.items():
+            amount = sum(line['unit_price'] * line['quantity'] for line in group)
+            po_id = report.orders.get(key)
+            if po_id is None:
+                po_id = created[key] = next_id('P')
+                db.session.execute(insert(PurchaseOrder).values(
+                    po_id=po_id, sup_id=key[0], emp_id=emp_id, total_amount=amount,
+                    purchase_date=datetime.now(), status=1))
+            else:
+                db.session.execute(update(PurchaseOrder).where(PurchaseOrder.po_id == po_id)
+                                   .values(total_amount=PurchaseOrder.total_amount + amount))
+            med_ids |= receiving.receive(po_id, group)[1]
+        db.session.commit()
+        return created, med_ids
+
+    try:
+        created, med_ids = run_with_retry('purchase.import', write)
+    except Exception as e:
+        db.session.rollback()
+        for line in lines:
+            report.add_error(line['line'], f'写入失败（本块已回滚）: {e}', line['raw'])
+        return
+    report.orders.update(created)
+    report.med_ids |= med_ids
+    report.imported += len(lines)
+
+
+def _validate(chunk, suppliers, report):
+    """逐行校验格式，再批量校验药品；返回合格行"""
+    parsed = []
+    for line_no, record in chunk:
+        if isinstance(record, str):
+            report.add_error(line_no, record)
+            continue
+        try:
+            parsed.append(_parse(line_no, record, suppliers))
+        except ValueError as e:
+            report.add_error(line_no, str(e), record)
+
+    # 条码在内存索引中解析；药品 ID 一次查询确认存在
+    for line in parsed:
+        if line['med_id'] is None:
+            targets = barcode_index.lookup(line['barcode'])
+            if len(targets) != 1:
+                line['error'] = f'条码 {line["barcode"]} 未登记' if not targets else f'编码 {line["barcode"]} 对应多个药品'
+                continue
+            line['med_id'] = targets[0].med_id
+            if targets[0].pack_qty > 1:
+                line['quantity'] *= targets[0].pack_qty
+                line['unit_price'] = (line['unit_price'] / targets[0].pack_qty).quantize(_CENT, ROUND_HALF_UP)
+    wanted = {line['med_id'] for line in parsed if line['med_id'] is not None}
+    known = set(db.session.execute(
+        select(Medicine.med_id).where(Medicine.med_id.in_(wanted))
+    ).scalars()) if wanted else set()
+
+    valid = []
+    for line in parsed:
+        if 'error' not in line and line['med_id'] not in known:
+            line['error'] = f'药品 {line["med_id"]} 不存在'
+        if 'error' in line:
+            report.add_error(line['line'], line['error'], line['raw'])
+        else:
+            valid.append(line)
+    return valid
+
+
+def _parse(line_no, record, suppliers):
+    def field(*names):
+        for name in names:
+            value = record.get(name)
+            if value is not None and str(value).strip() != '':
+                return str(value).strip()
+        return None
+
+    supplier = field('supplier', 'sup_id', 'sup_name')
+    if supplier is None:
+        raise ValueError('缺少供应商')
+    sup_id = suppliers.get(supplier)
+    if sup_id is None:
+        raise ValueError(f'供应商 {supplier} 不存在或已停用')
+
+    med_id, barcode = field('med_id'), field('barcode')
+    if med_id is None and barcode is None:
+        raise ValueError('缺少药品 ID 或条码')
+    if med_id is not None:
+        try:
+            med_id = int(med_id)
+        except ValueError:
+            raise ValueError(f'药品 ID 无效: {med_id}')
+
+    batch_no = field('batch_no')
+    if batch_no is None:
+        raise ValueError('缺少批号')
+    if len(batch_no) > 30:
+        raise ValueError('批号超过 30 个字符')
+
+    expiry_date = _parse_date(field('expiry_date'), '有效期', required=True)
+    produce_date = _parse_date(field('produce_date'), '生产日期')
+    if expiry_date <= date.today():
+        raise ValueError(f'有效期 {expiry_date} 已过')
+    if produce_date and produce_date >= expiry_date:
+        raise ValueError('生产日期不早于有效期')
+
+    try:
+        quantity = int(field('quantity') or '')
+    except ValueError:
+        raise ValueError(f'数量无效: {field("quantity")}')
+    if quantity <= 0:
+        raise ValueError('数量须大于 0')
+    try:
+        unit_price = Decimal(field('unit_price') or '').quantize(_CENT, ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f'单价无效: {field("unit_price")}')
+    if unit_price < 0:
+        raise ValueError('单价不能为负')
+
+    return {
+        'line': line_no,
+        'raw': record,
+        'sup_id': sup_id,
+        'delivery_no': field('delivery_no') or '',
+        'med_id': med_id,
+        'barcode': barcode,
+        'batch_no': batch_no,
+        'produce_date': produce_date,
+        'expiry_date': expiry_date,
+        'quantity': quantity,
+        'unit_price': unit_price
+    }
+
+
+def _parse_date(value, label, required=False):
+    if value is None:
+        if required:
+            raise ValueError(f'缺少{label}')
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f'{label}格式无效: {value}')
@@ -0,0 +1,112 @@
+"""
+列表页读模型
+每个列表一条连接查询，只取模板需要的列，返回带列名的普通行对象，
+模板不再经由 ORM 关系逐行懒加载客户、员工、药品等信息。
+"""
+from app import db
+from app.models import (SalesOrder, PurchaseOrder, SalesReturn, PurchaseReturn, InventoryCheck,
+                        StockBatch, Medicine, Customer, Supplier, Employee)
+
+
+def sales_order_rows():
+    """销售单列表: 单号、时间、金额、状态、客户名（散客为空）、收银员"""
+    return db.session.query(
+        SalesOrder.so_id,
+        SalesOrder.sale_time,
+        SalesOrder.total_price,
+        SalesOrder.status,
+        Customer.cus_name,
+        Employee.emp_name
+    ).outerjoin(
+        Customer, SalesOrder.cus_id == Customer.cus_id
+    ).join(
+        Employee, SalesOrder.emp_id == Employee.emp_id
+    )
+
+
+def purchase_order_rows():
+    """进货单列表: 单号、入库时间、金额、状态、供应商、经办人"""
+    return db.session.query(
+        PurchaseOrder.po_id,
+        PurchaseOrder.purchase_date,
+        PurchaseOrder.total_amount,
+        PurchaseOrder.status,
+        Supplier.sup_name,
+        Employee.emp_name
+    ).join(
+        Supplier, PurchaseOrder.sup_id == Supplier.sup_id
+    ).join(
+        Employee, PurchaseOrder.emp_id == Employee.emp_id
+    )
+
+
+def purchase_return_rows():
+    """购进退出列表"""
+    return db.session.query(
+        PurchaseReturn.pr_id,
+        PurchaseReturn.po_id,
+        PurchaseReturn.quantity,
+        PurchaseReturn.reason,
+        PurchaseReturn.return_time,
+        PurchaseReturn.status,
+        Supplier.sup_name,
+        Medicine.med_name,
+        StockBatch.batch_no,
+        Employee.emp_name
+    ).join(
+        Supplier, PurchaseReturn.sup_id == Supplier.sup_id
+    ).join(
+        StockBatch, PurchaseReturn.batch_id == StockBatch.batch_id
+    ).join(
+        Medicine, StockBatch.med_id == Medicine.med_id
+    ).join(
+        Employee, PurchaseReturn.emp_id == Employee.emp_id
+    )
+
+
+def sales_return_rows():
+    """销售退货列表（客户取自原销售单，散客为空）"""
+    return db.session.query(
+        SalesReturn.sr_id,
+        SalesReturn.so_id,
+        SalesReturn.quantity,
+        SalesReturn.reason,
+        SalesReturn.return_time,
+        SalesReturn.status,
+        Customer.cus_name,
+        Medicine.med_name,
+        StockBatch.batch_no,
+        Employee.emp_name
+    ).join(
+        SalesOrder, SalesReturn.so_id == SalesOrder.so_id
+    ).outerjoin(
+        Customer, SalesOrder.cus_id == Customer.cus_id
+    ).join(
+        StockBatch, SalesReturn.batch_id == StockBatch.batch_id
+    ).join(
+        Medicine, StockBatch.med_id == Medicine.med_id
+    ).join(
+        Employee, SalesReturn.emp_id == Employee.emp_id
+    )
+
+
+def inventory_check_rows():
+    """盘点历史"""
+    return db.session.query(
+        InventoryCheck.check_id,
+        InventoryCheck.check_time,
+        InventoryCheck.book_qty,
+        InventoryCheck.actual_qty,
+        (InventoryCheck.actual_qty - InventoryCheck.book_qty).label('diff_qty'),
+        InventoryCheck.diff_amount,
+        InventoryCheck.remark,
+        Medicine.med_name,
+        StockBatch.batch_no,
+        Employee.emp_name
+    ).join(
+        StockBatch, InventoryCheck.batch_id == StockBatch.batch_id
+    ).join(
+        Medicine, StockBatch.med_id == Medicine.med_id
+    ).join(
+        Employee, InventoryCheck.emp_id == Employee.emp_id
+    )
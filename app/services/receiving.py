@@ -0,0 +1,138 @@
+"""
+进货入库写入
+进货明细、库存批次与药品总库存以集合语句写入，替代逐行执行的触发器 trg_after_purchase_detail_insert：
+  1. 一条批量 INSERT 写入进货明细
+  2. 按 (药品, 批号) 汇总后一条 upsert 写库存批次：新批号插入，已有批号累加数量（沿用已有批次的有效期）
+  3. 按药品汇总后一条 UPDATE ... CASE 累加药品总库存
+手工开单（purchase.create）与到货单导入（purchase_import）共用；事务由调用方提交。
+撤销进货单（cancel_receipt）同样以集合语句完成：锁定单据后一次联表查询定位涉及的批次，
+再按 batch_id 升序锁定并复核这些批次，各用一条 UPDATE 回扣批次与药品总库存。
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import select, insert, update, case, func
+from app import db
+from app.models import PurchaseOrder, PurchaseDetail, StockBatch, Medicine
+from app.services.sqlutil import upsert
+
+
+class CancelError(RuntimeError):
+    """进货单不能撤销（已撤销，或入库的药品已被销售、退货或盘点调整）"""
+
+
+def receive(po_id, lines):
+    """
+    写入一张进货单的明细并入库
+
+    lines: [{'med_id', 'batch_no', 'produce_date', 'expiry_date', 'quantity', 'unit_price'}, ...]
+    返回本次入库金额合计与涉及的 med_id 集合
+    """
+    if not lines:
+        return Decimal(0), set()
+
+    db.session.execute(insert(PurchaseDetail), [{
+        'po_id': po_id,
+        'med_id': line['med_id'],
+        'batch_no': line['batch_no'],
+        'produce_date': line.get('produce_date'),
+        'expiry_date': line['expiry_date'],
+        'quantity': line['quantity'],
+        'unit_purc_price': line['unit_price']
+    } for line in lines])
+
+    batches = {}
+    stock = defaultdict(int)
+    for line in lines:
+        key = (line['med_id'], line['batch_no'])
+        if key in batches:
+            batches[key]['cur_batch_qty'] += line['quantity']
+        else:
+            batches[key] = {'med_id': line['med_id'], 'batch_no': line['batch_no'],
+                            'expiry_date': line['expiry_date'], 'cur_batch_qty': line['quantity'],
+                            'create_time': date.today()}
+        stock[line['med_id']] += line['quantity']
+    upsert(StockBatch, list(batches.values()), ('med_id', 'batch_no'), add_cols=('cur_batch_qty',))
+
+    db.session.execute(
+        update(Medicine)
+        .where(Medicine.med_id.in_(stock))
+        .values(total_stock=Medicine.total_stock + case(stock, value=Medicine.med_id, else_=0))
+        .execution_options(synchronize_session=False)
+    )
+
+    amount = sum((Decimal(str(line['unit_price'])) * line['quantity'] for line in lines), Decimal(0))
+    return amount, set(stock)
+
+
+def cancel_receipt(po_id):
+    """
+    撤销进货单：回扣其入库的批次数量与药品总库存，并把单据置为已撤销
+
+    调用方负责事务（提交/回滚）。查询次数与明细行数无关：
+      1. 锁定进货单主表行并检查状态（并发撤销同一张单据时串行）
+      2. 明细按 (药品, 批号) 汇总后联表定位批次（不加锁）
+      3. 按 batch_id 升序锁定这些批次行（与下单 allocation 的加锁顺序一致），复核每个批次仍持有
+         入库数量；批次已被销售、退货或盘点减少时抛出 CancelError
+      4. 一条 UPDATE ... CASE 回扣批次数量，一条回扣药品总库存，最后更新单据状态
+    返回涉及的 med_id 集合
+    """
+    status = db.session.execute(
+        select(PurchaseOrder.status).where(PurchaseOrder.po_id == po_id).with_for_update()
+    ).scalar_one_or_none()
+    if status is None:
+        raise CancelError(f'进货单 {po_id} 不存在')
+    if status != 1:
+        raise CancelError('该进货单已被撤销')
+
+    received = (
+        select(PurchaseDetail.med_id, PurchaseDetail.batch_no,
+               func.sum(PurchaseDetail.quantity).label('quantity'))
+        .where(PurchaseDetail.po_id == po_id)
+        .group_by(PurchaseDetail.med_id, PurchaseDetail.batch_no)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(received.c.med_id, received.c.batch_no, received.c.quantity,
+               StockBatch.batch_id, Medicine.med_name)
+        .join(Medicine, Medicine.med_id == received.c.med_id)
+        .outerjoin(StockBatch, (StockBatch.med_id == received.c.med_id)
+                   & (StockBatch.batch_no == received.c.batch_no))
+    ).all()
+    for row in rows:
+        if row.batch_id is None:
+            raise CancelError(f'药品 {row.med_name} 批号 {row.batch_no} 的批次不存在，无法撤销')
+
+    locked = dict(db.session.execute(
+        select(StockBatch.batch_id, StockBatch.cur_batch_qty)
+        .where(StockBatch.batch_id.in_(sorted(row.batch_id for row in rows)))
+        .order_by(StockBatch.batch_id)
+        .with_for_update()
+    ).all()) if rows else {}
+
+    batch_deduct = {}
+    med_deduct = defaultdict(int)
+    for row in rows:
+        if locked.get(row.batch_id, 0) < row.quantity:
+            raise CancelError(f'药品 {row.med_name} 批号 {row.batch_no} 的库存已被销售、退货或盘点调整，无法撤销')
+        batch_deduct[row.batch_id] = row.quantity
+        med_deduct[row.med_id] += row.quantity
+
+    if batch_deduct:
+        db.session.execute(
+            update(StockBatch)
+            .where(StockBatch.batch_id.in_(batch_deduct.keys()))
+            .values(cur_batch_qty=StockBatch.cur_batch_qty - case(batch_deduct, value=StockBatch.batch_id))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            update(Medicine)
+            .where(Medicine.med_id.in_(med_deduct.keys()))
+            .values(total_stock=Medicine.total_stock - case(med_deduct, value=Medicine.med_id))
+            .execution_options(synchronize_session=False)
+        )
+    db.session.execute(
+        update(PurchaseOrder).where(PurchaseOrder.po_id == po_id).values(status=0)
+        .execution_options(synchronize_session=False)
+    )
+    return set(med_deduct)
@@ -0,0 +1,121 @@
+"""
+退货资格查询
+退货只能针对单据上实际出现过的批次，且数量不超过剩余可退数量：
+  购进退出  进货明细按 (药品, 批号) 汇总，经唯一键 uk_med_batch 定位批次；
+            可退 = 入库数量 - 该单已退数量，且不超过批次当前库存
+  销售退货  销售明细按批次汇总；可退 = 售出数量 - 该单已退数量
+每张单据一条查询：明细与退货记录都按单号走 (单号, 批次) 复合索引先汇总，再按主键/唯一键连批次与药品，
+开销只与本单行数有关，与门店的历史批次数量无关。已撤销的单据没有可退批次。
+"""
+from collections import namedtuple
+from sqlalchemy import select, func
+from app import db
+from app.models import (PurchaseOrder, PurchaseDetail, PurchaseReturn,
+                        SalesOrder, SalesDetail, SalesReturn, StockBatch, Medicine)
+
+ReturnableBatch = namedtuple('ReturnableBatch', [
+    'batch_id', 'med_id', 'med_name', 'batch_no', 'cur_qty', 'ordered', 'returned', 'returnable'])
+
+
+def purchase_batches(po_id, batch_id=None, lock=False):
+    """
+    进货单可退出的批次列表 [ReturnableBatch]
+
+    batch_id: 只查该批次；lock: 锁定进货单主表行，使同一单据的退货复核与写入串行，
+    并按 batch_id 顺序锁定所涉批次行，可退数量按锁定后的批次库存计算
+    """
+    if not _order_open(PurchaseOrder, PurchaseOrder.po_id, po_id, lock):
+        return []
+
+    received = (
+        select(PurchaseDetail.med_id, PurchaseDetail.batch_no,
+               func.sum(PurchaseDetail.quantity).label('quantity'))
+        .where(PurchaseDetail.po_id == po_id)
+        .group_by(PurchaseDetail.med_id, PurchaseDetail.batch_no)
+        .subquery()
+    )
+    returned = _returned(PurchaseReturn, PurchaseReturn.po_id, po_id)
+    query = (
+        select(StockBatch.batch_id, StockBatch.med_id, Medicine.med_name, StockBatch.batch_no,
+               StockBatch.cur_batch_qty, received.c.quantity,
+               func.coalesce(returned.c.quantity, 0).label('returned'))
+        .select_from(received)
+        .join(StockBatch, (StockBatch.med_id == received.c.med_id)
+              & (StockBatch.batch_no == received.c.batch_no))
+        .join(Medicine, Medicine.med_id == StockBatch.med_id)
+        .outerjoin(returned, returned.c.batch_id == StockBatch.batch_id)
+        .order_by(StockBatch.batch_id)
+    )
+    if batch_id is not None:
+        query = query.where(StockBatch.batch_id == batch_id)
+
+    rows = db.session.execute(query).all()
+    cur_qty = {row.batch_id: row.cur_batch_qty for row in rows}
+    if lock and rows:
+        # 批次库存同时被销售扣减，与 allocate_order、cancel_receipt 一样按 batch_id 顺序加锁
+        cur_qty = dict(db.session.execute(
+            select(StockBatch.batch_id, StockBatch.cur_batch_qty)
+            .where(StockBatch.batch_id.in_(sorted(cur_qty)))
+            .order_by(StockBatch.batch_id)
+            .with_for_update()
+        ).all())
+
+    batches = []
+    for row in rows:
+        remaining = row.quantity - row.returned
+        qty = cur_qty[row.batch_id]
+        batches.append(ReturnableBatch(
+            row.batch_id, row.med_id, row.med_name, row.batch_no, qty,
+            row.quantity, row.returned, max(min(remaining, qty), 0)))
+    return batches
+
+
+def sales_batches(so_id, batch_id=None, lock=False):
+    """
+    销售单可退货的批次列表 [ReturnableBatch]
+
+    batch_id: 只查该批次；lock: 锁定销售单主表行，使同一单据的退货复核与写入串行
+    """
+    if not _order_open(SalesOrder, SalesOrder.so_id, so_id, lock):
+        return []
+
+    sold = select(SalesDetail.batch_id, func.sum(SalesDetail.quantity).label('quantity'))\
+        .where(SalesDetail.so_id == so_id)
+    if batch_id is not None:
+        sold = sold.where(SalesDetail.batch_id == batch_id)
+    sold = sold.group_by(SalesDetail.batch_id).subquery()
+    returned = _returned(SalesReturn, SalesReturn.so_id, so_id)
+    query = (
+        select(StockBatch.batch_id, StockBatch.med_id, Medicine.med_name, StockBatch.batch_no,
+               StockBatch.cur_batch_qty, sold.c.quantity,
+               func.coalesce(returned.c.quantity, 0).label('returned'))
+        .select_from(sold)
+        .join(StockBatch, StockBatch.batch_id == sold.c.batch_id)
+        .join(Medicine, Medicine.med_id == StockBatch.med_id)
+        .outerjoin(returned, returned.c.batch_id == sold.c.batch_id)
+        .order_by(StockBatch.batch_id)
+    )
+
+    batches = []
+    for row in db.session.execute(query).all():
+        batches.append(ReturnableBatch(
+            row.batch_id, row.med_id, row.med_name, row.batch_no, row.cur_batch_qty,
+            row.quantity, row.returned, max(row.quantity - row.returned, 0)))
+    return batches
+
+
+def _order_open(model, key, order_id, lock):
+    query = select(model.status).where(key == order_id)
+    if lock:
+        query = query.with_for_update()
+    return db.session.execute(query).scalar_one_or_none() == 1
+
+
+def _returned(model, key, order_id):
+    """该单据各批次已退数量（不含已撤销的退货单）"""
+    return (
+        select(model.batch_id, func.sum(model.quantity).label('quantity'))
+        .where(key == order_id, model.status == 1)
+        .group_by(model.batch_id)
+        .subquery()
+    )
@@ -0,0 +1,101 @@
+"""
+销售日汇总
+销售与整单退货时在同一事务内增量更新 t_sales_daily（按日）与
+t_sales_daily_fact（按日、按药品），销售报表、趋势图与畅销榜直接读取预聚合行。
+成本取销售明细记录的成本单价（销售时的参考进价）；rebuild() 用于历史回填与校正。
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy import select, insert, delete, func
+from app import db
+from app.models import SalesOrder, SalesDetail, SalesDaily, SalesDailyFact
+from app.services.sqlutil import upsert
+
+MEASURES = ('order_count', 'quantity', 'revenue', 'cost')
+
+
+def record_sale(sale_date, lines, sign=1):
+    """
+    把一张销售单的明细累加到当天汇总
+
+    lines: 含 med_id / quantity / unit_price / unit_cost 的明细（如 allocation.Allocation）
+    sign: 1 为记入销售，-1 为冲减（整单退货）
+    返回 (销售额, 成本)，已带符号
+    """
+    if not lines:
+        return Decimal(0), Decimal(0)
+
+    per_med = {}
+    for line in lines:
+        row = per_med.setdefault(line.med_id, {'quantity': 0, 'revenue': Decimal(0), 'cost': Decimal(0)})
+        row['quantity'] += line.quantity
+        row['revenue'] += line.quantity * Decimal(str(line.unit_price))
+        row['cost'] += line.quantity * Decimal(str(line.unit_cost))
+
+    upsert(SalesDailyFact, [{
+        'sale_date': sale_date,
+        'med_id': med_id,
+        'order_count': sign,
+        'quantity': sign * row['quantity'],
+        'revenue': sign * row['revenue'],
+        'cost': sign * row['cost']
+    } for med_id, row in per_med.items()], ('sale_date', 'med_id'), add_cols=MEASURES)
+
+    revenue = sign * sum(r['revenue'] for r in per_med.values())
+    cost = sign * sum(r['cost'] for r in per_med.values())
+    upsert(SalesDaily, [{
+        'sale_date': sale_date,
+        'order_count': sign,
+        'quantity': sign * sum(r['quantity'] for r in per_med.values()),
+        'revenue': revenue,
+        'cost': cost
+    }], ('sale_date',), add_cols=MEASURES)
+    return revenue, cost
+
+
+def record_refund(order):
+    """整单退货：从原销售日的汇总中冲减该订单，返回 (冲减的销售额, 冲减的成本)"""
+    lines = db.session.execute(
+        select(
+            SalesDetail.med_id,
+            SalesDetail.quantity,
+            SalesDetail.unit_sell_price.label('unit_price'),
+            SalesDetail.unit_cost
+        ).where(SalesDetail.so_id == order.so_id)
+    ).all()
+    return record_sale(order.sale_time.date(), lines, sign=-1)
+
+
+def rebuild(start, end):
+    """按源表重算 [start, end] 日期范围内的销售汇总（调用方负责提交）"""
+    start_time = datetime.combine(start, time.min)
+    end_time = datetime.combine(end + timedelta(days=1), time.min)
+    sale_date = func.date(SalesOrder.sale_time)
+    in_range = (
+        SalesOrder.status == 1,
+        SalesOrder.sale_time >= start_time,
+        SalesOrder.sale_time < end_time
+    )
+
+    db.session.execute(delete(SalesDailyFact).where(
+        SalesDailyFact.sale_date >= start, SalesDailyFact.sale_date <= end))
+    db.session.execute(delete(SalesDaily).where(
+        SalesDaily.sale_date >= start, SalesDaily.sale_date <= end))
+
+    measures = (
+        func.count(func.distinct(SalesOrder.so_id)),
+        func.sum(SalesDetail.quantity),
+        func.sum(SalesDetail.quantity * SalesDetail.unit_sell_price),
+        func.sum(SalesDetail.quantity * SalesDetail.unit_cost)
+    )
+    source = select(sale_date, SalesDetail.med_id, *measures).join(
+        SalesDetail, SalesOrder.so_id == SalesDetail.so_id
+    ).where(*in_range).group_by(sale_date, SalesDetail.med_id)
+    db.session.execute(insert(SalesDailyFact.__table__).from_select(
+        ['sale_date', 'med_id', *MEASURES], source))
+
+    source = select(sale_date, *measures).join(
+        SalesDetail, SalesOrder.so_id == SalesDetail.so_id
+    ).where(*in_range).group_by(sale_date)
+    db.session.execute(insert(SalesDaily.__table__).from_select(
+        ['sale_date', *MEASURES], source))
@@ -0,0 +1,39 @@
+"""
+SQL 辅助函数
+按数据库方言生成批量 upsert 语句（MySQL: ON DUPLICATE KEY UPDATE，
+SQLite: ON CONFLICT DO UPDATE），统计汇总表的累加/覆盖写入共用
+"""
+from sqlalchemy.dialects import mysql, sqlite
+from app import db
+
+
+def upsert(model, rows, key_cols, add_cols=(), set_cols=()):
+    """
+    批量写入汇总行，一条语句完成
+
+    key_cols: 主键列名；add_cols: 已存在时累加的列；set_cols: 已存在时覆盖的列
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect = db.session.get_bind(mapper=model.__mapper__).dialect.name
+
+    if dialect == 'mysql':
+        stmt = mysql.insert(table).values(rows)
+        incoming = stmt.inserted
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table).values(rows)
+        incoming = stmt.excluded
+    else:
+        raise NotImplementedError(f'不支持的数据库: {dialect}')
+
+    updates = {c: table.c[c] + incoming[c] for c in add_cols}
+    updates.update({c: incoming[c] for c in set_cols})
+    if 'updated_at' in table.c and 'updated_at' not in updates:
+        updates['updated_at'] = db.func.now()
+
+    if dialect == 'mysql':
+        stmt = stmt.on_duplicate_key_update(updates)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=list(key_cols), set_=updates)
+    db.session.execute(stmt)
@@ -0,0 +1,93 @@
+"""
+可用库存索引（进程内缓存）
+med_id -> 未过期批次（按有效期排序）与参考售价，供收银页选药时查询。
+各写库存的路由提交后按 med_id 精确失效；跨天自动重建（批次在零点过期）；
+多进程部署时其他进程的写入由 STOCK_INDEX_TTL 兜底刷新。
+"""
+import threading
+import time
+from collections import defaultdict, namedtuple
+from datetime import date
+from flask import current_app
+from sqlalchemy import select, and_
+from app import db
+from app.models import Medicine, StockBatch
+
+
+StockEntry = namedtuple('StockEntry', ['day', 'loaded_at', 'payload'])
+
+_lock = threading.Lock()
+_entries = {}
+_generations = defaultdict(int)     # 每次失效递增，防止加载期间被失效的旧数据写回
+
+
+def get_available_stock(med_id):
+    """查询药品可用库存，返回可直接序列化为 JSON 的字典"""
+    today = date.today()
+    now = time.monotonic()
+    ttl = current_app.config.get('STOCK_INDEX_TTL', 10)
+
+    entry = _entries.get(med_id)
+    if entry is not None and entry.day == today and now - entry.loaded_at < ttl:
+        return entry.payload
+
+    generation = _generations[med_id]
+    payload = _load(med_id, today)
+    with _lock:
+        if _generations[med_id] == generation:
+            _entries[med_id] = StockEntry(today, now, payload)
+    return payload
+
+
+def invalidate(med_ids=None):
+    """使指定药品的索引失效；不传参数则清空全部"""
+    with _lock:
+        if med_ids is None:
+            for med_id in _entries:
+                _generations[med_id] += 1
+            _entries.clear()
+            return
+        for med_id in med_ids:
+            med_id = int(med_id)
+            _generations[med_id] += 1
+            _entries.pop(med_id, None)
+
+
+def _load(med_id, today):
+    """一次查询加载药品信息及其未过期批次"""
+    rows = db.session.execute(
+        select(
+            Medicine.med_name,
+            Medicine.spec,
+            Medicine.unit,
+            Medicine.ref_sell_price,
+            StockBatch.batch_id,
+            StockBatch.batch_no,
+            StockBatch.cur_batch_qty,
+            StockBatch.expiry_date
+        ).outerjoin(StockBatch, and_(
+            StockBatch.med_id == Medicine.med_id,
+            StockBatch.cur_batch_qty > 0,
+            StockBatch.expiry_date > today
+        )).where(
+            Medicine.med_id == med_id
+        ).order_by(StockBatch.expiry_date)
+    ).all()
+
+    batches = [{
+        'batch_id': r.batch_id,
+        'batch_no': r.batch_no,
+        'qty': r.cur_batch_qty,
+        'expiry_date': r.expiry_date.strftime('%Y-%m-%d'),
+        'days_to_expire': (r.expiry_date - today).days
+    } for r in rows if r.batch_id is not None]
+
+    return {
+        'med_id': med_id,
+        'med_name': rows[0].med_name if rows else '',
+        'spec': rows[0].spec if rows else '',
+        'unit': rows[0].unit if rows else '',
+        'total_available': sum(b['qty'] for b in batches),
+        'sell_price': float(rows[0].ref_sell_price or 0) if rows else 0,
+        'batches': batches
+    }
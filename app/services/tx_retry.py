@@ -0,0 +1,70 @@
+"""
+事务冲突重试
+MySQL 死锁（1213）、锁等待超时（1205）以及加锁复核发现的并发变动，回滚整个事务后重来；
+重试前等待随机时长（上限按次数指数增长），避免相撞的事务同时重试再次冲突。
+重试次数与最终失败次数记入 /metrics。
+"""
+import random
+import time
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.metrics import counter
+
+# MySQL 错误码 -> 重试原因
+RETRYABLE_CODES = {
+    1213: 'deadlock',
+    1205: 'lock_wait_timeout',
+}
+
+RETRIES = counter(
+    'pharmacy_tx_retries_total', '事务因锁冲突回滚重试的次数', ('operation', 'reason'))
+EXHAUSTED = counter(
+    'pharmacy_tx_retry_exhausted_total', '重试耗尽仍失败的事务数', ('operation', 'reason'))
+
+
+class ConflictError(RuntimeError):
+    """业务层发现的并发冲突（如加锁复核不通过），可整单重试"""
+    reason = 'conflict'
+
+
+class RetryExhaustedError(RuntimeError):
+    """重试次数用尽"""
+
+
+def retry_reason(exc):
+    """可重试的异常返回原因标签，否则返回 None"""
+    if isinstance(exc, ConflictError):
+        return exc.reason
+    if isinstance(exc, OperationalError):
+        args = getattr(exc.orig, 'args', ())
+        if args and args[0] in RETRYABLE_CODES:
+            return RETRYABLE_CODES[args[0]]
+        # 开发环境 SQLite 的写锁超时
+        if 'database is locked' in str(exc.orig):
+            return 'lock_wait_timeout'
+    return None
+
+
+def run_with_retry(operation, fn):
+    """
+    执行 fn（须在内部完成提交），遇到可重试的冲突时回滚并重试
+
+    operation: 指标标签，如 'sales.create'
+    返回 fn 的返回值；重试耗尽抛出 RetryExhaustedError，其他异常原样抛出
+    """
+    attempts = current_app.config.get('TX_RETRY_ATTEMPTS', 3)
+    base_delay = current_app.config.get('TX_RETRY_BASE_DELAY', 0.05)
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except Exception as exc:
+            reason = retry_reason(exc)
+            if reason is None:
+                raise
+            db.session.rollback()
+            if attempt == attempts:
+                EXHAUSTED.inc(operation=operation, reason=reason)
+                raise RetryExhaustedError('系统繁忙，请稍后重试') from exc
+            RETRIES.inc(operation=operation, reason=reason)
+            time.sleep(random.uniform(0, base_delay * 2 ** (attempt - 1)))
@@ -0,0 +1,90 @@
+/*
+ * 分页选择器
+ * 结构：<div class="picker" data-url="..."> 文本输入框 .picker-input + 隐藏字段 .picker-value + 下拉 .picker-menu </div>
+ * 输入关键字后按页向服务端查询（{items: [{id, label, ...}], has_more}），选中后把 id 写入隐藏字段，
+ * 并在 .picker 上触发 picker:select 事件（参数为选中项）。事件均为委托绑定，动态新增的行无需再初始化。
+ */
+(function($) {
+    var DELAY = 250;
+
+    function menuOf(box) {
+        return box.find('.picker-menu');
+    }
+
+    function load(box, page) {
+        var seq = (box.data('seq') || 0) + 1;
+        box.data('seq', seq);
+        var q = $.trim(box.find('.picker-input').val());
+        $.getJSON(box.data('url'), {q: q, page: page}).done(function(data) {
+            if (box.data('seq') !== seq) {
+                return;     // 已有更新的查询，丢弃过期响应
+            }
+            var menu = menuOf(box);
+            if (page === 1) {
+                menu.empty();
+            }
+            menu.find('.picker-more').remove();
+            data.items.forEach(function(item) {
+                $('<button type="button" class="dropdown-item picker-item"></button>')
+                    .text(item.label).data('item', item).appendTo(menu);
+            });
+            if (page === 1 && !data.items.length) {
+                menu.append('<span class="dropdown-item-text text-muted">无匹配结果</span>');
+            }
+            if (data.has_more) {
+                $('<button type="button" class="dropdown-item text-primary picker-more">加载更多…</button>')
+                    .data('page', page + 1).appendTo(menu);
+            }
+            menu.addClass('show');
+        });
+    }
+
+    $(document).on('input', '.picker-input', function() {
+        var box = $(this).closest('.picker');
+        box.find('.picker-value').val('');
+        clearTimeout(box.data('timer'));
+        box.data('timer', setTimeout(function() { load(box, 1); }, DELAY));
+    });
+
+    $(document).on('focus', '.picker-input', function() {
+        var box = $(this).closest('.picker');
+        if (menuOf(box).children().length) {
+            menuOf(box).addClass('show');
+        } else {
+            load(box, 1);
+        }
+    });
+
+    $(document).on('blur', '.picker-input', function() {
+        menuOf($(this).closest('.picker')).removeClass('show');
+    });
+
+    // mousedown 先于输入框 blur，阻止默认行为以免菜单在点击前被收起
+    $(document).on('mousedown', '.picker-item', function(e) {
+        e.preventDefault();
+        var box = $(this).closest('.picker');
+        Picker.set(box, $(this).data('item'));
+        menuOf(box).removeClass('show');
+    });
+
+    $(document).on('mousedown', '.picker-more', function(e) {
+        e.preventDefault();
+        load($(this).closest('.picker'), $(this).data('page'));
+    });
+
+    window.Picker = {
+        // 选中一项（也供扫码等脚本直接调用）
+        set: function(box, item) {
+            box.find('.picker-value').val(item.id);
+            box.find('.picker-input').val(item.label);
+            box.trigger('picker:select', [item]);
+        },
+        // 清空选择与已加载的结果（克隆行后调用）
+        reset: function(box) {
+            box.find('.picker-value').val('');
+            box.find('.picker-input').val('');
+            menuOf(box).empty().removeClass('show');
+            box.removeData('seq').removeData('timer');
+        }
+    };
+})(jQuery);
@@ -3,6 +3,34 @@ Flask 应用配置文件
 """
 import os
 
+
+def _engine_options():
+    """
+    按部署规模计算连接池参数
+
+    每个 worker 进程有独立的连接池。gthread worker 的每个线程同一时刻最多占用两个连接：
+    请求会话的连接，以及单号分配器预留号段时在会话连接未归还期间另开的短事务连接
+    （app/services/id_allocator.py）。因此常驻连接数至少为 2 × 线程数，否则所有线程各持一个连接后
+    再取第二个时会互相等待直到 pool_timeout。溢出连接按 DB_MAX_CONNECTIONS（本应用可用的
+    MySQL 连接总数）在各 worker 间均分；workers × 2 × threads 超过该上限时应减少 worker 或线程数，
+    这里不会把连接池压到 2 × 线程数以下
+    """
+    workers = int(os.environ.get('WEB_CONCURRENCY') or 1)
+    threads = int(os.environ.get('GUNICORN_THREADS') or 1)
+    max_connections = int(os.environ.get('DB_MAX_CONNECTIONS') or 100)
+    per_worker = max(1, max_connections // workers)
+    per_thread = 2
+    needed = per_thread * threads
+    pool_size = int(os.environ.get('DB_POOL_SIZE') or max(min(max(needed, 5), per_worker), needed))
+    return {
+        'pool_size': pool_size,
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or max(0, per_worker - pool_size)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT') or 10),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 280),   # 小于 MySQL wait_timeout
+        'pool_pre_ping': True,
+    }
+
+
 class Config:
     """基础配置"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'pharmacy-secret-key-2024'
@@ -18,20 +46,67 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # 设为True可查看SQL语句
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options()
+    
+    # 只读副本：DATABASE_REPLICA_URLS 为逗号分隔的连接串，注册为 replica1、replica2...
+    # 报表、财务与库存统计端点的 GET 请求从副本读取
+    SQLALCHEMY_BINDS = {
+        f'replica{i}': url.strip()
+        for i, url in enumerate((os.environ.get('DATABASE_REPLICA_URLS') or '').split(','), 1)
+        if url.strip()
+    }
+    
+    # 写请求后该会话读主库的秒数（读己之写，需大于副本复制延迟）
+    REPLICA_RYW_SECONDS = int(os.environ.get('REPLICA_RYW_SECONDS') or 5)
     
     # 分页配置
     ITEMS_PER_PAGE = 10
+    
+    # 单号分配：每个进程一次从序列表预留的号段大小
+    ID_BLOCK_SIZE = int(os.environ.get('ID_BLOCK_SIZE') or 20)
+    
+    # 开单页客户/药品选择器分页结果的缓存秒数
+    PICKER_CACHE_TTL = int(os.environ.get('PICKER_CACHE_TTL') or 30)
+    
+    # 到货单导入每个事务写入的行数
+    PURCHASE_IMPORT_CHUNK = int(os.environ.get('PURCHASE_IMPORT_CHUNK') or 500)
+    
+    # 可用库存索引最长缓存秒数（多进程部署时兜底刷新其他进程的写入）
+    STOCK_INDEX_TTL = int(os.environ.get('STOCK_INDEX_TTL') or 10)
+    
+    # 药品搜索索引检查并同步其他进程修改的间隔秒数
+    MEDICINE_SEARCH_SYNC_SECONDS = int(os.environ.get('MEDICINE_SEARCH_SYNC_SECONDS') or 30)
+    
+    # 条码索引检查其他进程修改的间隔秒数
+    BARCODE_INDEX_SYNC_SECONDS = int(os.environ.get('BARCODE_INDEX_SYNC_SECONDS') or 30)
+    
+    # 财务日结区间回填的并行线程数（按月切块）
+    FINANCE_BACKFILL_WORKERS = int(os.environ.get('FINANCE_BACKFILL_WORKERS') or 4)
+    
+    # 页面上区间日结允许的最大天数，更长的区间用命令行 flask finance-settle
+    FINANCE_SETTLE_RANGE_MAX_DAYS = int(os.environ.get('FINANCE_SETTLE_RANGE_MAX_DAYS') or 92)
+    
+    # 死锁/锁等待超时等冲突时事务的最多执行次数与首次重试的等待上限（秒）
+    TX_RETRY_ATTEMPTS = int(os.environ.get('TX_RETRY_ATTEMPTS') or 3)
+    TX_RETRY_BASE_DELAY = float(os.environ.get('TX_RETRY_BASE_DELAY') or 0.05)
+    
+    # 首页/库存概览统计快照缓存秒数
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL') or 5)
+    
+    # /metrics 端点的访问令牌（Authorization: Bearer <令牌>）；未设置时仅管理员登录后可访问
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
 
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
     DEBUG = True
-    SQLALCHEMY_ECHO = True
+    SQLALCHEMY_ECHO = os.environ.get('SQLALCHEMY_ECHO', '1') == '1'
 
 
 class ProductionConfig(Config):
     """生产环境配置"""
     DEBUG = False
+    SQLALCHEMY_ECHO = False
 
 
 # 配置映射
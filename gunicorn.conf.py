@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 配置
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+worker 数与线程数写回环境变量，config.py 据此计算每个进程的连接池大小；
+预加载应用后 fork，worker 启动时丢弃从主进程继承的数据库连接
+"""
+import multiprocessing
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['GUNICORN_THREADS'] = str(threads)
+os.environ.setdefault('FLASK_CONFIG', 'production')
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:8000'
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 2000)
+max_requests_jitter = 200
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """fork 后丢弃继承自主进程的连接（close=False 不关闭主进程仍持有的套接字）"""
+    from app import db
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-药品销售管理系统 - 启动入口
+药品销售管理系统 - 开发环境启动入口
+生产环境请使用 wsgi.py（gunicorn -c gunicorn.conf.py wsgi:app）
 """
 
 from app import create_app
@@ -22,5 +23,5 @@ if __name__ == '__main__':
     app.run(
         host='0.0.0.0',
         port=5000,
-        debug=True
+        debug=app.config.get('DEBUG', False)
     )
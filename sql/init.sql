@@ -26,6 +26,13 @@ DROP TABLE IF EXISTS t_purchase_detail;
 DROP TABLE IF EXISTS t_purchase_order;
 DROP TABLE IF EXISTS t_stock_batch;
 DROP TABLE IF EXISTS t_finance_daily;
+DROP TABLE IF EXISTS t_finance_monthly;
+DROP TABLE IF EXISTS t_finance_annual;
+DROP TABLE IF EXISTS t_id_sequence;
+DROP TABLE IF EXISTS t_change_marker;
+DROP TABLE IF EXISTS t_sales_daily_fact;
+DROP TABLE IF EXISTS t_sales_daily;
+DROP TABLE IF EXISTS t_medicine_barcode;
 DROP TABLE IF EXISTS t_medicine;
 DROP TABLE IF EXISTS t_customer;
 DROP TABLE IF EXISTS t_supplier;
@@ -78,12 +85,15 @@ CREATE TABLE t_medicine (
     category VARCHAR(20) DEFAULT 'OTC' COMMENT '类别',
     unit VARCHAR(10) DEFAULT '盒' COMMENT '单位',
     factory VARCHAR(100) COMMENT '生产厂家',
+    barcode VARCHAR(32) UNIQUE COMMENT '商品条码(单品)',
+    approval_no VARCHAR(50) COMMENT '批准文号',
     ref_buy_price DECIMAL(10,2) CHECK (ref_buy_price > 0) COMMENT '参考进价',
     ref_sell_price DECIMAL(10,2) CHECK (ref_sell_price > 0) COMMENT '参考售价',
     total_stock INT DEFAULT 0 COMMENT '总库存',
     alert_qty INT DEFAULT 10 COMMENT '预警线',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
-    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    catalog_updated_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '目录信息(名称/规格/厂家/类别/条码)修改时间，库存变动不更新'
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='药品信息表';
 
 -- ============================================
@@ -96,7 +106,7 @@ CREATE TABLE t_purchase_order (
     sup_id INT NOT NULL COMMENT '供应商ID',
     emp_id INT NOT NULL COMMENT '经手人',
     total_amount DECIMAL(12,2) DEFAULT 0.00 COMMENT '总金额',
-    purchase_date DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '进货日期',
+    purchase_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '进货日期',
     status TINYINT DEFAULT 1 COMMENT '状态(1:正常,0:撤销)',
     FOREIGN KEY (sup_id) REFERENCES t_supplier(sup_id),
     FOREIGN KEY (emp_id) REFERENCES t_employee(emp_id)
@@ -141,7 +151,7 @@ CREATE TABLE t_inventory_check (
     diff_qty INT AS (actual_qty - book_qty) STORED COMMENT '差异',
     diff_amount DECIMAL(12,2) COMMENT '盈亏金额',
     emp_id INT NOT NULL COMMENT '盘点人',
-    check_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '盘点时间',
+    check_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '盘点时间',
     remark VARCHAR(200) COMMENT '备注',
     FOREIGN KEY (batch_id) REFERENCES t_stock_batch(batch_id),
     FOREIGN KEY (emp_id) REFERENCES t_employee(emp_id)
@@ -156,7 +166,7 @@ CREATE TABLE t_sales_order (
     so_id VARCHAR(20) PRIMARY KEY COMMENT '销售单号',
     emp_id INT NOT NULL COMMENT '销售员',
     cus_id INT COMMENT '客户ID',
-    sale_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '销售时间',
+    sale_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '销售时间',
     total_price DECIMAL(12,2) DEFAULT 0.00 COMMENT '总价',
     status TINYINT DEFAULT 1 COMMENT '状态(1:正常,0:退货)',
     FOREIGN KEY (emp_id) REFERENCES t_employee(emp_id),
@@ -171,6 +181,7 @@ CREATE TABLE t_sales_detail (
     med_id INT NOT NULL COMMENT '药品ID',
     quantity INT NOT NULL CHECK (quantity > 0) COMMENT '数量',
     unit_sell_price DECIMAL(10,2) NOT NULL COMMENT '售价',
+    unit_cost DECIMAL(10,2) NOT NULL DEFAULT 0.00 COMMENT '成本单价（销售时的参考进价）',
     FOREIGN KEY (so_id) REFERENCES t_sales_order(so_id),
     FOREIGN KEY (batch_id) REFERENCES t_stock_batch(batch_id),
     FOREIGN KEY (med_id) REFERENCES t_medicine(med_id)
@@ -187,7 +198,8 @@ CREATE TABLE t_purchase_return (
     sup_id INT NOT NULL COMMENT '供应商ID',
     batch_id INT NOT NULL COMMENT '批次ID',
     quantity INT NOT NULL CHECK (quantity > 0) COMMENT '退回数量',
-    return_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '退货时间',
+    unit_price DECIMAL(10,2) NOT NULL DEFAULT 0.00 COMMENT '退出单价（退出时的参考进价）',
+    return_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '退货时间',
     reason VARCHAR(200) COMMENT '退货原因',
     status TINYINT DEFAULT 1 COMMENT '状态(1:处理,0:撤销)',
     emp_id INT NOT NULL COMMENT '处理人',
@@ -203,7 +215,8 @@ CREATE TABLE t_sales_return (
     so_id VARCHAR(20) NOT NULL COMMENT '原销售单号',
     batch_id INT NOT NULL COMMENT '批次ID',
     quantity INT NOT NULL CHECK (quantity > 0) COMMENT '退回数量',
-    return_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '退货时间',
+    unit_price DECIMAL(10,2) NOT NULL DEFAULT 0.00 COMMENT '退货单价（退货时的参考售价）',
+    return_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '退货时间',
     reason VARCHAR(200) COMMENT '退货原因',
     status TINYINT DEFAULT 1 COMMENT '状态(1:处理,0:撤销)',
     emp_id INT NOT NULL COMMENT '处理人',
@@ -230,23 +243,111 @@ CREATE TABLE t_finance_daily (
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='财务日结表';
 
+-- 14. 销售日汇总表（随销售/整单退货增量维护）
+CREATE TABLE t_sales_daily (
+    sale_date DATE PRIMARY KEY COMMENT '销售日期',
+    order_count INT DEFAULT 0 COMMENT '订单数',
+    quantity INT DEFAULT 0 COMMENT '销售数量',
+    revenue DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售额',
+    cost DECIMAL(14,2) DEFAULT 0.00 COMMENT '成本(参考进价)',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='销售日汇总表';
+
+-- 15. 销售日事实表（按日、按药品）
+CREATE TABLE t_sales_daily_fact (
+    sale_date DATE NOT NULL COMMENT '销售日期',
+    med_id INT NOT NULL COMMENT '药品ID',
+    order_count INT DEFAULT 0 COMMENT '包含该药品的订单数',
+    quantity INT DEFAULT 0 COMMENT '销售数量',
+    revenue DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售额',
+    cost DECIMAL(14,2) DEFAULT 0.00 COMMENT '成本(参考进价)',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (sale_date, med_id),
+    FOREIGN KEY (med_id) REFERENCES t_medicine(med_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='销售日事实表';
+
+-- 16. 财务月汇总表（由日结行汇总维护）
+CREATE TABLE t_finance_monthly (
+    year SMALLINT NOT NULL COMMENT '年份',
+    month TINYINT NOT NULL COMMENT '月份',
+    sales_revenue DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售收入',
+    sales_profit DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售毛利',
+    sales_return_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售退货金额',
+    purc_return_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '购进退货金额',
+    inv_loss_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '盘亏金额',
+    inv_gain_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '盘盈金额',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (year, month)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='财务月汇总表';
+
+-- 17. 财务年汇总表（由日结行汇总维护）
+CREATE TABLE t_finance_annual (
+    year SMALLINT PRIMARY KEY COMMENT '年份',
+    sales_revenue DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售收入',
+    sales_profit DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售毛利',
+    sales_return_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售退货金额',
+    purc_return_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '购进退货金额',
+    inv_loss_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '盘亏金额',
+    inv_gain_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '盘盈金额',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='财务年汇总表';
+
+-- ============================================
+-- 八、系统表
+-- ============================================
+
+-- 18. 单号序列表（应用层按号段分配单号）
+CREATE TABLE t_id_sequence (
+    seq_key VARCHAR(20) PRIMARY KEY COMMENT '序列键(前缀+日期,如S20240101)',
+    next_val INT NOT NULL DEFAULT 1 COMMENT '下一个未分配的序号',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='单号序列表';
+
+-- 19. 药品附加条码表（中包/整箱等多件装条码，多对一指向药品）
+CREATE TABLE t_medicine_barcode (
+    barcode VARCHAR(32) PRIMARY KEY COMMENT '条码',
+    med_id INT NOT NULL COMMENT '药品ID',
+    pack_qty INT NOT NULL DEFAULT 1 CHECK (pack_qty > 0) COMMENT '每扫一次计入的数量',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    INDEX idx_medicine_barcode_med (med_id),
+    FOREIGN KEY (med_id) REFERENCES t_medicine(med_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='药品附加条码表';
+
+-- 20. 变更标记表（药品目录等数据修改时同一事务内递增版本号，进程内索引据此同步，不受库存写入影响）
+CREATE TABLE t_change_marker (
+    marker_key VARCHAR(30) PRIMARY KEY COMMENT '标记键',
+    version BIGINT NOT NULL DEFAULT 0 COMMENT '版本号(每次相关修改递增)',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='变更标记表';
+
 -- 启用外键检查
 SET FOREIGN_KEY_CHECKS = 1;
 
 -- ============================================
--- 八、索引设计
+-- 九、索引设计
 -- ============================================
 
 CREATE INDEX idx_medicine_name ON t_medicine(med_name);
 CREATE INDEX idx_medicine_category ON t_medicine(category);
+CREATE INDEX idx_medicine_approval_no ON t_medicine(approval_no);
+CREATE INDEX idx_medicine_catalog_updated ON t_medicine(catalog_updated_at);
 CREATE INDEX idx_stock_batch_no ON t_stock_batch(batch_no);
-CREATE INDEX idx_stock_expiry ON t_stock_batch(expiry_date);
+CREATE INDEX idx_stock_fefo ON t_stock_batch(med_id, expiry_date, cur_batch_qty);
+CREATE INDEX idx_stock_expiry_qty ON t_stock_batch(expiry_date, cur_batch_qty);
 CREATE INDEX idx_purchase_date ON t_purchase_order(purchase_date);
 CREATE INDEX idx_sales_time ON t_sales_order(sale_time);
 CREATE INDEX idx_supplier_name ON t_supplier(sup_name);
+CREATE INDEX idx_customer_name ON t_customer(cus_name);
+CREATE INDEX idx_purchase_detail_order ON t_purchase_detail(po_id, med_id, batch_no, quantity);
+CREATE INDEX idx_sales_detail_order ON t_sales_detail(so_id, batch_id, quantity);
+CREATE INDEX idx_purchase_return_order ON t_purchase_return(po_id, batch_id);
+CREATE INDEX idx_sales_return_order ON t_sales_return(so_id, batch_id);
+CREATE INDEX idx_inventory_check_time ON t_inventory_check(check_time);
+CREATE INDEX idx_sales_return_time ON t_sales_return(return_time, sr_id);
+CREATE INDEX idx_purchase_return_time ON t_purchase_return(return_time, pr_id);
 
 -- ============================================
--- 九、视图设计
+-- 十、视图设计
 -- ============================================
 
 -- 视图1: 过期药品视图
@@ -347,52 +448,18 @@ ORDER BY total_sold DESC
 LIMIT 10;
 
 -- ============================================
--- 十、触发器设计
+-- 十一、触发器设计
 -- ============================================
 
 DELIMITER //
 
--- 触发器1: 进货后自动更新库存
+-- 触发器1: 已移除。进货明细、批次与总库存由应用层以集合语句写入
+-- （app/services/receiving.py），避免大批量到货逐行触发查询与两次写入
 DROP TRIGGER IF EXISTS trg_after_purchase_detail_insert//
-CREATE TRIGGER trg_after_purchase_detail_insert
-AFTER INSERT ON t_purchase_detail
-FOR EACH ROW
-BEGIN
-    DECLARE v_batch_id INT;
-    
-    SELECT batch_id INTO v_batch_id 
-    FROM t_stock_batch 
-    WHERE med_id = NEW.med_id AND batch_no = NEW.batch_no
-    LIMIT 1;
-    
-    IF v_batch_id IS NULL THEN
-        INSERT INTO t_stock_batch (med_id, batch_no, expiry_date, cur_batch_qty, create_time)
-        VALUES (NEW.med_id, NEW.batch_no, NEW.expiry_date, NEW.quantity, CURDATE());
-    ELSE
-        UPDATE t_stock_batch 
-        SET cur_batch_qty = cur_batch_qty + NEW.quantity
-        WHERE batch_id = v_batch_id;
-    END IF;
-    
-    UPDATE t_medicine 
-    SET total_stock = total_stock + NEW.quantity
-    WHERE med_id = NEW.med_id;
-END//
 
--- 触发器2: 销售后自动扣减库存
+-- 触发器2: 已移除。销售扣减库存由应用层在同一事务内批量完成
+-- （app/services/allocation.py），避免逐行触发两次 UPDATE
 DROP TRIGGER IF EXISTS trg_after_sales_detail_insert//
-CREATE TRIGGER trg_after_sales_detail_insert
-AFTER INSERT ON t_sales_detail
-FOR EACH ROW
-BEGIN
-    UPDATE t_stock_batch 
-    SET cur_batch_qty = cur_batch_qty - NEW.quantity
-    WHERE batch_id = NEW.batch_id;
-    
-    UPDATE t_medicine 
-    SET total_stock = total_stock - NEW.quantity
-    WHERE med_id = NEW.med_id;
-END//
 
 -- 触发器3: 销售退货恢复库存
 DROP TRIGGER IF EXISTS trg_after_sales_return_insert//
@@ -463,46 +530,18 @@ END//
 DELIMITER ;
 
 -- ============================================
--- 十一、存储函数/过程
+-- 十二、存储函数/过程
 -- ============================================
 
 DELIMITER //
 
--- 函数1: 生成进货单号
+-- 函数1/2: 已移除。进货单号、销售单号改由应用层号段分配器生成
+-- （app/services/id_allocator.py + t_id_sequence），避免并发重号与逐单 LIKE 扫描
 DROP FUNCTION IF EXISTS fn_generate_po_id//
-CREATE FUNCTION fn_generate_po_id() RETURNS VARCHAR(20)
-DETERMINISTIC
-BEGIN
-    DECLARE v_date_str VARCHAR(8);
-    DECLARE v_seq INT;
-    
-    SET v_date_str = DATE_FORMAT(CURDATE(), '%Y%m%d');
-    
-    SELECT IFNULL(MAX(CAST(RIGHT(po_id, 4) AS UNSIGNED)), 0) + 1 INTO v_seq
-    FROM t_purchase_order
-    WHERE po_id LIKE CONCAT('P', v_date_str, '%') COLLATE utf8mb4_0900_ai_ci;
-    
-    RETURN CONCAT('P', v_date_str, LPAD(v_seq, 4, '0'));
-END//
-
--- 函数2: 生成销售单号
 DROP FUNCTION IF EXISTS fn_generate_so_id//
-CREATE FUNCTION fn_generate_so_id() RETURNS VARCHAR(20)
-DETERMINISTIC
-BEGIN
-    DECLARE v_date_str VARCHAR(8);
-    DECLARE v_seq INT;
-    
-    SET v_date_str = DATE_FORMAT(CURDATE(), '%Y%m%d');
-    
-    SELECT IFNULL(MAX(CAST(RIGHT(so_id, 4) AS UNSIGNED)), 0) + 1 INTO v_seq
-    FROM t_sales_order
-    WHERE so_id LIKE CONCAT('S', v_date_str, '%') COLLATE utf8mb4_0900_ai_ci;
-    
-    RETURN CONCAT('S', v_date_str, LPAD(v_seq, 4, '0'));
-END//
 
 -- 存储过程: 月度财务统计
+-- 各指标分别按源表与时间范围统计，避免跨表笛卡尔连接（应用层见 app/services/monthly_report.py）
 DROP PROCEDURE IF EXISTS sp_monthly_report//
 CREATE PROCEDURE sp_monthly_report(
     IN p_year INT,
@@ -513,18 +552,22 @@ BEGIN
     DECLARE v_end_date DATE;
     
     SET v_start_date = CONCAT(p_year, '-', LPAD(p_month, 2, '0'), '-01');
-    SET v_end_date = LAST_DAY(v_start_date);
+    SET v_end_date = DATE_ADD(v_start_date, INTERVAL 1 MONTH);
     
     SELECT 
         DATE_FORMAT(v_start_date, '%Y年%m月') AS month_name,
-        IFNULL(SUM(sd.quantity * sd.unit_sell_price), 0) AS total_sales,
-        COUNT(DISTINCT so.so_id) AS order_count,
-        IFNULL(SUM(diff_amount), 0) AS inventory_loss
-    FROM t_sales_order so
-    LEFT JOIN t_sales_detail sd ON so.so_id = sd.so_id
-    LEFT JOIN t_inventory_check ic ON ic.check_time BETWEEN v_start_date AND v_end_date
-    WHERE so.status = 1
-      AND so.sale_time BETWEEN v_start_date AND v_end_date;
+        (SELECT IFNULL(SUM(sd.quantity * sd.unit_sell_price), 0)
+           FROM t_sales_order so
+           JOIN t_sales_detail sd ON so.so_id = sd.so_id
+          WHERE so.status = 1
+            AND so.sale_time >= v_start_date AND so.sale_time < v_end_date) AS total_sales,
+        (SELECT COUNT(*)
+           FROM t_sales_order so
+          WHERE so.status = 1
+            AND so.sale_time >= v_start_date AND so.sale_time < v_end_date) AS order_count,
+        (SELECT IFNULL(SUM(CASE WHEN ic.diff_amount < 0 THEN -ic.diff_amount ELSE 0 END), 0)
+           FROM t_inventory_check ic
+          WHERE ic.check_time >= v_start_date AND ic.check_time < v_end_date) AS inventory_loss;
 END//
 
 -- 存储过程: 财务日结
@@ -540,32 +583,27 @@ BEGIN
         DECLARE v_inv_loss DECIMAL(12,2) DEFAULT 0;
         DECLARE v_inv_gain DECIMAL(12,2) DEFAULT 0;
 
-        -- 销售收入与毛利（用参考进价估算成本）
+        -- 销售收入与毛利（成本取销售明细记录的成本单价）
         SELECT 
                 IFNULL(SUM(sd.quantity * sd.unit_sell_price), 0),
-                IFNULL(SUM(sd.quantity * (sd.unit_sell_price - IFNULL(m.ref_buy_price, 0))), 0)
+                IFNULL(SUM(sd.quantity * (sd.unit_sell_price - sd.unit_cost)), 0)
         INTO v_sales_revenue, v_sales_profit
         FROM t_sales_order so
         JOIN t_sales_detail sd ON so.so_id = sd.so_id
-        JOIN t_medicine m ON sd.med_id = m.med_id
         WHERE so.status = 1
             AND DATE(so.sale_time) = p_date;
 
-        -- 销售退货金额（用参考售价估算）
-        SELECT IFNULL(SUM(sr.quantity * IFNULL(m.ref_sell_price, 0)), 0)
+        -- 销售退货金额（退货记录的退货单价）
+        SELECT IFNULL(SUM(sr.quantity * sr.unit_price), 0)
         INTO v_sales_return
         FROM t_sales_return sr
-        JOIN t_stock_batch sb ON sr.batch_id = sb.batch_id
-        JOIN t_medicine m ON sb.med_id = m.med_id
         WHERE sr.status = 1
             AND DATE(sr.return_time) = p_date;
 
-        -- 购进退出金额（用参考进价估算）
-        SELECT IFNULL(SUM(pr.quantity * IFNULL(m.ref_buy_price, 0)), 0)
+        -- 购进退出金额（退出记录的退出单价）
+        SELECT IFNULL(SUM(pr.quantity * pr.unit_price), 0)
         INTO v_purc_return
         FROM t_purchase_return pr
-        JOIN t_stock_batch sb ON pr.batch_id = sb.batch_id
-        JOIN t_medicine m ON sb.med_id = m.med_id
         WHERE pr.status = 1
             AND DATE(pr.return_time) = p_date;
 
@@ -591,7 +629,7 @@ END//
 DELIMITER ;
 
 -- ============================================
--- 十二、初始测试数据
+-- 十三、初始测试数据
 -- ============================================
 
 -- 插入员工
@@ -0,0 +1,9 @@
+-- ============================================
+-- 迁移 001: 销售批次分配改由应用层批量处理
+-- 适用于已执行过旧版 init.sql 的数据库
+-- ============================================
+USE pharmacy_db;
+
+-- 销售明细插入不再逐行扣减库存，
+-- 扣减由 app/services/allocation.py 在同一事务中以批量 UPDATE 完成
+DROP TRIGGER IF EXISTS trg_after_sales_detail_insert;
@@ -0,0 +1,17 @@
+-- ============================================
+-- 迁移 002: 单号改由应用层号段分配器生成
+-- 适用于已执行过旧版 init.sql 的数据库
+-- ============================================
+USE pharmacy_db;
+
+-- 单号序列表：每个进程按 前缀+日期 预留一段序号后在内存中发号
+-- 当天计数行不存在时，应用会接续已有单据的最大序号自动创建
+CREATE TABLE IF NOT EXISTS t_id_sequence (
+    seq_key VARCHAR(20) PRIMARY KEY COMMENT '序列键(前缀+日期,如S20240101)',
+    next_val INT NOT NULL DEFAULT 1 COMMENT '下一个未分配的序号',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='单号序列表';
+
+-- 旧的按 MAX(...) LIKE 扫描生成单号的函数不再使用
+DROP FUNCTION IF EXISTS fn_generate_po_id;
+DROP FUNCTION IF EXISTS fn_generate_so_id;
@@ -0,0 +1,53 @@
+-- ============================================
+-- 迁移 003: 销售日汇总表
+-- 适用于已执行过旧版 init.sql 的数据库
+-- ============================================
+USE pharmacy_db;
+
+CREATE TABLE IF NOT EXISTS t_sales_daily (
+    sale_date DATE PRIMARY KEY COMMENT '销售日期',
+    order_count INT DEFAULT 0 COMMENT '订单数',
+    quantity INT DEFAULT 0 COMMENT '销售数量',
+    revenue DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售额',
+    cost DECIMAL(14,2) DEFAULT 0.00 COMMENT '成本(参考进价)',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='销售日汇总表';
+
+CREATE TABLE IF NOT EXISTS t_sales_daily_fact (
+    sale_date DATE NOT NULL COMMENT '销售日期',
+    med_id INT NOT NULL COMMENT '药品ID',
+    order_count INT DEFAULT 0 COMMENT '包含该药品的订单数',
+    quantity INT DEFAULT 0 COMMENT '销售数量',
+    revenue DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售额',
+    cost DECIMAL(14,2) DEFAULT 0.00 COMMENT '成本(参考进价)',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (sale_date, med_id),
+    FOREIGN KEY (med_id) REFERENCES t_medicine(med_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='销售日事实表';
+
+-- 回填历史数据（也可执行 flask rebuild-sales-facts --start ... --end ... 按范围重算）
+DELETE FROM t_sales_daily_fact;
+INSERT INTO t_sales_daily_fact (sale_date, med_id, order_count, quantity, revenue, cost)
+SELECT DATE(so.sale_time), sd.med_id,
+       COUNT(DISTINCT so.so_id),
+       SUM(sd.quantity),
+       SUM(sd.quantity * sd.unit_sell_price),
+       SUM(sd.quantity * IFNULL(m.ref_buy_price, 0))
+FROM t_sales_order so
+JOIN t_sales_detail sd ON so.so_id = sd.so_id
+JOIN t_medicine m ON sd.med_id = m.med_id
+WHERE so.status = 1
+GROUP BY DATE(so.sale_time), sd.med_id;
+
+DELETE FROM t_sales_daily;
+INSERT INTO t_sales_daily (sale_date, order_count, quantity, revenue, cost)
+SELECT DATE(so.sale_time),
+       COUNT(DISTINCT so.so_id),
+       SUM(sd.quantity),
+       SUM(sd.quantity * sd.unit_sell_price),
+       SUM(sd.quantity * IFNULL(m.ref_buy_price, 0))
+FROM t_sales_order so
+JOIN t_sales_detail sd ON so.so_id = sd.so_id
+JOIN t_medicine m ON sd.med_id = m.med_id
+WHERE so.status = 1
+GROUP BY DATE(so.sale_time);
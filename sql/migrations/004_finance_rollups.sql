@@ -0,0 +1,46 @@
+-- ============================================
+-- 迁移 004: 财务月/年汇总表
+-- 适用于已执行过旧版 init.sql 的数据库
+-- ============================================
+USE pharmacy_db;
+
+CREATE TABLE IF NOT EXISTS t_finance_monthly (
+    year SMALLINT NOT NULL COMMENT '年份',
+    month TINYINT NOT NULL COMMENT '月份',
+    sales_revenue DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售收入',
+    sales_profit DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售毛利',
+    sales_return_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售退货金额',
+    purc_return_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '购进退货金额',
+    inv_loss_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '盘亏金额',
+    inv_gain_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '盘盈金额',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (year, month)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='财务月汇总表';
+
+CREATE TABLE IF NOT EXISTS t_finance_annual (
+    year SMALLINT PRIMARY KEY COMMENT '年份',
+    sales_revenue DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售收入',
+    sales_profit DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售毛利',
+    sales_return_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '销售退货金额',
+    purc_return_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '购进退货金额',
+    inv_loss_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '盘亏金额',
+    inv_gain_amt DECIMAL(14,2) DEFAULT 0.00 COMMENT '盘盈金额',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='财务年汇总表';
+
+-- 由现有日结行回填
+DELETE FROM t_finance_monthly;
+INSERT INTO t_finance_monthly (year, month, sales_revenue, sales_profit, sales_return_amt,
+                               purc_return_amt, inv_loss_amt, inv_gain_amt)
+SELECT YEAR(day_id), MONTH(day_id), SUM(sales_revenue), SUM(sales_profit), SUM(sales_return_amt),
+       SUM(purc_return_amt), SUM(inv_loss_amt), SUM(inv_gain_amt)
+FROM t_finance_daily
+GROUP BY YEAR(day_id), MONTH(day_id);
+
+DELETE FROM t_finance_annual;
+INSERT INTO t_finance_annual (year, sales_revenue, sales_profit, sales_return_amt,
+                              purc_return_amt, inv_loss_amt, inv_gain_amt)
+SELECT year, SUM(sales_revenue), SUM(sales_profit), SUM(sales_return_amt),
+       SUM(purc_return_amt), SUM(inv_loss_amt), SUM(inv_gain_amt)
+FROM t_finance_monthly
+GROUP BY year;
@@ -0,0 +1,37 @@
+-- ============================================
+-- 迁移 005: 修正 sp_monthly_report
+-- 旧版按时间条件连接盘点表且无连接键，销售明细与当月盘点记录做笛卡尔积导致合计虚增；
+-- 改为各指标独立子查询。应用层已改用 app/services/monthly_report.py 统计
+-- ============================================
+USE pharmacy_db;
+
+DELIMITER //
+DROP PROCEDURE IF EXISTS sp_monthly_report//
+CREATE PROCEDURE sp_monthly_report(
+    IN p_year INT,
+    IN p_month INT
+)
+BEGIN
+    DECLARE v_start_date DATE;
+    DECLARE v_end_date DATE;
+    
+    SET v_start_date = CONCAT(p_year, '-', LPAD(p_month, 2, '0'), '-01');
+    SET v_end_date = DATE_ADD(v_start_date, INTERVAL 1 MONTH);
+    
+    SELECT 
+        DATE_FORMAT(v_start_date, '%Y年%m月') AS month_name,
+        (SELECT IFNULL(SUM(sd.quantity * sd.unit_sell_price), 0)
+           FROM t_sales_order so
+           JOIN t_sales_detail sd ON so.so_id = sd.so_id
+          WHERE so.status = 1
+            AND so.sale_time >= v_start_date AND so.sale_time < v_end_date) AS total_sales,
+        (SELECT COUNT(*)
+           FROM t_sales_order so
+          WHERE so.status = 1
+            AND so.sale_time >= v_start_date AND so.sale_time < v_end_date) AS order_count,
+        (SELECT IFNULL(SUM(CASE WHEN ic.diff_amount < 0 THEN -ic.diff_amount ELSE 0 END), 0)
+           FROM t_inventory_check ic
+          WHERE ic.check_time >= v_start_date AND ic.check_time < v_end_date) AS inventory_loss;
+END//
+
+DELIMITER ;
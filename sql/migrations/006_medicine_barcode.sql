@@ -0,0 +1,20 @@
+-- ============================================
+-- 迁移 006: 药品条码与批准文号
+-- 收银扫码按条码/批准文号直接定位药品；多件装条码记入附加条码表
+-- ============================================
+USE pharmacy_db;
+
+ALTER TABLE t_medicine
+    ADD COLUMN barcode VARCHAR(32) NULL COMMENT '商品条码(单品)' AFTER factory,
+    ADD COLUMN approval_no VARCHAR(50) NULL COMMENT '批准文号' AFTER barcode,
+    ADD UNIQUE INDEX barcode (barcode),
+    ADD INDEX idx_medicine_approval_no (approval_no);
+
+CREATE TABLE IF NOT EXISTS t_medicine_barcode (
+    barcode VARCHAR(32) PRIMARY KEY COMMENT '条码',
+    med_id INT NOT NULL COMMENT '药品ID',
+    pack_qty INT NOT NULL DEFAULT 1 CHECK (pack_qty > 0) COMMENT '每扫一次计入的数量',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    INDEX idx_medicine_barcode_med (med_id),
+    FOREIGN KEY (med_id) REFERENCES t_medicine(med_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='药品附加条码表';
@@ -0,0 +1,7 @@
+-- ============================================
+-- 迁移 007: 客户姓名索引
+-- 开单页客户选择器按姓名前缀分页查询（手机号前缀查询已有唯一索引）
+-- ============================================
+USE pharmacy_db;
+
+CREATE INDEX idx_customer_name ON t_customer(cus_name);
@@ -0,0 +1,10 @@
+-- ============================================
+-- 迁移 008: 进货入库改由应用层集合写入
+-- 适用于已执行过旧版 init.sql 的数据库
+-- ============================================
+USE pharmacy_db;
+
+-- 进货明细插入不再逐行创建/累加批次并累加总库存，
+-- 改由 app/services/receiving.py 在同一事务中以批量 INSERT / upsert / UPDATE 完成
+-- （手工开单与到货单导入共用）。须与应用新版本同时上线，否则进货不会入库
+DROP TRIGGER IF EXISTS trg_after_purchase_detail_insert;
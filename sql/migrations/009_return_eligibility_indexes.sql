@@ -0,0 +1,11 @@
+-- ============================================
+-- 迁移 009: 退货资格查询索引
+-- 退货页按单号汇总明细与已退数量（app/services/return_eligibility.py），
+-- 以下复合索引以单号开头并覆盖汇总所需的列，查询只扫描本单的索引行
+-- ============================================
+USE pharmacy_db;
+
+CREATE INDEX idx_purchase_detail_order ON t_purchase_detail(po_id, med_id, batch_no, quantity);
+CREATE INDEX idx_sales_detail_order ON t_sales_detail(so_id, batch_id, quantity);
+CREATE INDEX idx_purchase_return_order ON t_purchase_return(po_id, batch_id);
+CREATE INDEX idx_sales_return_order ON t_sales_return(so_id, batch_id);
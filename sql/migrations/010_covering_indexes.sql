@@ -0,0 +1,27 @@
+-- ============================================
+-- 迁移 010: 热点查询复合/覆盖索引
+-- 执行计划由 tools/explain_check.py 检查（任一热点查询全表扫描即失败）
+-- ============================================
+USE pharmacy_db;
+
+-- 下单 FEFO 分配与可售批次：med_id IN (...) AND cur_batch_qty > 0 AND expiry_date > ? ORDER BY med_id, expiry_date
+-- 覆盖索引（InnoDB 二级索引自带主键 batch_id），不回表
+CREATE INDEX idx_stock_fefo ON t_stock_batch(med_id, expiry_date, cur_batch_qty);
+
+-- 近效期与库存批次页：按有效期范围过滤并排序，同时过滤 cur_batch_qty > 0；取代单列 idx_stock_expiry
+ALTER TABLE t_stock_batch
+    DROP INDEX idx_stock_expiry,
+    ADD INDEX idx_stock_expiry_qty (expiry_date, cur_batch_qty);
+
+-- 按批次查销售明细（原先只有外键自动创建的索引）
+CREATE INDEX idx_sales_detail_batch ON t_sales_detail(batch_id);
+
+-- 盘点记录页按 (check_time, check_id) 键集分页，月报按 check_time 范围汇总
+CREATE INDEX idx_inventory_check_time ON t_inventory_check(check_time);
+
+-- 退货列表页按 (return_time, 单号) 键集分页
+CREATE INDEX idx_sales_return_time ON t_sales_return(return_time, sr_id);
+CREATE INDEX idx_purchase_return_time ON t_purchase_return(return_time, pr_id);
+
+-- 搜索索引与条码索引按 updated_at 增量同步（MAX(updated_at) 与 updated_at >= ?）
+CREATE INDEX idx_medicine_updated ON t_medicine(updated_at);
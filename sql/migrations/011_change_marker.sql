@@ -0,0 +1,14 @@
+-- ============================================
+-- 迁移 011: 变更标记表
+-- 条码索引原按 t_medicine 的 MAX(updated_at) 判断是否需要重建，
+-- 但每次销售、入库、退货更新 total_stock 都会刷新 updated_at，导致各进程反复整表重建。
+-- 改为药品目录（名称、规格、厂家、类别、条码、批准文号、附加条码）修改时
+-- 在同一事务内递增 medicine_catalog 的版本号，各进程只比较版本号
+-- ============================================
+USE pharmacy_db;
+
+CREATE TABLE IF NOT EXISTS t_change_marker (
+    marker_key VARCHAR(30) PRIMARY KEY COMMENT '标记键',
+    version BIGINT NOT NULL DEFAULT 0 COMMENT '版本号(每次相关修改递增)',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='变更标记表';
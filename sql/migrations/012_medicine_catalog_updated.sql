@@ -0,0 +1,18 @@
+-- ============================================
+-- 迁移 012: 药品目录修改时间
+-- 搜索索引原按 updated_at 增量同步，但每次库存写入都会刷新 updated_at，
+-- 每轮同步都要取回所有库存变动过的药品。新增只在目录信息修改时由应用写入的 catalog_updated_at，
+-- 是否需要同步由变更标记（迁移 011）判断
+-- ============================================
+USE pharmacy_db;
+
+ALTER TABLE t_medicine
+    ADD COLUMN catalog_updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        COMMENT '目录信息(名称/规格/厂家/类别/条码)修改时间，库存变动不更新' AFTER updated_at;
+
+UPDATE t_medicine SET catalog_updated_at = updated_at;
+
+-- 迁移 010 为按 updated_at 同步添加的索引改为目录修改时间
+ALTER TABLE t_medicine
+    DROP INDEX idx_medicine_updated,
+    ADD INDEX idx_medicine_catalog_updated (catalog_updated_at);
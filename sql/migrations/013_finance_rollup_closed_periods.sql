@@ -0,0 +1,13 @@
+-- ============================================
+-- 迁移 013: 财务月/年汇总只保存已结束的期间
+-- 实时记账不再累加当月、当年的汇总行（收银事务争用同一行），未结束的期间读取时直接汇总日结行。
+-- 此前由实时记账累加出的本月、本年汇总行今后不再更新，删除后由期间结束后的日结或回填重新生成
+-- ============================================
+USE pharmacy_db;
+
+DELETE FROM t_finance_monthly
+WHERE year > YEAR(CURDATE())
+   OR (year = YEAR(CURDATE()) AND month >= MONTH(CURDATE()));
+
+DELETE FROM t_finance_annual
+WHERE year >= YEAR(CURDATE());
@@ -0,0 +1,92 @@
+-- ============================================
+-- 迁移 014: 财务金额按业务发生时记录的单价计算
+-- 实时记账按记账时的参考进价/售价计成本与退货金额，日结核对却连接药品表的当前参考价重算，
+-- 参考价修改后日结核对会把历史金额报为差异并“修复”掉。改为在销售明细记录成本单价、
+-- 在退货记录中记录退货单价，记账、日结核对、区间回填与存储过程都只用这些记录值
+-- ============================================
+USE pharmacy_db;
+
+ALTER TABLE t_sales_detail
+    ADD COLUMN unit_cost DECIMAL(10,2) NOT NULL DEFAULT 0.00
+        COMMENT '成本单价（销售时的参考进价）' AFTER unit_sell_price;
+
+ALTER TABLE t_sales_return
+    ADD COLUMN unit_price DECIMAL(10,2) NOT NULL DEFAULT 0.00
+        COMMENT '退货单价（退货时的参考售价）' AFTER quantity;
+
+ALTER TABLE t_purchase_return
+    ADD COLUMN unit_price DECIMAL(10,2) NOT NULL DEFAULT 0.00
+        COMMENT '退出单价（退出时的参考进价）' AFTER quantity;
+
+-- 历史记录按当前参考价回填（与此前日结核对的口径相同）
+UPDATE t_sales_detail sd
+JOIN t_medicine m ON sd.med_id = m.med_id
+SET sd.unit_cost = IFNULL(m.ref_buy_price, 0);
+
+UPDATE t_sales_return sr
+JOIN t_stock_batch sb ON sr.batch_id = sb.batch_id
+JOIN t_medicine m ON sb.med_id = m.med_id
+SET sr.unit_price = IFNULL(m.ref_sell_price, 0);
+
+UPDATE t_purchase_return pr
+JOIN t_stock_batch sb ON pr.batch_id = sb.batch_id
+JOIN t_medicine m ON sb.med_id = m.med_id
+SET pr.unit_price = IFNULL(m.ref_buy_price, 0);
+
+DELIMITER //
+DROP PROCEDURE IF EXISTS sp_daily_finance_settlement//
+CREATE PROCEDURE sp_daily_finance_settlement(
+        IN p_date DATE
+)
+BEGIN
+        DECLARE v_sales_revenue DECIMAL(12,2) DEFAULT 0;
+        DECLARE v_sales_profit DECIMAL(12,2) DEFAULT 0;
+        DECLARE v_sales_return DECIMAL(12,2) DEFAULT 0;
+        DECLARE v_purc_return DECIMAL(12,2) DEFAULT 0;
+        DECLARE v_inv_loss DECIMAL(12,2) DEFAULT 0;
+        DECLARE v_inv_gain DECIMAL(12,2) DEFAULT 0;
+
+        -- 销售收入与毛利（成本取销售明细记录的成本单价）
+        SELECT 
+                IFNULL(SUM(sd.quantity * sd.unit_sell_price), 0),
+                IFNULL(SUM(sd.quantity * (sd.unit_sell_price - sd.unit_cost)), 0)
+        INTO v_sales_revenue, v_sales_profit
+        FROM t_sales_order so
+        JOIN t_sales_detail sd ON so.so_id = sd.so_id
+        WHERE so.status = 1
+            AND DATE(so.sale_time) = p_date;
+
+        -- 销售退货金额（退货记录的退货单价）
+        SELECT IFNULL(SUM(sr.quantity * sr.unit_price), 0)
+        INTO v_sales_return
+        FROM t_sales_return sr
+        WHERE sr.status = 1
+            AND DATE(sr.return_time) = p_date;
+
+        -- 购进退出金额（退出记录的退出单价）
+        SELECT IFNULL(SUM(pr.quantity * pr.unit_price), 0)
+        INTO v_purc_return
+        FROM t_purchase_return pr
+        WHERE pr.status = 1
+            AND DATE(pr.return_time) = p_date;
+
+        -- 盘点盈亏
+        SELECT 
+                IFNULL(SUM(CASE WHEN ic.diff_amount < 0 THEN -ic.diff_amount ELSE 0 END), 0),
+                IFNULL(SUM(CASE WHEN ic.diff_amount > 0 THEN ic.diff_amount ELSE 0 END), 0)
+        INTO v_inv_loss, v_inv_gain
+        FROM t_inventory_check ic
+        WHERE DATE(ic.check_time) = p_date;
+
+        -- 写入/更新日结表
+        DELETE FROM t_finance_daily WHERE day_id = p_date;
+        INSERT INTO t_finance_daily (
+                day_id, sales_revenue, sales_profit, sales_return_amt, purc_return_amt,
+                inv_loss_amt, inv_gain_amt, created_at, updated_at
+        ) VALUES (
+                p_date, v_sales_revenue, v_sales_profit, v_sales_return, v_purc_return,
+                v_inv_loss, v_inv_gain, NOW(), NOW()
+        );
+END//
+
+DELIMITER ;
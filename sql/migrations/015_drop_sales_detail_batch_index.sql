@@ -0,0 +1,10 @@
+-- ============================================
+-- 迁移 015: 撤销迁移 010 的 idx_sales_detail_batch
+-- batch_id 上的外键本身就有索引（InnoDB 在建外键时自动创建），按批次查明细可直接使用，
+-- 额外的同列索引只增加每次写销售明细的维护开销。
+-- 创建 idx_sales_detail_batch 时 InnoDB 已静默删除外键自动创建的同列索引，不能直接 DROP
+-- （外键仍需要它），这里改回外键自动索引的名称，结果与 init.sql 建出的库一致
+-- ============================================
+USE pharmacy_db;
+
+ALTER TABLE t_sales_detail RENAME INDEX idx_sales_detail_batch TO batch_id;
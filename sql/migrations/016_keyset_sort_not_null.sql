@@ -0,0 +1,25 @@
+-- ============================================
+-- 迁移 016: 键集分页的排序列改为 NOT NULL
+-- 列表页按 (时间, 单号) 键集分页，翻页条件 time < ? 对 NULL 不成立，时间为空的行会被跳过；
+-- 在条件中用 COALESCE 兜底又会使其无法走 (时间, 单号) 索引，因此改为在列上约束 NOT NULL。
+-- 已有的空值填为 1970-01-01：在倒序列表中仍排在最后（与此前 NULL 的位置相同），
+-- 也不会落入任何日结/报表统计的日期范围
+-- ============================================
+USE pharmacy_db;
+
+UPDATE t_sales_order SET sale_time = '1970-01-01 00:00:00' WHERE sale_time IS NULL;
+UPDATE t_purchase_order SET purchase_date = '1970-01-01 00:00:00' WHERE purchase_date IS NULL;
+UPDATE t_sales_return SET return_time = '1970-01-01 00:00:00' WHERE return_time IS NULL;
+UPDATE t_purchase_return SET return_time = '1970-01-01 00:00:00' WHERE return_time IS NULL;
+UPDATE t_inventory_check SET check_time = '1970-01-01 00:00:00' WHERE check_time IS NULL;
+
+ALTER TABLE t_sales_order
+    MODIFY sale_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '销售时间';
+ALTER TABLE t_purchase_order
+    MODIFY purchase_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '进货日期';
+ALTER TABLE t_sales_return
+    MODIFY return_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '退货时间';
+ALTER TABLE t_purchase_return
+    MODIFY return_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '退货时间';
+ALTER TABLE t_inventory_check
+    MODIFY check_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '盘点时间';
@@ -0,0 +1,66 @@
+"""
+药品搜索索引基准测试
+
+在内存中按 tools/datagen.py 的药品名、规格与厂家组合出 N 个药品（不访问数据库），
+构建 app/services/medicine_search 的索引并测量常见收银输入（汉字、拼音首字母、全拼、规格）的查询延迟。
+含重复词的查询须与去重后的查询结果相同，否则以非零状态退出。
+
+用法:
+    python tools/bench_medicine_search.py --skus 50000
+"""
+import argparse
+import sys
+import time
+
+from benchutil import make_app  # noqa: F401  仅用于把仓库根目录加入 sys.path
+from datagen import MEDICINES, FACTORIES
+
+QUERIES = ['感冒', '感冒灵', 'gml', 'ganmao', 'amxl', '阿莫西林胶囊', '片', 'g', '0.5g', '哈药', 'zzz',
+           '维生素 华润', 'wss 100片', '颗粒 三九', 'blf', 'weishengsu']
+# 含重复词的输入: {查询: 去重后的等价查询}
+REPEATED = {'感冒 感冒': '感冒', '维生素 维生素 华润': '维生素 华润', 'gml GML': 'gml'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='药品搜索索引基准测试')
+    parser.add_argument('--skus', type=int, default=50000, help='药品数')
+    parser.add_argument('--repeat', type=int, default=200, help='每个查询的执行次数')
+    args = parser.parse_args()
+
+    from app.services.medicine_search import SearchIndex, lazy_pinyin
+
+    if lazy_pinyin is None:
+        print('未安装 pypinyin，拼音查询不会命中')
+
+    start = time.perf_counter()
+    rows = []
+    for med_id in range(1, args.skus + 1):
+        name, category, _, specs = MEDICINES[(med_id - 1) % len(MEDICINES)]
+        # 同名药品按厂家区分，名称追加编号使目录规模内名称各不相同
+        rows.append((med_id, f'{name}{med_id // len(MEDICINES)}', specs[med_id % len(specs)],
+                     FACTORIES[med_id % len(FACTORIES)], category))
+    index = SearchIndex()
+    index.bulk_load(rows)
+    print(f'构建 {args.skus} 个药品的索引: {time.perf_counter() - start:.2f}s，倒排键 {len(index.postings)} 个')
+
+    print(f'{"查询":<14}{"命中":>8}{"p50(ms)":>10}{"p99(ms)":>10}')
+    for query in QUERIES + list(REPEATED):
+        timings = []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            result = index.search(query)
+            timings.append((time.perf_counter() - t) * 1000)
+        timings.sort()
+        hits = len(index.search(query, limit=None))
+        print(f'{query:<14}{hits:>8}{timings[len(timings) // 2]:>10.3f}{timings[int(len(timings) * 0.99)]:>10.3f}')
+
+    failed = False
+    for query, same_as in REPEATED.items():
+        if index.search(query, limit=None) != index.search(same_as, limit=None):
+            failed = True
+            print(f'{query} 与 {same_as} 的结果不同')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
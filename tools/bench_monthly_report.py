@@ -0,0 +1,132 @@
+"""
+月度报表基准测试
+
+在一个月内生成 N 张销售单与 M 条盘点记录（按 --scales 成倍放大），比较：
+  engine  app/services/monthly_report.build_report（各指标独立统计）
+  legacy  旧版 sp_monthly_report 的查询（盘点表无连接键的 LEFT JOIN）
+engine 结果与按生成数据直接计算的期望值逐项校验，legacy 输出其销售额虚增倍数。
+
+用法:
+    python tools/bench_monthly_report.py --orders 1000 --checks 2000 --scales 1,2,4
+    python tools/bench_monthly_report.py --skip-legacy --orders 20000 --checks 10000
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from benchutil import make_app, best_of
+
+YEAR, MONTH = 2024, 3
+
+LEGACY_SQL = """
+SELECT
+    COALESCE(SUM(sd.quantity * sd.unit_sell_price), 0) AS total_sales,
+    COUNT(DISTINCT so.so_id) AS order_count,
+    COALESCE(SUM(ic.diff_amount), 0) AS inventory_loss
+FROM t_sales_order so
+LEFT JOIN t_sales_detail sd ON so.so_id = sd.so_id
+LEFT JOIN t_inventory_check ic ON ic.check_time >= :start AND ic.check_time < :end
+WHERE so.status = 1
+  AND so.sale_time >= :start AND so.sale_time < :end
+"""
+
+
+def seed(db, orders, checks, rng):
+    """写入一个月的基础数据、销售与盘点记录，返回期望值"""
+    from sqlalchemy import insert
+    from app.models import (Employee, Customer, Medicine, StockBatch, SalesOrder, SalesDetail,
+                            InventoryCheck)
+
+    db.session.execute(insert(Employee), [{'emp_id': 1, 'emp_name': 'bench', 'pwd': 'x', 'role': 'Admin'}])
+    db.session.execute(insert(Customer), [{'cus_id': 1, 'cus_name': 'bench'}])
+    meds = [{'med_id': i, 'med_name': f'药品{i}', 'spec': '盒', 'ref_buy_price': Decimal('5.00'),
+             'ref_sell_price': Decimal('10.00'), 'total_stock': 0} for i in range(1, 51)]
+    db.session.execute(insert(Medicine), meds)
+    db.session.execute(insert(StockBatch), [{
+        'batch_id': i, 'med_id': i, 'batch_no': f'B{i}',
+        'expiry_date': date(YEAR + 2, 1, 1), 'cur_batch_qty': 1000
+    } for i in range(1, 51)])
+
+    start = datetime(YEAR, MONTH, 1)
+    revenue = Decimal(0)
+    order_rows, detail_rows = [], []
+    for n in range(orders):
+        so_id = f'S{YEAR}{MONTH:02d}{n:06d}'
+        order_rows.append({'so_id': so_id, 'emp_id': 1, 'cus_id': 1, 'status': 1,
+                           'sale_time': start + timedelta(minutes=rng.randrange(28 * 24 * 60))})
+        for _ in range(2):
+            med_id = rng.randint(1, 50)
+            qty = rng.randint(1, 5)
+            detail_rows.append({'so_id': so_id, 'batch_id': med_id, 'med_id': med_id,
+                                'quantity': qty, 'unit_sell_price': Decimal('10.00')})
+            revenue += qty * Decimal('10.00')
+    db.session.execute(insert(SalesOrder), order_rows)
+    db.session.execute(insert(SalesDetail), detail_rows)
+
+    loss = gain = Decimal(0)
+    check_rows = []
+    for _ in range(checks):
+        diff = rng.randint(-3, 3)
+        amount = diff * Decimal('5.00')
+        if amount < 0:
+            loss -= amount
+        else:
+            gain += amount
+        check_rows.append({'batch_id': rng.randint(1, 50), 'book_qty': 100, 'actual_qty': 100 + diff,
+                           'diff_amount': amount, 'emp_id': 1,
+                           'check_time': start + timedelta(minutes=rng.randrange(28 * 24 * 60))})
+    db.session.execute(insert(InventoryCheck), check_rows)
+    db.session.commit()
+    return {'total_revenue': float(revenue), 'order_count': orders,
+            'total_inv_loss': float(loss), 'total_inv_gain': float(gain)}
+
+
+def run(scale, args):
+    from sqlalchemy import text
+    from app import db
+    from app.services.monthly_report import build_report
+
+    app = make_app(args.database_uri)
+    with app.app_context():
+        orders, checks = args.orders * scale, args.checks * scale
+        expected = seed(db, orders, checks, random.Random(args.seed))
+
+        engine_time, report = best_of(lambda: build_report(YEAR, MONTH), args.repeat)
+        ok = all(abs(report[k] - v) < 0.005 for k, v in expected.items())
+        print(f'scale={scale:<3} orders={orders:<7} checks={checks:<7} '
+              f'engine={engine_time * 1000:9.1f} ms  {"OK" if ok else "MISMATCH"}')
+        if not ok:
+            print(f'    expected={expected}')
+            print(f'    engine  ={ {k: report[k] for k in expected} }')
+
+        if not args.skip_legacy:
+            params = {'start': datetime(YEAR, MONTH, 1), 'end': datetime(YEAR, MONTH + 1, 1)}
+            legacy_time, row = best_of(
+                lambda: db.session.execute(text(LEGACY_SQL), params).one(), 1)
+            inflation = float(row.total_sales) / expected['total_revenue'] if expected['total_revenue'] else 0
+            print(f'{"":44}legacy={legacy_time * 1000:9.1f} ms  '
+                  f'total_sales x{inflation:.0f} (期望 x1)')
+        db.session.remove()
+        if args.database_uri:
+            db.drop_all()
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='月度报表基准测试')
+    parser.add_argument('--database-uri', help='专用空测试库；默认使用临时 SQLite 文件')
+    parser.add_argument('--orders', type=int, default=1000, help='基准规模的销售单数')
+    parser.add_argument('--checks', type=int, default=2000, help='基准规模的盘点记录数')
+    parser.add_argument('--scales', default='1,2,4', help='规模倍数，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3, help='engine 重复次数（取最短）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-legacy', action='store_true', help='不运行旧版查询（大规模时很慢）')
+    args = parser.parse_args()
+
+    for scale in [int(s) for s in args.scales.split(',')]:
+        run(scale, args)
+
+
+if __name__ == '__main__':
+    main()
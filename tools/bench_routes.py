@@ -0,0 +1,257 @@
+"""
+热点路由基准测试
+
+用 Flask test client 在已灌数的数据库上逐个请求热点端点，记录每个端点的延迟分位数
+与每请求 SQL 条数；可保存为 JSON 基线，并与已有基线比较，超过阈值即以非零状态退出。
+
+  sales.create            1 / 10 / 50 行的 JSON 下单
+  sales.api_available_stock
+  sales.api_scan
+  sales.create_form / purchase.create_form（开单页面首屏）
+  customer.api_picker / medicine.api_picker
+  medicine.api_search
+  stock.overview
+  report.sales_report
+  finance.daily_report
+  return_manage.get_order_batches（销售单与进货单）
+
+默认在临时 SQLite 上用 tools/datagen.py 生成 10k 规模数据；也可指向已生成数据的库（--reuse）。
+延迟比较 p50 与 p90：同时超过 基线×(1+阈值) 与 基线+最小差值 才算退化；SQL 条数中位数增加即算退化。
+
+用法:
+    python tools/bench_routes.py --save routes_baseline.json
+    python tools/bench_routes.py --baseline routes_baseline.json --threshold 0.25
+    python tools/bench_routes.py --database-uri mysql+pymysql://.../pharmacy_bench --reuse --iterations 200
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchutil import make_app
+from datagen import SCALES, generate
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, pct):
+    """最近秩法分位数（values 须已排序）"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+class SqlCounter:
+    """统计所有数据库引擎上执行的 SQL 条数"""
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.count = 0
+
+    def _on_execute(self, *_):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._on_execute)
+
+
+def top_up(db, med_ids, qty=100000):
+    """给下单用的药品各补一个大批次，保证多轮下单不缺货"""
+    from sqlalchemy import insert, update, func
+    from app.models import Medicine, StockBatch
+
+    expiry = date.today() + timedelta(days=730)
+    db.session.execute(insert(StockBatch), [{
+        'med_id': med_id, 'batch_no': f'BENCH{med_id:07d}', 'expiry_date': expiry,
+        'cur_batch_qty': qty, 'create_time': date.today()
+    } for med_id in med_ids])
+    db.session.execute(update(Medicine).where(Medicine.med_id.in_(med_ids))
+                       .values(total_stock=Medicine.total_stock + qty)
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+def build_cases(app, rng):
+    """返回 [(名称, 请求函数)]，请求函数接收 client 并返回响应"""
+    from sqlalchemy import select
+    from app import db
+    from app.models import Medicine, SalesOrder, PurchaseOrder, Customer, StockBatch
+
+    with app.app_context():
+        stocked = db.session.execute(
+            select(Medicine.med_id).order_by(Medicine.med_id).limit(50)
+        ).scalars().all()
+        bench_batches = db.session.execute(
+            select(StockBatch.batch_id).where(StockBatch.batch_no.like('BENCH%')).limit(1)
+        ).first()
+        if not bench_batches:
+            top_up(db, stocked)
+        med_ids = db.session.execute(select(Medicine.med_id).limit(500)).scalars().all()
+        so_ids = db.session.execute(
+            select(SalesOrder.so_id).order_by(SalesOrder.sale_time.desc()).limit(200)
+        ).scalars().all()
+        po_ids = db.session.execute(
+            select(PurchaseOrder.po_id).order_by(PurchaseOrder.purchase_date.desc()).limit(200)
+        ).scalars().all()
+        cus_id = db.session.execute(select(Customer.cus_id).limit(1)).scalar()
+    if len(stocked) < 50 or not so_ids or not po_ids or cus_id is None:
+        raise SystemExit('数据不足：至少需要 50 种药品、1 个客户以及销售单和进货单')
+
+    keywords = ['感冒', '阿莫西林', '片', '胶囊', '颗粒', '维生素C', '不存在的药']
+
+    def checkout(lines):
+        def request(client):
+            meds = rng.sample(stocked, lines)
+            response = client.post('/sales/create', json={
+                'cus_id': cus_id,
+                'items': [{'med_id': med_id, 'quantity': 1, 'unit_price': 10} for med_id in meds]
+            })
+            if not response.get_json().get('success'):
+                raise SystemExit(f'sales.create 失败: {response.get_json().get("message")}')
+            return response
+        return request
+
+    def get(url_fn):
+        return lambda client: client.get(url_fn())
+
+    return [
+        ('sales.create[1]', checkout(1)),
+        ('sales.create[10]', checkout(10)),
+        ('sales.create[50]', checkout(50)),
+        ('sales.api_available_stock', get(lambda: f'/sales/api/available_stock/{rng.choice(med_ids)}')),
+        ('sales.api_scan', get(lambda: f'/sales/api/scan/69{rng.choice(med_ids):011d}')),
+        ('medicine.api_search', get(lambda: f'/medicine/api/search?q={rng.choice(keywords)}')),
+        ('sales.create_form', get(lambda: '/sales/create')),
+        ('purchase.create_form', get(lambda: '/purchase/create')),
+        ('customer.api_picker', get(lambda: f'/customer/api/picker?q=13{rng.randrange(10)}&page={rng.randint(1, 3)}')),
+        ('medicine.api_picker', get(lambda: f'/medicine/api/picker?q={rng.choice(keywords)}')),
+        ('stock.overview', get(lambda: '/stock/')),
+        ('report.sales_report', get(lambda: '/report/sales')),
+        ('finance.daily_report', get(lambda: '/finance/daily')),
+        ('return_manage.get_order_batches[sales]',
+         get(lambda: f'/return/api/order_batches/{rng.choice(so_ids)}')),
+        ('return_manage.get_order_batches[purchase]',
+         get(lambda: f'/return/api/order_batches/{rng.choice(po_ids)}')),
+    ]
+
+
+def run_case(client, engines, request, iterations, warmup):
+    """执行一个用例，返回统计结果"""
+    for _ in range(warmup):
+        request(client)
+    latencies, statements = [], []
+    for _ in range(iterations):
+        with SqlCounter(engines) as counter:
+            start = time.perf_counter()
+            response = request(client)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise SystemExit(f'{response.request.path} 返回 {response.status_code}')
+        latencies.append(elapsed * 1000)
+        statements.append(counter.count)
+    latencies.sort()
+    statements.sort()
+    result = {f'p{p}_ms': round(percentile(latencies, p), 3) for p in PERCENTILES}
+    result['mean_ms'] = round(sum(latencies) / len(latencies), 3)
+    result['max_ms'] = round(latencies[-1], 3)
+    result['sql_median'] = statements[len(statements) // 2]
+    result['sql_max'] = statements[-1]
+    return result
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """返回退化说明列表"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in ('p50_ms', 'p90_ms'):
+            limit = max(base[key] * (1 + threshold), base[key] + min_delta_ms)
+            if current[key] > limit:
+                regressions.append(f'{name} {key}: {base[key]:.2f} -> {current[key]:.2f} ms（上限 {limit:.2f}）')
+        if current['sql_median'] > base['sql_median']:
+            regressions.append(f'{name} SQL 条数: {base["sql_median"]} -> {current["sql_median"]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点路由基准测试')
+    parser.add_argument('--database-uri', help='数据库；默认使用临时 SQLite 文件')
+    parser.add_argument('--reuse', action='store_true', help='库中已有 datagen 生成的数据，跳过灌数')
+    parser.add_argument('--scale', choices=SCALES, default='10k', help='灌数规模（见 tools/datagen.py）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--iterations', type=int, default=50, help='每个端点的计时请求数')
+    parser.add_argument('--warmup', type=int, default=5, help='每个端点的预热请求数')
+    parser.add_argument('--only', help='只运行名称包含该字符串的用例')
+    parser.add_argument('--save', help='把结果写入 JSON 基线文件')
+    parser.add_argument('--baseline', help='与 JSON 基线比较，退化时以非零状态退出')
+    parser.add_argument('--threshold', type=float, default=0.2, help='延迟允许的相对增幅，默认 0.2')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='延迟允许的最小绝对增幅（毫秒）')
+    args = parser.parse_args()
+
+    from app import db
+
+    app = make_app(args.database_uri)
+    if not args.reuse:
+        generate(app, SCALES[args.scale], args.seed)
+
+    client = app.test_client()
+    response = client.post('/login', data={'emp_id': '1001', 'password': '123456'})
+    if response.status_code != 302:
+        raise SystemExit('登录失败：需要工号 1001 / 密码 123456 的管理员')
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    rng = random.Random(args.seed)
+    results = {}
+    print(f'{"端点":<44}{"p50":>9}{"p90":>9}{"p99":>9}{"max":>9}  {"SQL":>7}')
+    for name, request in build_cases(app, rng):
+        if args.only and args.only not in name:
+            continue
+        result = run_case(client, engines, request, args.iterations, args.warmup)
+        results[name] = result
+        print(f'{name:<44}{result["p50_ms"]:>9.2f}{result["p90_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+              f'{result["max_ms"]:>9.2f}  {result["sql_median"]:>3}/{result["sql_max"]:<3}')
+    print('（毫秒；SQL 为 中位数/最大值）')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'created_at': datetime.now().isoformat(timespec='seconds'),
+                    'scale': None if args.reuse else args.scale,
+                    'iterations': args.iterations,
+                    'python': platform.python_version(),
+                    'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0]
+                },
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f'基线已保存: {args.save}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print('性能退化:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f'与基线 {args.baseline} 比较：无退化')
+
+
+if __name__ == '__main__':
+    main()
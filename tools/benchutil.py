@@ -0,0 +1,52 @@
+"""
+基准/压测脚本共用的辅助函数
+脚本在仓库根目录下以 python tools/<脚本>.py 运行
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_app(database_uri=None, binds=None):
+    """
+    创建连接到指定数据库的应用实例
+
+    未指定时使用临时 SQLite 文件并建表；指定时应为专用的空测试库，脚本会写入数据
+    binds: 额外的 SQLALCHEMY_BINDS（如只读副本），不会自动建表
+    """
+    import config as config_module
+    from app import create_app, db
+
+    created = database_uri is None
+    if created:
+        fd, path = tempfile.mkstemp(prefix='pharmacy_bench_', suffix='.db')
+        os.close(fd)
+        database_uri = f'sqlite:///{path}'
+
+    class BenchConfig(config_module.Config):
+        SQLALCHEMY_DATABASE_URI = database_uri
+        SQLALCHEMY_ECHO = False
+        SQLALCHEMY_BINDS = binds or {}
+        TESTING = True
+
+    config_module.config['bench'] = BenchConfig
+    app = create_app('bench')
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def best_of(func, repeat=3):
+    """执行多次，返回 (最短耗时秒数, 最后一次结果)"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
@@ -0,0 +1,99 @@
+"""
+财务记账口径一致性检查
+
+经接口完成下单、部分退货、整单退货、进货与购进退出，实时记入当天日结行；
+随后修改全部药品的参考进价与参考售价，再用 settle_day() 与区间回填的重算逻辑按源表重算当天。
+记账与重算都应只使用业务发生时记在源表上的单价，重算结果须与实时记账完全一致；
+任一字段出现差异时以非零状态退出，可用于 CI。
+
+用法:
+    python tools/check_finance_drift.py
+    python tools/check_finance_drift.py --database-uri mysql+pymysql://.../pharmacy_bench
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+
+from benchutil import make_app
+from check_query_counts import seed_base
+
+
+def post_business(client):
+    """经接口写入当天的各类业务"""
+    def ok(response, label):
+        data = response.get_json(silent=True)
+        if response.status_code not in (200, 302) or (data is not None and not data.get('success', True)):
+            raise SystemExit(f'{label} 失败: {response.status_code} {data}')
+        return data
+
+    client.post('/login', data={'emp_id': '1001', 'password': '123456'})
+    orders = []
+    for n in range(3):
+        data = ok(client.post('/sales/create', json={'cus_id': 1, 'items': [
+            {'med_id': n % 5 + 1, 'quantity': 3, 'unit_price': 12},
+            {'med_id': (n + 1) % 5 + 1, 'quantity': 2, 'unit_price': 9.5}
+        ]}), '下单')
+        orders.append(data['so_id'])
+
+    batch = client.get(f'/return/api/order_batches/{orders[0]}').get_json()[0]
+    ok(client.post('/return/sales/create', data={
+        'so_id': orders[0], 'batch_id': batch['batch_id'], 'quantity': 1, 'reason': '检查'}), '销售退货')
+    ok(client.post(f'/sales/refund/{orders[1]}'), '整单退货')
+
+    expiry = (date.today() + timedelta(days=400)).isoformat()
+    po_id = ok(client.post('/purchase/create', json={'sup_id': 1, 'items': [
+        {'med_id': 2, 'batch_no': 'DRIFT01', 'expiry_date': expiry, 'quantity': 10, 'unit_price': 4}
+    ]}), '进货')['po_id']
+    batch = client.get(f'/return/api/order_batches/{po_id}').get_json()[0]
+    ok(client.post('/return/purchase/create', data={
+        'po_id': po_id, 'batch_id': batch['batch_id'], 'quantity': 2, 'reason': '检查'}), '购进退出')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='财务记账口径一致性检查')
+    parser.add_argument('--database-uri', help='专用空测试库；默认使用临时 SQLite 文件')
+    args = parser.parse_args()
+
+    from sqlalchemy import update
+    from app import db
+    from app.models import Medicine, FinanceDaily
+    from app.services import finance_ledger, finance_backfill
+    from app.services.finance_rollup import FIELDS
+
+    app = make_app(args.database_uri)
+    client = app.test_client()
+    with app.app_context():
+        seed_base(db)
+    post_business(client)
+
+    today = date.today()
+    failed = False
+    with app.app_context():
+        # 记账之后修改参考价：只用当前参考价重算的实现会在这里出现差异
+        db.session.execute(update(Medicine).values(
+            ref_buy_price=Medicine.ref_buy_price * 2, ref_sell_price=Medicine.ref_sell_price * 3))
+        db.session.commit()
+
+        posted = db.session.get(FinanceDaily, today)
+        if posted is None:
+            raise SystemExit('当天没有日结行，实时记账未生效')
+        posted = {f: getattr(posted, f) for f in FIELDS}
+        backfilled = finance_backfill.recompute_range(today, today).get(today, {})
+        db.session.commit()
+        diffs = finance_ledger.settle_day(today)
+        db.session.rollback()
+
+        for f in FIELDS:
+            recomputed = diffs[f][1] if f in diffs else posted[f]
+            ok = f not in diffs and backfilled.get(f, 0) == posted[f]
+            failed |= not ok
+            print(f'{f:<18} 实时记账 {posted[f]:>10}  日结重算 {recomputed:>10}  '
+                  f'区间回填 {backfilled.get(f, 0):>10}  {"OK" if ok else "FAIL"}')
+
+        if args.database_uri:
+            db.drop_all()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+列表页 SQL 条数检查
+
+先各写入少量记录请求一遍列表页，再补足到多页数据后再请求一遍。
+每个页面两次的 SQL 条数须相同（与本页行数无关，无逐行懒加载），且不超过预算。
+任一页面不满足时以非零状态退出，可用于 CI。
+
+用法:
+    python tools/check_query_counts.py
+    python tools/check_query_counts.py --database-uri mysql+pymysql://.../pharmacy_bench
+"""
+import argparse
+import hashlib
+import sys
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from benchutil import make_app
+
+# 每个页面允许的 SQL 条数（含登录用户加载）
+PAGES = {
+    '/sales/': 2,
+    '/purchase/': 3,
+    '/return/sales': 2,
+    '/return/purchase': 2,
+    '/stock/check/history': 2,
+    '/stock/batch': 2,
+}
+
+
+def seed_base(db):
+    from sqlalchemy import insert
+    from app.models import Employee, Customer, Supplier, Medicine, StockBatch
+
+    db.session.execute(insert(Employee), [{
+        'emp_id': 1001, 'emp_name': 'admin', 'role': 'Admin',
+        'pwd': hashlib.md5(b'123456').hexdigest()
+    }])
+    db.session.execute(insert(Customer), [{'cus_id': i, 'cus_name': f'客户{i}', 'phone': f'138{i:08d}'}
+                                          for i in range(1, 6)])
+    db.session.execute(insert(Supplier), [{'sup_id': i, 'sup_name': f'供应商{i}', 'phone': f'0{i}'}
+                                          for i in range(1, 6)])
+    db.session.execute(insert(Medicine), [{
+        'med_id': i, 'med_name': f'药品{i}', 'spec': '盒',
+        'ref_buy_price': Decimal('5.00'), 'ref_sell_price': Decimal('10.00'), 'total_stock': 100
+    } for i in range(1, 6)])
+    db.session.execute(insert(StockBatch), [{
+        'batch_id': i, 'med_id': (i - 1) % 5 + 1, 'batch_no': f'B{i:04d}',
+        'expiry_date': date.today() + timedelta(days=365), 'cur_batch_qty': 100
+    } for i in range(1, 41)])
+    db.session.commit()
+
+
+def seed_rows(db, start, count):
+    """写入编号 [start, start+count) 的单据、退货与盘点记录"""
+    from sqlalchemy import insert
+    from app.models import SalesOrder, PurchaseOrder, SalesReturn, PurchaseReturn, InventoryCheck
+
+    now = datetime.now()
+    ids = range(start, start + count)
+    db.session.execute(insert(SalesOrder), [{
+        'so_id': f'S{n:010d}', 'emp_id': 1001, 'cus_id': n % 6 or None,
+        'sale_time': now - timedelta(minutes=n), 'total_price': Decimal('10.00'), 'status': 1
+    } for n in ids])
+    db.session.execute(insert(PurchaseOrder), [{
+        'po_id': f'P{n:010d}', 'sup_id': n % 5 + 1, 'emp_id': 1001,
+        'purchase_date': now - timedelta(minutes=n), 'total_amount': Decimal('50.00'), 'status': 1
+    } for n in ids])
+    db.session.execute(insert(SalesReturn), [{
+        'sr_id': f'SR{n:09d}', 'so_id': f'S{n:010d}', 'batch_id': n % 40 + 1, 'quantity': 1,
+        'return_time': now - timedelta(minutes=n), 'status': 1, 'emp_id': 1001
+    } for n in ids])
+    db.session.execute(insert(PurchaseReturn), [{
+        'pr_id': f'PR{n:09d}', 'po_id': f'P{n:010d}', 'sup_id': n % 5 + 1, 'batch_id': n % 40 + 1,
+        'quantity': 1, 'return_time': now - timedelta(minutes=n), 'status': 1, 'emp_id': 1001
+    } for n in ids])
+    db.session.execute(insert(InventoryCheck), [{
+        'batch_id': n % 40 + 1, 'book_qty': 100, 'actual_qty': 99, 'diff_amount': Decimal('-5.00'),
+        'emp_id': 1001, 'check_time': now - timedelta(minutes=n)
+    } for n in ids])
+    db.session.commit()
+
+
+def measure(app, client):
+    """请求每个列表页，返回 {url: SQL 条数}"""
+    from sqlalchemy import event
+    from app import db
+
+    counts = {}
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def count(*_):
+        statements.append(1)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        for url in PAGES:
+            statements.clear()
+            response = client.get(url)
+            if response.status_code != 200:
+                raise SystemExit(f'{url} 返回 {response.status_code}')
+            counts[url] = len(statements)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='列表页 SQL 条数检查')
+    parser.add_argument('--database-uri', help='专用空测试库；默认使用临时 SQLite 文件')
+    args = parser.parse_args()
+
+    from app import db
+    app = make_app(args.database_uri)
+    client = app.test_client()
+    with app.app_context():
+        seed_base(db)
+        seed_rows(db, 1, 2)
+    client.post('/login', data={'emp_id': '1001', 'password': '123456'})
+    few = measure(app, client)
+
+    with app.app_context():
+        seed_rows(db, 3, 60)
+    many = measure(app, client)
+
+    failed = False
+    for url, budget in PAGES.items():
+        ok = few[url] == many[url] and many[url] <= budget
+        failed |= not ok
+        print(f'{url:<24} 少量数据 {few[url]:>3} 条  整页数据 {many[url]:>3} 条  预算 {budget:>3}  '
+              f'{"OK" if ok else "FAIL"}')
+
+    if args.database_uri:
+        with app.app_context():
+            db.drop_all()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+读写分离路由检查
+
+主库与只读副本各用一个临时 SQLite 文件（副本为写入基础数据后的主库拷贝），分别统计每个请求在两者上执行的语句数：
+  1. 写请求之后 REPLICA_RYW_SECONDS 秒内，只读端点的 GET 仍全部读主库（读到自己的写入）
+  2. 超出该时间窗后，只读端点的 GET 由副本承担
+  3. 批次库存与盘点记录始终读主库
+任一项不满足时以非零状态退出，可用于 CI。
+
+用法:
+    python tools/check_replica_routing.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchutil import make_app
+from check_query_counts import seed_base
+
+REPLICA_PAGES = ('/finance/daily', '/stock/expiring?type=30days')
+PRIMARY_PAGES = ('/stock/batch', '/stock/check/history')
+
+
+def temp_db():
+    fd, path = tempfile.mkstemp(prefix='pharmacy_bench_', suffix='.db')
+    os.close(fd)
+    return path
+
+
+def main():
+    from sqlalchemy import event
+    from app import db
+
+    primary, replica = temp_db(), temp_db()
+    app = make_app(f'sqlite:///{primary}', binds={'replica1': f'sqlite:///{replica}'})
+    with app.app_context():
+        seed_base(db)
+        engines = {'primary': db.engines[None], 'replica': db.engines['replica1']}
+        engines['primary'].dispose()
+    shutil.copyfile(primary, replica)
+
+    counts = {}
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *_, name=name: counts.__setitem__(name, counts.get(name, 0) + 1))
+
+    client = app.test_client()
+
+    def get(url):
+        counts.clear()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise SystemExit(f'{url} 返回 {response.status_code}')
+        return counts.get('primary', 0), counts.get('replica', 0)
+
+    def age_last_write():
+        window = app.config.get('REPLICA_RYW_SECONDS', 5)
+        with client.session_transaction() as session:
+            session['_last_write_at'] = time.time() - window - 1
+
+    client.post('/login', data={'emp_id': '1001', 'password': '123456'})
+    data = client.post('/sales/create', json={'cus_id': 1, 'items': [
+        {'med_id': 1, 'quantity': 1, 'unit_price': 10}]}).get_json()
+    if not data or not data.get('success'):
+        raise SystemExit(f'写入销售单失败: {data}')
+
+    checks = []
+    for url in REPLICA_PAGES:
+        on_primary, on_replica = get(url)
+        checks.append((f'写入后窗口内 {url}', on_primary, on_replica, on_replica == 0))
+    age_last_write()
+    for url in REPLICA_PAGES:
+        on_primary, on_replica = get(url)
+        checks.append((f'窗口外 {url}', on_primary, on_replica, on_replica > 0))
+    for url in PRIMARY_PAGES:
+        on_primary, on_replica = get(url)
+        checks.append((f'窗口外 {url}', on_primary, on_replica, on_replica == 0))
+
+    failed = False
+    for label, on_primary, on_replica, ok in checks:
+        failed |= not ok
+        print(f'{label:<40} 主库 {on_primary:>3} 条  副本 {on_replica:>3} 条  {"OK" if ok else "FAIL"}')
+
+    for engine in engines.values():
+        engine.dispose()
+    for path in (primary, replica):
+        os.remove(path)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
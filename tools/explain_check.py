@@ -0,0 +1,190 @@
+"""
+热点查询执行计划检查
+
+写入一批数据后按顺序请求各热点路径（下单分配批次、单据详情、退货批次、列表页、报表等），
+记录每个请求发出的 SELECT，逐条以相同参数执行 EXPLAIN；任一查询对业务表做全表扫描
+（MySQL type=ALL / SQLite 不走索引的 SCAN）时以非零状态退出，可用于 CI。
+SQLite 临时库的索引来自模型中的声明，须与 sql/init.sql 及迁移保持一致。
+索引有序扫描（MySQL type=index / SQLite SCAN ... USING INDEX）配合 LIMIT 或覆盖索引属于预期，不视为失败。
+
+用法:
+    python tools/explain_check.py
+    python tools/explain_check.py --database-uri mysql+pymysql://.../pharmacy_bench
+    python tools/explain_check.py --verbose      # 同时打印每条查询的执行计划
+"""
+import argparse
+import re
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+
+from benchutil import make_app
+from check_query_counts import seed_base, seed_rows
+
+# 行数很少的维表，整表读取是有意的（如进货页的供应商下拉）
+SMALL_TABLES = {'t_supplier', 't_employee'}
+
+MEDICINES = 300
+BATCHES_PER_MEDICINE = 6
+
+
+def seed(app, client):
+    """在 check_query_counts 的基础数据上补足药品与批次，再经接口写入带明细的销售单与进货单"""
+    from sqlalchemy import insert
+    from app import db
+    from app.models import Medicine, StockBatch
+
+    with app.app_context():
+        seed_base(db)
+        seed_rows(db, 1, 300)
+        db.session.execute(insert(Medicine), [{
+            'med_id': i, 'med_name': f'药品{i}', 'spec': '盒', 'barcode': f'69{i:011d}',
+            'ref_buy_price': Decimal('5.00'), 'ref_sell_price': Decimal('10.00'),
+            'total_stock': 100 * BATCHES_PER_MEDICINE
+        } for i in range(6, MEDICINES + 1)])
+        db.session.execute(insert(StockBatch), [{
+            'med_id': med_id, 'batch_no': f'E{med_id:04d}{k}',
+            'expiry_date': date.today() + timedelta(days=30 * (k + 1)), 'cur_batch_qty': 100
+        } for med_id in range(6, MEDICINES + 1) for k in range(BATCHES_PER_MEDICINE)])
+        db.session.commit()
+
+    client.post('/login', data={'emp_id': '1001', 'password': '123456'})
+    ids = {'so_id': None, 'po_id': None}
+    expiry = (date.today() + timedelta(days=400)).isoformat()
+    for n in range(20):
+        data = client.post('/sales/create', json={'cus_id': n % 5 + 1, 'items': [
+            {'med_id': 6 + n, 'quantity': 150, 'unit_price': 10},
+            {'med_id': 100 + n, 'quantity': 3, 'unit_price': 10}
+        ]}).get_json()
+        if not data or not data.get('success'):
+            raise SystemExit(f'写入销售单失败: {data}')
+        ids['so_id'] = data['so_id']
+        data = client.post('/purchase/create', json={'sup_id': n % 5 + 1, 'items': [
+            {'med_id': 200 + n, 'batch_no': f'P{n:04d}', 'expiry_date': expiry,
+             'quantity': 10, 'unit_price': 5}
+        ]}).get_json()
+        if not data or not data.get('success'):
+            raise SystemExit(f'写入进货单失败: {data}')
+        ids['po_id'] = data['po_id']
+    return ids
+
+
+def hot_requests(ids):
+    """[(说明, 方法, URL, JSON 请求体)]"""
+    today = date.today()
+    return [
+        ('下单（FEFO 分配批次）', 'POST', '/sales/create',
+         {'cus_id': 1, 'items': [{'med_id': 50, 'quantity': 120, 'unit_price': 10}]}),
+        ('销售单列表', 'GET', '/sales/', None),
+        ('销售单详情', 'GET', f'/sales/detail/{ids["so_id"]}', None),
+        ('可售批次', 'GET', '/sales/api/available_stock/60', None),
+        ('扫码', 'GET', f'/sales/api/scan/69{70:011d}', None),
+        ('进货单列表', 'GET', '/purchase/', None),
+        ('进货单详情', 'GET', f'/purchase/detail/{ids["po_id"]}', None),
+        ('销售退货列表', 'GET', '/return/sales', None),
+        ('购进退出列表', 'GET', '/return/purchase', None),
+        ('销售单可退批次', 'GET', f'/return/api/order_batches/{ids["so_id"]}', None),
+        ('进货单可退批次', 'GET', f'/return/api/order_batches/{ids["po_id"]}', None),
+        ('库存批次', 'GET', '/stock/batch?show_zero=0', None),
+        ('近效期', 'GET', '/stock/expiring?type=30days', None),
+        ('盘点记录', 'GET', '/stock/check/history', None),
+        ('客户选择器', 'GET', '/customer/api/picker?q=138', None),
+        ('药品选择器', 'GET', '/medicine/api/picker?q=药品', None),
+        ('利润分析', 'GET', f'/report/profit?year={today.year}&month={today.month}', None),
+    ]
+
+
+def capture(app, client, requests):
+    """逐个请求，返回 [(说明, [(SQL, 参数)])]"""
+    from sqlalchemy import event
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    captured = []
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for label, method, url, body in requests:
+            statements.clear()
+            response = client.open(url, method=method, json=body)
+            if response.status_code != 200:
+                raise SystemExit(f'{label} {url} 返回 {response.status_code}')
+            captured.append((label, list(statements)))
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return captured
+
+
+def full_scans(conn, statement, parameters, tables):
+    """对一条查询执行 EXPLAIN，返回 (全表扫描的表名列表, 执行计划文本行)"""
+    aliases = {alias: table for table, alias in re.findall(r'\b(t_\w+) AS (\w+)', statement)}
+    if conn.dialect.name == 'sqlite':
+        plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        lines = [row[3] for row in plan]
+        scans = []
+        for detail in lines:
+            match = re.match(r'SCAN (\w+)(?: AS (\w+))?(.*)$', detail)
+            if match and 'USING' not in match.group(3):
+                scans.append(match.group(1))
+    else:
+        plan = conn.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings().all()
+        lines = [f'{row["table"]} type={row["type"]} key={row["key"]} rows={row["rows"]}' for row in plan]
+        scans = [row['table'] for row in plan if row['type'] == 'ALL']
+    scans = [aliases.get(name, name) for name in scans]
+    return [name for name in scans if name in tables and name not in SMALL_TABLES], lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点查询执行计划检查')
+    parser.add_argument('--database-uri', help='专用空测试库；默认使用临时 SQLite 文件')
+    parser.add_argument('--verbose', action='store_true', help='打印每条查询的执行计划')
+    args = parser.parse_args()
+
+    from app import db
+    from app.services import medicine_search, barcode_index
+    app = make_app(args.database_uri)
+    client = app.test_client()
+    ids = seed(app, client)
+    with app.app_context():
+        if db.engine.dialect.name == 'mysql':
+            db.session.execute(db.text('ANALYZE TABLE ' + ', '.join(db.metadata.tables)))
+        db.session.commit()
+        # 进程内的搜索与条码索引启动时整表加载一次（wsgi.py 预热），不属于请求路径
+        medicine_search.warm()
+        barcode_index.warm()
+    captured = capture(app, client, hot_requests(ids))
+
+    failed = False
+    with app.app_context():
+        tables = set(db.metadata.tables)
+        with db.engine.connect() as conn:
+            for label, statements in captured:
+                problems = []
+                for statement, parameters in statements:
+                    scans, lines = full_scans(conn, statement, parameters, tables)
+                    if scans:
+                        problems.append((scans, statement, lines))
+                    elif args.verbose:
+                        print(f'  {" ".join(statement.split())[:160]}')
+                        for line in lines:
+                            print(f'      {line}')
+                failed |= bool(problems)
+                print(f'{label:<16} 查询 {len(statements):>3} 条  {"FAIL" if problems else "OK"}')
+                for scans, statement, lines in problems:
+                    print(f'  全表扫描 {", ".join(sorted(set(scans)))}: {" ".join(statement.split())[:200]}')
+                    for line in lines:
+                        print(f'      {line}')
+
+        if args.database_uri:
+            db.drop_all()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
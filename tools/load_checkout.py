@@ -0,0 +1,376 @@
+"""
+收银并发压测与库存一致性检查
+
+多个线程（每线程一个已登录的 test client）同时对少数热点药品发起：
+  checkout  sales.create（JSON 下单，热点药品库存故意不足，制造抢最后几盒的竞争）
+  refund    sales.refund（整单退货，取本次压测中成功的订单）
+  cancel    purchase.cancel（撤销压测前写入的进货单，其批次同时在被销售）
+
+输出各操作的吞吐、延迟分位数、结果分布（成功 / 业务拒绝 / 异常），
+以及加锁读（SELECT ... FOR UPDATE）累计耗时；MySQL 上另取 InnoDB 行锁等待计数与时长。
+
+结束后校验：
+  1. 没有 cur_batch_qty < 0 的批次
+  2. 每个药品 total_stock = SUM(批次 cur_batch_qty)
+  3. 每个热点批次：压测后数量 = 压测前数量 - 本次售出 + 本次退回 - 本次撤销的进货数量（无丢失更新/超卖）
+任一不满足时以非零状态退出。
+
+退货恢复库存依赖 sql/init.sql 中的触发器，完整压测应指向按 init.sql 建好的 MySQL 空测试库；
+在默认的临时 SQLite 上没有触发器，会自动去掉 refund 操作。
+
+用法:
+    python tools/load_checkout.py --threads 8 --duration 10
+    python tools/load_checkout.py --database-uri mysql+pymysql://.../pharmacy_bench --threads 32 --skus 3
+"""
+import argparse
+import hashlib
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from benchutil import make_app
+
+OK, REJECTED, ERROR = 'ok', 'rejected', 'error'
+
+# 业务拒绝（预期内的失败），其余失败计为异常
+REJECT_MARKERS = ('库存不足', '已有部分被销售', '已退货', '已被撤销')
+
+
+def seed(db, skus, batches_per_sku, batch_qty, purchase_orders):
+    """写入热点药品、批次以及待撤销的进货单（按触发器的效果直接写批次，不依赖触发器）"""
+    from sqlalchemy import insert
+    from app.models import (Employee, Customer, Supplier, Medicine, StockBatch, PurchaseOrder,
+                            PurchaseDetail)
+
+    db.session.execute(insert(Employee), [{
+        'emp_id': 1001, 'emp_name': 'admin', 'role': 'Admin', 'pwd': hashlib.md5(b'123456').hexdigest()
+    }])
+    db.session.execute(insert(Customer), [{'cus_id': 1, 'cus_name': '压测客户', 'phone': '13800000000'}])
+    db.session.execute(insert(Supplier), [{'sup_id': 1, 'sup_name': '压测供应商', 'phone': '0'}])
+
+    today = date.today()
+    medicines, batches, orders, details = [], [], [], []
+    batch_id = 0
+    for med_id in range(1, skus + 1):
+        total = 0
+        for n in range(batches_per_sku):
+            batch_id += 1
+            total += batch_qty
+            batches.append({'batch_id': batch_id, 'med_id': med_id, 'batch_no': f'L{med_id}-{n}',
+                            'expiry_date': today + timedelta(days=60 + 30 * n), 'cur_batch_qty': batch_qty,
+                            'create_time': today})
+        medicines.append({'med_id': med_id, 'med_name': f'热点药品{med_id}', 'spec': '盒',
+                          'ref_buy_price': Decimal('5.00'), 'ref_sell_price': Decimal('10.00'),
+                          'total_stock': total})
+
+    # 每张进货单给每个热点药品进一个新批次，有效期排在最前，销售会优先消耗这些批次
+    for n in range(purchase_orders):
+        po_id = f'PLOAD{n:06d}'
+        orders.append({'po_id': po_id, 'sup_id': 1, 'emp_id': 1001, 'status': 1,
+                       'total_amount': Decimal('5.00') * batch_qty * skus,
+                       'purchase_date': datetime.now() - timedelta(days=1)})
+        for medicine in medicines:
+            batch_id += 1
+            batch_no = f'PO{n}-{medicine["med_id"]}'
+            expiry = today + timedelta(days=30 + n % 20)
+            batches.append({'batch_id': batch_id, 'med_id': medicine['med_id'], 'batch_no': batch_no,
+                            'expiry_date': expiry, 'cur_batch_qty': batch_qty, 'create_time': today})
+            details.append({'po_id': po_id, 'med_id': medicine['med_id'], 'batch_no': batch_no,
+                            'expiry_date': expiry, 'quantity': batch_qty, 'unit_purc_price': Decimal('5.00')})
+            medicine['total_stock'] += batch_qty
+
+    db.session.execute(insert(Medicine), medicines)
+    db.session.execute(insert(StockBatch), batches)
+    if orders:
+        db.session.execute(insert(PurchaseOrder), orders)
+        db.session.execute(insert(PurchaseDetail), details)
+    db.session.commit()
+    return [o['po_id'] for o in orders]
+
+
+class LockTimer:
+    """按线程累计 SELECT ... FOR UPDATE 语句的执行耗时"""
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _before(self, conn, cursor, statement, *args):
+        if 'FOR UPDATE' in statement.upper():
+            self._local.start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, *args):
+        start = getattr(self._local, 'start', None)
+        if start is not None:
+            self._local.start = None
+            with self._lock:
+                self.total += time.perf_counter() - start
+                self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._before)
+            event.listen(engine, 'after_cursor_execute', self._after)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._before)
+            event.remove(engine, 'after_cursor_execute', self._after)
+
+
+class Workload:
+    """线程间共享的可退货订单与可撤销进货单"""
+
+    def __init__(self, skus, po_ids, max_lines, rng_seed):
+        self.skus = list(range(1, skus + 1))
+        self.po_ids = list(po_ids)
+        self.max_lines = max_lines
+        self.sold = []
+        self.created_orders = []
+        self.cancel_attempted = []
+        self.lock = threading.Lock()
+        self.results = defaultdict(list)      # 操作 -> [(结果, 耗时秒, 说明)]
+        self.seed = rng_seed
+
+    def record(self, op, outcome, elapsed, note=''):
+        with self.lock:
+            self.results[op].append((outcome, elapsed, note))
+
+
+def classify(ok, message):
+    if ok:
+        return OK
+    return REJECTED if any(marker in (message or '') for marker in REJECT_MARKERS) else ERROR
+
+
+def take_flash(client):
+    """取出并清空会话中的 flash 消息，返回 (分类, 内容) 列表"""
+    with client.session_transaction() as sess:
+        return sess.pop('_flashes', [])
+
+
+def worker(app, workload, index, deadline, mix):
+    rng = random.Random(workload.seed * 1000 + index)
+    client = app.test_client()
+    client.post('/login', data={'emp_id': '1001', 'password': '123456'})
+    ops, weights = zip(*mix.items())
+
+    while time.perf_counter() < deadline:
+        op = rng.choices(ops, weights)[0]
+        if op == 'checkout':
+            lines = rng.randint(1, min(workload.max_lines, len(workload.skus)))
+            items = [{'med_id': med_id, 'quantity': rng.randint(1, 3), 'unit_price': 10}
+                     for med_id in rng.sample(workload.skus, lines)]
+            start = time.perf_counter()
+            response = client.post('/sales/create', json={'cus_id': 1, 'items': items})
+            elapsed = time.perf_counter() - start
+            body = response.get_json(silent=True) or {}
+            outcome = classify(body.get('success'), body.get('message'))
+            if outcome == OK:
+                with workload.lock:
+                    workload.sold.append(body['so_id'])
+                    workload.created_orders.append(body['so_id'])
+            workload.record(op, outcome, elapsed, body.get('message', ''))
+
+        elif op == 'refund':
+            with workload.lock:
+                if not workload.sold:
+                    continue
+                so_id = workload.sold.pop(rng.randrange(len(workload.sold)))
+            start = time.perf_counter()
+            client.post(f'/sales/refund/{so_id}')
+            elapsed = time.perf_counter() - start
+            flashes = take_flash(client)
+            ok = any(category == 'success' for category, _ in flashes)
+            message = ' '.join(text for _, text in flashes)
+            workload.record(op, classify(ok, message), elapsed, message)
+
+        elif op == 'cancel':
+            with workload.lock:
+                if not workload.po_ids:
+                    continue
+                po_id = workload.po_ids.pop(rng.randrange(len(workload.po_ids)))
+                workload.cancel_attempted.append(po_id)
+            start = time.perf_counter()
+            client.post(f'/purchase/cancel/{po_id}')
+            elapsed = time.perf_counter() - start
+            flashes = take_flash(client)
+            ok = any(category == 'success' for category, _ in flashes)
+            message = ' '.join(text for _, text in flashes)
+            workload.record(op, classify(ok, message), elapsed, message)
+
+
+def innodb_lock_status(db):
+    """MySQL: InnoDB 行锁等待次数与累计毫秒；其他数据库返回 None"""
+    from sqlalchemy import text
+    if db.engine.dialect.name != 'mysql':
+        return None
+    rows = db.session.execute(text("SHOW GLOBAL STATUS LIKE 'Innodb_row_lock_%'")).all()
+    db.session.commit()
+    return {name: int(value) for name, value in rows}
+
+
+def snapshot_batches(db):
+    from sqlalchemy import select
+    from app.models import StockBatch
+    return dict(db.session.execute(select(StockBatch.batch_id, StockBatch.cur_batch_qty)).all())
+
+
+def check_invariants(db, before, workload):
+    """返回违反项说明列表"""
+    from sqlalchemy import select, func
+    from app.models import (StockBatch, Medicine, SalesDetail, SalesReturn, PurchaseOrder,
+                            PurchaseDetail)
+
+    problems = []
+    negative = db.session.execute(
+        select(StockBatch.batch_id, StockBatch.cur_batch_qty).where(StockBatch.cur_batch_qty < 0)
+    ).all()
+    for batch_id, qty in negative:
+        problems.append(f'批次 {batch_id} 数量为负: {qty}')
+
+    batch_sum = select(StockBatch.med_id, func.sum(StockBatch.cur_batch_qty).label('qty')).group_by(
+        StockBatch.med_id).subquery()
+    for med_id, total, qty in db.session.execute(
+        select(Medicine.med_id, Medicine.total_stock, batch_sum.c.qty).join(
+            batch_sum, batch_sum.c.med_id == Medicine.med_id
+        ).where(Medicine.total_stock != batch_sum.c.qty)
+    ).all():
+        problems.append(f'药品 {med_id} 总库存 {total} != 批次合计 {qty}')
+
+    # 逐批次核对本次压测的进出
+    expected = dict(before)
+    so_ids = workload.created_orders
+    for offset in range(0, len(so_ids), 500):
+        chunk = so_ids[offset:offset + 500]
+        for batch_id, qty in db.session.execute(
+            select(SalesDetail.batch_id, func.sum(SalesDetail.quantity)).where(
+                SalesDetail.so_id.in_(chunk)).group_by(SalesDetail.batch_id)
+        ).all():
+            expected[batch_id] -= qty
+        for batch_id, qty in db.session.execute(
+            select(SalesReturn.batch_id, func.sum(SalesReturn.quantity)).where(
+                SalesReturn.so_id.in_(chunk)).group_by(SalesReturn.batch_id)
+        ).all():
+            expected[batch_id] += qty
+    if workload.cancel_attempted:
+        for batch_id, qty in db.session.execute(
+            select(StockBatch.batch_id, PurchaseDetail.quantity).join(
+                PurchaseDetail, (PurchaseDetail.med_id == StockBatch.med_id)
+                & (PurchaseDetail.batch_no == StockBatch.batch_no)
+            ).join(
+                PurchaseOrder, PurchaseOrder.po_id == PurchaseDetail.po_id
+            ).where(
+                PurchaseOrder.po_id.in_(workload.cancel_attempted),
+                PurchaseOrder.status == 0
+            )
+        ).all():
+            expected[batch_id] -= qty
+
+    actual = snapshot_batches(db)
+    for batch_id, qty in sorted(expected.items()):
+        if actual.get(batch_id) != qty:
+            problems.append(f'批次 {batch_id} 数量 {actual.get(batch_id)}，按本次进出应为 {qty}')
+    return problems
+
+
+def summarize(results, seconds):
+    print(f'{"操作":<10}{"次数":>7}{"成功":>7}{"拒绝":>7}{"异常":>7}{"吞吐/s":>9}'
+          f'{"p50":>9}{"p95":>9}{"p99":>9}{"max":>9}')
+    errors = []
+    for op in ('checkout', 'refund', 'cancel'):
+        rows = results.get(op, [])
+        if not rows:
+            continue
+        latencies = sorted(elapsed * 1000 for _, elapsed, _ in rows)
+        count = defaultdict(int)
+        for outcome, _, note in rows:
+            count[outcome] += 1
+            if outcome == ERROR:
+                errors.append(f'{op}: {note}')
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+        print(f'{op:<10}{len(rows):>7}{count[OK]:>7}{count[REJECTED]:>7}{count[ERROR]:>7}'
+              f'{len(rows) / seconds:>9.1f}{pct(50):>9.1f}{pct(95):>9.1f}{pct(99):>9.1f}{latencies[-1]:>9.1f}')
+    print('（延迟单位毫秒）')
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='收银并发压测与库存一致性检查')
+    parser.add_argument('--database-uri', help='专用空测试库；默认使用临时 SQLite 文件')
+    parser.add_argument('--threads', type=int, default=8, help='并发收银线程数')
+    parser.add_argument('--duration', type=float, default=10, help='压测秒数')
+    parser.add_argument('--skus', type=int, default=5, help='热点药品数')
+    parser.add_argument('--batches', type=int, default=3, help='每个热点药品的初始批次数')
+    parser.add_argument('--batch-qty', type=int, default=20, help='每个批次的初始数量')
+    parser.add_argument('--purchase-orders', type=int, default=10, help='待撤销的进货单数')
+    parser.add_argument('--max-lines', type=int, default=3, help='每单最多行数')
+    parser.add_argument('--mix', default='checkout=80,refund=10,cancel=10', help='操作权重')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    from app import db
+
+    mix = {name: float(weight) for name, weight in (part.split('=') for part in args.mix.split(','))}
+    app = make_app(args.database_uri)
+    with app.app_context():
+        if db.engine.dialect.name != 'mysql' and mix.pop('refund', None):
+            print('非 MySQL 库没有退货触发器，已去掉 refund 操作')
+        po_ids = seed(db, args.skus, args.batches, args.batch_qty, args.purchase_orders)
+        before = snapshot_batches(db)
+        lock_before = innodb_lock_status(db)
+        engines = list(db.engines.values())
+
+    workload = Workload(args.skus, po_ids, args.max_lines, args.seed)
+    print(f'{args.threads} 线程 × {args.duration:g} 秒，热点药品 {args.skus} 个，'
+          f'初始库存 {sum(before.values())}，待撤销进货单 {len(po_ids)} 张')
+
+    with LockTimer(engines) as lock_timer:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        threads = [threading.Thread(target=worker, args=(app, workload, i, deadline, mix))
+                   for i in range(args.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+    errors = summarize(workload.results, elapsed)
+    print(f'加锁读: {lock_timer.count} 次，累计 {lock_timer.total * 1000:.1f} ms')
+
+    with app.app_context():
+        lock_after = innodb_lock_status(db)
+        if lock_before is not None:
+            waits = lock_after['Innodb_row_lock_waits'] - lock_before['Innodb_row_lock_waits']
+            wait_ms = lock_after['Innodb_row_lock_time'] - lock_before['Innodb_row_lock_time']
+            print(f'InnoDB 行锁等待: {waits} 次，累计 {wait_ms} ms')
+        problems = check_invariants(db, before, workload)
+
+    if errors:
+        print(f'异常 {len(errors)} 次，前 5 条:')
+        for line in errors[:5]:
+            print(f'  {line}')
+    if problems:
+        print(f'一致性校验失败（{len(problems)} 项），前 20 项:')
+        for line in problems[:20]:
+            print(f'  {line}')
+        sys.exit(1)
+    print('一致性校验通过：无负库存，总库存等于批次合计，各批次进出相符')
+
+
+if __name__ == '__main__':
+    main()
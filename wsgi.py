@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+药品销售管理系统 - 生产环境 WSGI 入口
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+配置由环境变量 FLASK_CONFIG 选择，默认 production
+"""
+import os
+
+from app import create_app
+from app.services import medicine_search, barcode_index
+
+app = create_app(os.environ.get('FLASK_CONFIG') or 'production')
+
+# 预建药品搜索索引与条码索引；preload_app 时在 master 中构建，worker fork 后共享
+with app.app_context():
+    try:
+        medicine_search.warm()
+    except Exception as e:
+        app.logger.warning('药品搜索索引预建失败，将在首次查询时构建: %s', e)
+    try:
+        barcode_index.warm()
+    except Exception as e:
+        app.logger.warning('条码索引预建失败，将在首次扫码时构建: %s', e)